@@ -0,0 +1,17 @@
+import pytest
+
+from modules.outbox import Outbox
+from modules.replica import Replica
+from modules.store import LocalStore
+
+
+@pytest.fixture
+def store():
+    store = LocalStore(":memory:")
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def outbox(store):
+    return Outbox(store, Replica(store))
@@ -0,0 +1,47 @@
+from os import getenv
+
+import httpx
+
+API_HOST = getenv("API_HOST", "http://localhost:8000")
+HTTP_MAX_CONNECTIONS = int(getenv("HTTP_MAX_CONNECTIONS", 10))
+HTTP_MAX_KEEPALIVE = int(getenv("HTTP_MAX_KEEPALIVE", 5))
+HTTP_KEEPALIVE_EXPIRY = float(getenv("HTTP_KEEPALIVE_EXPIRY", 60.0))
+HTTP2 = getenv("HTTP2", "true").lower() in ("1", "true", "yes")
+HTTP_CONNECT_TIMEOUT = float(getenv("HTTP_CONNECT_TIMEOUT", 3.0))
+HTTP_TIMEOUT = float(getenv("HTTP_TIMEOUT", 10.0))
+HTTP_MAX_REDIRECTS = int(getenv("HTTP_MAX_REDIRECTS", 5))
+# a bigger answer than this from the api is a bug, not something to render
+HTTP_MAX_RESPONSE_BYTES = int(getenv("HTTP_MAX_RESPONSE_BYTES", 32 * 1024 * 1024))
+
+
+class ResponseTooLarge(httpx.HTTPError):
+    pass
+
+
+async def check_size(response: httpx.Response) -> None:
+    length = response.headers.get("Content-Length")
+    if length and int(length) > HTTP_MAX_RESPONSE_BYTES:
+        await response.aclose()
+        raise ResponseTooLarge(f"{response.url} sent {length} bytes")
+
+
+def build_client() -> httpx.AsyncClient:
+    """
+    The TUI's one client for the api, opened when the app mounts and closed when
+    it exits. Every screen shares its connection pool, so after the first request
+    the api is reached over a kept alive connection.
+    """
+    return httpx.AsyncClient(
+        base_url=API_HOST,
+        follow_redirects=True,
+        max_redirects=HTTP_MAX_REDIRECTS,
+        # h2 is only negotiated over TLS, plain http stays on HTTP/1.1
+        http2=HTTP2,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        event_hooks={"response": [check_size]},
+    )
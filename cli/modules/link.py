@@ -1,3 +1,4 @@
+import asyncio
 from os import getenv
 
 import httpx
@@ -5,15 +6,27 @@ import httpx
 from textual.app import ComposeResult
 from textual.binding import Binding
 from textual.containers import Container, Horizontal
-from textual.screen import Screen, ModalScreen
-from textual.suggester import SuggestFromList
-from textual.widgets import DataTable, Footer, Input, Static, Switch
+from textual.screen import Screen
+from textual.widgets import Footer, Input, Static, Switch
 
-API_HOST = getenv("API_HOST", "http://localhost:8000")
+from modules.table import VirtualTable
+from modules.tags import TagSuggester
+
+SEARCH_PAGE_SIZE = int(getenv("SEARCH_PAGE_SIZE", 200))
+# seconds of no typing before the api is asked for ranked results
+SEARCH_DEBOUNCE = float(getenv("SEARCH_DEBOUNCE", 0.3))
+
+
+def link_status(link: dict) -> int | str:
+    # not on the api yet, its id is only a placeholder
+    if link["link_id"] < 0:
+        return "failed" if link.get("failed") else "pending"
+    return link["link_id"]
 
 
 class FindLink(Screen):
-    links = []
+    # showing search results rather than the whole replica
+    filtered = False
 
     BINDINGS = [
         Binding(
@@ -50,148 +63,206 @@ class FindLink(Screen):
         ),
     ]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the current search, its results are loaded a page at a time
+        self.search_string = ""
+        self.results: dict[int, dict] = {}
+        # the replica's matches for it, a longer query only filters these
+        self.matches: list[int] = []
+
+    def get_link(self, link_id: int) -> dict | None:
+        # the api's copy when it's a ranked search result
+        return self.results.get(link_id) or self.app.replica.links.get(link_id)
+
+    def link_row(self, link_id: int) -> tuple:
+        link = self.get_link(link_id)
+        if link is None:
+            return ()
+        return (
+            link_status(link),
+            link["url"],
+            link["summary"],
+            link["tags"],
+            "✅" if bool(link["reminder"]) else "❌",
+            "✅" if bool(link["reading"]) else "❌",
+            link["meta_title"],
+            link["meta_description"],
+        )
+
+    def show_replica(self) -> None:
+        self.filtered = False
+        self.results.clear()
+        table = self.query_one(VirtualTable)
+        table.set_keys(list(self.app.replica.links))
+
     async def refresh_table(self, result: bool | None = None) -> None:
-        self.links.clear()
-        table = self.query_one(DataTable)
-        table.clear(columns=True)
-        table.cursor_type = "row"
-        table.add_columns(
-            "ID",
-            "URL",
-            "Summary",
-            "Tags",
-            "Reminder",
-            "Reading",
-            "Meta.Title",
-            "Meta.Description",
+        """
+        Sync the replica and redraw only the rows that changed
+        """
+        replica = self.app.replica
+        # sent first, so the sync brings back what they became on the api
+        await self.app.outbox.flush(self.app.client)
+        delta = await replica.sync(self.app.client)
+        if self.filtered:
+            self.filter(self.search_string, narrow=False)
+            return
+        if delta.reset:
+            self.show_replica()
+            return
+
+        table = self.query_one(VirtualTable)
+        table.remove_keys(set(delta.deleted_links))
+        if delta.links:
+            shown = set(table.keys)
+            changed = [link_id for link_id in delta.links if link_id in replica.links]
+            table.refresh_rows([key for key in changed if key in shown])
+            added = [key for key in dict.fromkeys(changed) if key not in shown]
+            table.append_keys(added)
+
+    def filter(self, query: str, narrow: bool = True) -> None:
+        """
+        Show the replica's links matching the query, as it's typed
+        """
+        query = " ".join(query.lower().split())
+        if not query:
+            self.search_string = ""
+            self.show_replica()
+            return
+
+        replica = self.app.replica
+        within = None
+        if narrow and self.search_string and query.startswith(self.search_string):
+            within = self.matches
+        self.matches = replica.search("link", query, within)
+        self.search_string = query
+        self.filtered = True
+        self.results = {}
+        self.query_one(VirtualTable).set_keys(list(self.matches))
+
+    async def search_page(self, offset: int) -> list[dict]:
+        search_request = await self.app.client.get(
+            "/search",
+            params={
+                "q": self.search_string,
+                "type": "link",
+                "limit": SEARCH_PAGE_SIZE,
+                "offset": offset,
+            },
+        )
+        search_request.raise_for_status()
+        return [result["link"] for result in search_request.json()]
+
+    async def ranked_search(self) -> None:
+        """
+        Once typing pauses, put the api's ranked results ahead of the replica's
+        matches, the matches the api didn't rank stay after them. The next
+        keystroke cancels this, request and all.
+        """
+        await asyncio.sleep(SEARCH_DEBOUNCE)
+        try:
+            links = await self.search_page(0)
+        except httpx.HTTPError:
+            # offline, the replica's matches stay
+            return
+        self.results = {link["link_id"]: link for link in links}
+        self.show_results(has_more=len(links) == SEARCH_PAGE_SIZE)
+
+    async def load_page(self) -> None:
+        try:
+            links = await self.search_page(len(self.results))
+        except httpx.HTTPError:
+            return
+        for link in links:
+            self.results.setdefault(link["link_id"], link)
+        self.show_results(has_more=len(links) == SEARCH_PAGE_SIZE)
+
+    def show_results(self, has_more: bool) -> None:
+        # pending and not yet indexed links are only found locally
+        local = [link_id for link_id in self.matches if link_id not in self.results]
+        self.query_one(VirtualTable).set_keys(
+            list(self.results) + local, has_more=has_more
         )
 
-        async with httpx.AsyncClient() as client:
-            link_request = await client.get(f"{API_HOST}/link")
-            self.links = link_request.json()
-            for link in self.links:
-                table_id = link["link_id"]
-                url = link["url"]
-                summary = link["summary"]
-                tags = link["tags"]
-                meta_title = link["meta_title"][:50]
-                meta_description = link["meta_description"][:50]
-                reminder = "✅" if bool(link["reminder"]) else "❌"
-                reading = "✅" if bool(link["reading"]) else "❌"
-                table.add_row(
-                    table_id,
-                    url,
-                    summary,
-                    tags,
-                    reminder,
-                    reading,
-                    meta_title,
-                    meta_description,
-                )
-
-    def update_table(self, search_string: str) -> None:
-        table = self.query_one(DataTable)
-        table.clear()
-        for link in self.links:
-            table_id = link["link_id"]
-            url = link["url"]
-            summary = link["summary"]
-            tags = link["tags"]
-            meta_title = link["meta_title"][:50]
-            meta_description = link["meta_description"][:50]
-            reminder = "✅" if bool(link["reminder"]) else "❌"
-            reading = "✅" if bool(link["reading"]) else "❌"
-
-            if (
-                any(
-                    search_string in s
-                    for s in [url, summary, tags, meta_title, meta_description]
-                )
-                or search_string == ""
-            ):
-                table.add_row(
-                    table_id,
-                    url,
-                    summary,
-                    tags,
-                    reminder,
-                    reading,
-                    meta_title,
-                    meta_description,
-                )
+    def on_input_changed(self, event: Input.Changed) -> None:
+        self.filter(event.value)
+        if self.filtered:
+            self.run_worker(self.ranked_search(), exclusive=True, group="search")
+        else:
+            self.workers.cancel_group(self, "search")
+
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        self.query_one(VirtualTable).focus()
+
+    def on_virtual_table_near_end(self, message: VirtualTable.NearEnd) -> None:
+        if self.filtered:
+            self.run_worker(self.load_page(), group="search")
 
     def compose(self) -> ComposeResult:
-        yield DataTable()
+        yield Input(placeholder="Search links", id="search")
+        yield VirtualTable(
+            [
+                ("ID", 8),
+                ("URL", 40),
+                ("Summary", 30),
+                ("Tags", 20),
+                ("Reminder", 8),
+                ("Reading", 7),
+                ("Meta.Title", 50),
+                ("Meta.Description", 50),
+            ],
+            self.link_row,
+        )
         yield Footer()
 
     async def on_mount(self) -> None:
-        await self.refresh_table()
+        # rows from an earlier visit are still in the replica, draw them straight away
+        self.show_replica()
+        self.query_one(VirtualTable).focus()
+        self.run_worker(self.refresh_table(), exclusive=True)
 
     def action_back(self) -> None:
         self.app.switch_mode("base")
 
     def action_search(self) -> None:
-        def execute_search(search_str: str | None) -> None:
-            if search_str:
-                self.update_table(search_str)
-
-        self.app.push_screen(FindLinkSearch(id="find-link-search"), execute_search)
+        self.query_one("#search", Input).focus()
 
     def action_clear_search(self) -> None:
-        self.update_table("")
+        self.query_one("#search", Input).clear()
 
     def action_move_cursor(self, direction: str) -> None:
-        table = self.query_one(DataTable)
+        table = self.query_one(VirtualTable)
         table.move_cursor(
             row=table.cursor_row + 1 if direction == "down" else table.cursor_row - 1
         )
 
     async def action_delete_row(self) -> None:
-        table = self.query_one(DataTable)
-        row_key, _ = table.coordinate_to_cell_key(table.cursor_coordinate)
-        link_id = table.get_cell_at(table.cursor_coordinate)
-        async with httpx.AsyncClient() as client:
-            await client.delete(f"{API_HOST}/link/{link_id}")
-        table.remove_row(row_key)
+        table = self.query_one(VirtualTable)
+        if table.cursor_key is None:
+            return
+        await self.app.outbox.delete("link", table.cursor_key)
         await self.refresh_table()
 
     async def action_edit_row(self) -> None:
-        table = self.query_one(DataTable)
-        row_key, _ = table.coordinate_to_cell_key(table.cursor_coordinate)
-        row_data = table.get_row(row_key)
+        table = self.query_one(VirtualTable)
+        link = None if table.cursor_key is None else self.get_link(table.cursor_key)
+        if link is None:
+            return
 
         await self.app.push_screen(
             LinkInput(
-                link_id=row_data[0],
-                link=row_data[1],
-                summary=row_data[2],
-                tags=row_data[3],
-                reading=True if row_data[5] == "✅" else False,
-                reminder=True if row_data[4] == "✅" else False,
+                link_id=link["link_id"],
+                link=link["url"],
+                summary=link["summary"],
+                tags=list(link["tags"]),
+                reading=link["reading"],
+                reminder=link["reminder"],
                 is_editing=True,
             ),
             self.refresh_table,
         )
 
 
-class FindLinkSearch(ModalScreen):
-    BINDINGS = [
-        Binding(
-            key="escape",
-            action="app.pop_screen",
-            description="Close Find",
-        ),
-    ]
-
-    def compose(self) -> ComposeResult:
-        yield Input(placeholder="Search for a link")
-        yield Footer()
-
-    def on_input_submitted(self, event: Input.Submitted) -> None:
-        if event.value:
-            self.dismiss(event.value)
-
-
 class LinkInput(Screen):
     BINDINGS = [
         Binding(
@@ -236,7 +307,6 @@ class LinkInput(Screen):
         self.is_editing = is_editing
 
     def compose(self) -> ComposeResult:
-        tag_list = httpx.get(f"{API_HOST}/tags").json()
         yield Container(
             Container(
                 Static("Link:"),
@@ -250,7 +320,10 @@ class LinkInput(Screen):
             ),
             Container(
                 Static("Tags: " + " ".join(self.tags), id="tag-status"),
-                Input(id="tags", suggester=SuggestFromList(tag_list)),
+                Input(
+                    id="tags",
+                    suggester=TagSuggester(self.app.tag_cache, self.app.client),
+                ),
                 id="tag-input-container",
             ),
             Horizontal(
@@ -263,6 +336,10 @@ class LinkInput(Screen):
             id="link-input",
         )
 
+    def on_mount(self) -> None:
+        # fetched now rather than on the first keystroke in the tags input
+        self.run_worker(self.app.tag_cache.load(self.app.client))
+
     async def on_input_submitted(self, event: Input.Submitted) -> None:
         link_value = self.query_one("#links", Input).value
         summary_value = self.query_one("#summary", Input).value
@@ -273,34 +350,36 @@ class LinkInput(Screen):
             self.tags.append(event.value)
 
         if not self.is_editing:
-            async with httpx.AsyncClient() as client:
-                await client.post(
-                    f"{API_HOST}/link",
-                    json={
-                        "url": link_value,
-                        "summary": summary_value,
-                        "tags": self.tags,
-                        "reminder": reminder_value,
-                        "reading": reading_value,
-                    },
-                )
-
+            await self.app.outbox.save(
+                "link",
+                {
+                    "url": link_value,
+                    "summary": summary_value,
+                    "tags": self.tags,
+                    "reminder": reminder_value,
+                    "reading": reading_value,
+                },
+            )
+
+            self.app.flush_outbox()
+            self.app.tag_cache.add(self.tags)
             self.dismiss()
             self.tags.clear()
 
         else:
-            async with httpx.AsyncClient() as client:
-                await client.patch(
-                    f"{API_HOST}/link/{self.link_id}",
-                    json={
-                        "url": link_value,
-                        "summary": summary_value,
-                        "tags": self.tags,
-                        "reminder": reminder_value,
-                        "reading": reading_value,
-                    },
-                )
-
+            await self.app.outbox.update(
+                "link",
+                self.link_id,
+                {
+                    "url": link_value,
+                    "summary": summary_value,
+                    "tags": self.tags,
+                    "reminder": reminder_value,
+                    "reading": reading_value,
+                },
+            )
+
+            self.app.tag_cache.add(self.tags)
             self.dismiss()
             self.tags.clear()
 
@@ -1,3 +1,4 @@
+import asyncio
 from os import getenv
 
 import httpx
@@ -5,12 +6,23 @@ import httpx
 from textual.app import ComposeResult
 from textual.binding import Binding
 from textual.containers import Container, Horizontal
-from textual.screen import Screen, ModalScreen
-from textual.suggester import SuggestFromList
-from textual.widgets import DataTable, Footer, Input, Static, Switch
+from textual.screen import Screen
+from textual.widgets import Footer, Input, Static, Switch
 
+from modules.table import VirtualTable
+from modules.tags import TagSuggester
 
-API_HOST = getenv("API_HOST", "http://localhost:8000")
+
+SEARCH_PAGE_SIZE = int(getenv("SEARCH_PAGE_SIZE", 200))
+# seconds of no typing before the api is asked for ranked results
+SEARCH_DEBOUNCE = float(getenv("SEARCH_DEBOUNCE", 0.3))
+
+
+def note_status(note: dict) -> int | str:
+    # not on the api yet, its id is only a placeholder
+    if note["note_id"] < 0:
+        return "failed" if note.get("failed") else "pending"
+    return note["note_id"]
 
 
 class NoteInput(Screen):
@@ -55,7 +67,6 @@ class NoteInput(Screen):
         self.is_editing = is_editing
 
     def compose(self) -> ComposeResult:
-        tag_list = httpx.get(f"{API_HOST}/tags").json()
         yield Container(
             Container(
                 Static("Note:"),
@@ -66,7 +77,7 @@ class NoteInput(Screen):
                 Static("Tags: " + " ".join(self.tags), id="tag-status"),
                 Input(
                     id="tags",
-                    suggester=SuggestFromList(tag_list),
+                    suggester=TagSuggester(self.app.tag_cache, self.app.client),
                 ),
                 id="tag-input-container",
             ),
@@ -80,6 +91,10 @@ class NoteInput(Screen):
             id="note-input",
         )
 
+    def on_mount(self) -> None:
+        # fetched now rather than on the first keystroke in the tags input
+        self.run_worker(self.app.tag_cache.load(self.app.client))
+
     def action_reminder(self) -> None:
         reminder = self.query_one("#reminder", Switch)
         reminder.value = not reminder.value
@@ -97,33 +112,35 @@ class NoteInput(Screen):
             if event.value and event.input.id == "tags":
                 self.tags.append(event.value)
 
-            async with httpx.AsyncClient() as client:
-                await client.post(
-                    f"{API_HOST}/note",
-                    json={
-                        "note": note_value,
-                        "tags": self.tags,
-                        "reminder": reminder_value,
-                        "reading": reading_value,
-                    },
-                )
-
+            await self.app.outbox.save(
+                "note",
+                {
+                    "note": note_value,
+                    "tags": self.tags,
+                    "reminder": reminder_value,
+                    "reading": reading_value,
+                },
+            )
+
+            self.app.flush_outbox()
+            self.app.tag_cache.add(self.tags)
             self.dismiss()
             self.tags.clear()
         else:
             if event.value and event.input.id == "tags":
                 self.tags.append(event.value)
 
-            async with httpx.AsyncClient() as client:
-                await client.patch(
-                    f"{API_HOST}/note/{self.note_id}",
-                    json={
-                        "note": note_value,
-                        "tags": self.tags,
-                        "reminder": reminder_value,
-                        "reading": reading_value,
-                    },
-                )
+            await self.app.outbox.update(
+                "note",
+                self.note_id,
+                {
+                    "note": note_value,
+                    "tags": self.tags,
+                    "reminder": reminder_value,
+                    "reading": reading_value,
+                },
+            )
+            self.app.tag_cache.add(self.tags)
             self.dismiss()
             self.tags.clear()
 
@@ -137,7 +154,8 @@ class NoteInput(Screen):
 
 
 class FindNote(Screen):
-    notes = []
+    # showing search results rather than the whole replica
+    filtered = False
 
     BINDINGS = [
         Binding(
@@ -173,125 +191,197 @@ class FindNote(Screen):
         ),
     ]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the current search, its results are loaded a page at a time
+        self.search_string = ""
+        self.results: dict[int, dict] = {}
+        # the replica's matches for it, a longer query only filters these
+        self.matches: list[int] = []
+
+    def get_note(self, note_id: int) -> dict | None:
+        # the api's copy when it's a ranked search result
+        return self.results.get(note_id) or self.app.replica.notes.get(note_id)
+
+    def note_row(self, note_id: int) -> tuple:
+        note = self.get_note(note_id)
+        if note is None:
+            return ()
+        return (
+            note_status(note),
+            note["note"],
+            note["created_at"],
+            note["tags"],
+            "✅" if bool(note["reminder"]) else "❌",
+            "✅" if bool(note["reading"]) else "❌",
+        )
+
+    def show_replica(self) -> None:
+        self.filtered = False
+        self.results.clear()
+        table = self.query_one(VirtualTable)
+        table.set_keys(list(self.app.replica.notes))
+
     async def refresh_table(self, result: bool | None = None) -> None:
-        self.notes.clear()
-        table = self.query_one(DataTable)
-        table.clear(columns=True)
-        table.cursor_type = "row"
-        table.add_columns(
-            "ID",
-            "Note",
-            "Created At",
-            "Tags",
-            "Reminder",
-            "Reading",
+        """
+        Sync the replica and redraw only the rows that changed
+        """
+        replica = self.app.replica
+        # sent first, so the sync brings back what they became on the api
+        await self.app.outbox.flush(self.app.client)
+        delta = await replica.sync(self.app.client)
+        if self.filtered:
+            self.filter(self.search_string, narrow=False)
+            return
+        if delta.reset:
+            self.show_replica()
+            return
+
+        table = self.query_one(VirtualTable)
+        table.remove_keys(set(delta.deleted_notes))
+        if delta.notes:
+            shown = set(table.keys)
+            changed = [note_id for note_id in delta.notes if note_id in replica.notes]
+            table.refresh_rows([key for key in changed if key in shown])
+            added = [key for key in dict.fromkeys(changed) if key not in shown]
+            table.append_keys(added)
+
+    def filter(self, query: str, narrow: bool = True) -> None:
+        """
+        Show the replica's notes matching the query, as it's typed
+        """
+        query = " ".join(query.lower().split())
+        if not query:
+            self.search_string = ""
+            self.show_replica()
+            return
+
+        replica = self.app.replica
+        within = None
+        if narrow and self.search_string and query.startswith(self.search_string):
+            within = self.matches
+        self.matches = replica.search("note", query, within)
+        self.search_string = query
+        self.filtered = True
+        self.results = {}
+        self.query_one(VirtualTable).set_keys(list(self.matches))
+
+    async def search_page(self, offset: int) -> list[dict]:
+        search_request = await self.app.client.get(
+            "/search",
+            params={
+                "q": self.search_string,
+                "type": "note",
+                "limit": SEARCH_PAGE_SIZE,
+                "offset": offset,
+            },
+        )
+        search_request.raise_for_status()
+        return [result["note"] for result in search_request.json()]
+
+    async def ranked_search(self) -> None:
+        """
+        Once typing pauses, put the api's ranked results ahead of the replica's
+        matches, the matches the api didn't rank stay after them. The next
+        keystroke cancels this, request and all.
+        """
+        await asyncio.sleep(SEARCH_DEBOUNCE)
+        try:
+            notes = await self.search_page(0)
+        except httpx.HTTPError:
+            # offline, the replica's matches stay
+            return
+        self.results = {note["note_id"]: note for note in notes}
+        self.show_results(has_more=len(notes) == SEARCH_PAGE_SIZE)
+
+    async def load_page(self) -> None:
+        try:
+            notes = await self.search_page(len(self.results))
+        except httpx.HTTPError:
+            return
+        for note in notes:
+            self.results.setdefault(note["note_id"], note)
+        self.show_results(has_more=len(notes) == SEARCH_PAGE_SIZE)
+
+    def show_results(self, has_more: bool) -> None:
+        # pending and not yet indexed notes are only found locally
+        local = [note_id for note_id in self.matches if note_id not in self.results]
+        self.query_one(VirtualTable).set_keys(
+            list(self.results) + local, has_more=has_more
         )
 
-        async with httpx.AsyncClient() as client:
-            note_request = await client.get(f"{API_HOST}/note")
-            self.notes = note_request.json()
-            for note in self.notes:
-                table_id = note["note_id"]
-                note_str = note["note"]
-                created_at = note["created_at"]
-                tags = note["tags"]
-                reminder = "✅" if bool(note["reminder"]) else "❌"
-                reading = "✅" if bool(note["reading"]) else "❌"
-                table.add_row(
-                    table_id,
-                    note_str,
-                    created_at,
-                    tags,
-                    reminder,
-                    reading,
-                )
-
-    def update_table(self, search_string: str) -> None:
-        table = self.query_one(DataTable)
-        table.clear()
-        for note in self.notes:
-            table_id = note["note_id"]
-            note_str = note["note"]
-            tags = note["tags"]
-            created_at = note["created_at"]
-            reminder = "✅" if bool(note["reminder"]) else "❌"
-            reading = "✅" if bool(note["reading"]) else "❌"
-
-            if any(search_string in s for s in [tags, note_str]) or search_string == "":
-                table.add_row(
-                    table_id,
-                    note_str,
-                    created_at,
-                    tags,
-                    reminder,
-                    reading,
-                )
+    def on_input_changed(self, event: Input.Changed) -> None:
+        self.filter(event.value)
+        if self.filtered:
+            self.run_worker(self.ranked_search(), exclusive=True, group="search")
+        else:
+            self.workers.cancel_group(self, "search")
+
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        self.query_one(VirtualTable).focus()
+
+    def on_virtual_table_near_end(self, message: VirtualTable.NearEnd) -> None:
+        if self.filtered:
+            self.run_worker(self.load_page(), group="search")
 
     def compose(self) -> ComposeResult:
-        yield DataTable()
+        yield Input(placeholder="Search notes", id="search")
+        yield VirtualTable(
+            [
+                ("ID", 8),
+                ("Note", 60),
+                ("Created At", 26),
+                ("Tags", 20),
+                ("Reminder", 8),
+                ("Reading", 7),
+            ],
+            self.note_row,
+        )
         yield Footer()
 
     async def on_mount(self) -> None:
-        await self.refresh_table()
+        # rows from an earlier visit are still in the replica, draw them straight away
+        self.show_replica()
+        self.query_one(VirtualTable).focus()
+        self.run_worker(self.refresh_table(), exclusive=True)
 
     def action_back(self) -> None:
         self.app.switch_mode("base")
 
     def action_search(self) -> None:
-        def execute_search(search_str: str | None) -> None:
-            if search_str:
-                self.update_table(search_str)
-
-        self.app.push_screen(FindNoteSearch(id="find-note-search"), execute_search)
+        self.query_one("#search", Input).focus()
 
     def action_clear_search(self) -> None:
-        self.update_table("")
+        self.query_one("#search", Input).clear()
 
     def action_move_cursor(self, direction: str) -> None:
-        table = self.query_one(DataTable)
+        table = self.query_one(VirtualTable)
         table.move_cursor(
             row=table.cursor_row + 1 if direction == "down" else table.cursor_row - 1
         )
 
     async def action_delete_row(self) -> None:
-        table = self.query_one(DataTable)
-        note_id = table.get_cell_at(table.cursor_coordinate)
-        async with httpx.AsyncClient() as client:
-            await client.delete(f"{API_HOST}/note/{note_id}")
+        table = self.query_one(VirtualTable)
+        if table.cursor_key is None:
+            return
+        await self.app.outbox.delete("note", table.cursor_key)
         await self.refresh_table()
 
     async def action_edit_row(self) -> None:
-        table = self.query_one(DataTable)
-        row_key, _ = table.coordinate_to_cell_key(table.cursor_coordinate)
-        row_data = table.get_row(row_key)
+        table = self.query_one(VirtualTable)
+        note = None if table.cursor_key is None else self.get_note(table.cursor_key)
+        if note is None:
+            return
 
         await self.app.push_screen(
             NoteInput(
                 id="note-input",
-                note_id=row_data[0],
+                note_id=note["note_id"],
                 is_editing=True,
-                note=row_data[1],
-                tags=row_data[3],
-                reading=True if row_data[5] == "✅" else False,
-                reminder=True if row_data[4] == "✅" else False,
+                note=note["note"],
+                tags=list(note["tags"]),
+                reading=note["reading"],
+                reminder=note["reminder"],
             ),
             self.refresh_table,
         )
-
-
-class FindNoteSearch(ModalScreen):
-    BINDINGS = [
-        Binding(
-            key="escape",
-            action="app.pop_screen",
-            description="Close Find",
-        ),
-    ]
-
-    def compose(self) -> ComposeResult:
-        yield Input(placeholder="Search for a note")
-        yield Footer()
-
-    def on_input_submitted(self, event: Input.Submitted) -> None:
-        if event.value:
-            self.dismiss(event.value)
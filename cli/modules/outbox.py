@@ -0,0 +1,160 @@
+import asyncio
+import copy
+from os import getenv
+
+import httpx
+
+from modules.replica import Replica, pending_item
+from modules.store import LocalStore, OutboxEntry
+
+OUTBOX_BATCH_SIZE = int(getenv("OUTBOX_BATCH_SIZE", 50))
+# seconds between attempts to send what's queued while the api is away
+OUTBOX_RETRY_INTERVAL = float(getenv("OUTBOX_RETRY_INTERVAL", 15.0))
+# replays of an entry the api keeps answering 429 or 5xx before it's parked
+OUTBOX_MAX_ATTEMPTS = int(getenv("OUTBOX_MAX_ATTEMPTS", 10))
+
+
+class Outbox:
+    """
+    Writes from the input and find screens. Each one is stored and shows up in
+    the replica straight away, flush sends it later: the queue is replayed in
+    order with the entry's Idempotency-Key until the api confirms it, so a save
+    made offline, or one whose answer got lost, lands exactly once.
+    """
+
+    def __init__(self, store: LocalStore, replica: Replica):
+        self.store = store
+        self.replica = replica
+        # the store and replica, only held between requests
+        self.lock = asyncio.Lock()
+        # one flush at a time, held across the requests
+        self.flushing = asyncio.Lock()
+        # outbox id of the entry whose request is out
+        self.sending: int | None = None
+
+    async def save(self, kind: str, body: dict) -> None:
+        # the screens reuse their lists, the replica needs its own
+        body = copy.deepcopy(body)
+        async with self.lock:
+            entry = self.store.enqueue("POST", f"/{kind}", body)
+            _, item_id, item = pending_item(entry)
+            self.replica.put(kind, item_id, item)
+
+    async def update(self, kind: str, item_id: int, body: dict) -> None:
+        body = copy.deepcopy(body)
+        async with self.lock:
+            item = {**self.replica.items(kind).get(item_id, {}), **body}
+            if item_id < 0 and -item_id != self.sending:
+                # still queued, the create goes out with the edit in it
+                fields = {key: item[key] for key in self.body_keys(kind) if key in item}
+                self.store.update_body(-item_id, fields)
+            else:
+                self.store.enqueue("PATCH", f"/{kind}/{item_id}", body)
+            self.replica.put(kind, item_id, item)
+
+    async def delete(self, kind: str, item_id: int) -> None:
+        async with self.lock:
+            if item_id < 0 and -item_id != self.sending:
+                # never reached the api, forgetting the create is enough
+                self.store.done(-item_id)
+                # with whatever was parked behind it
+                self.store.done_path(f"/{kind}/{item_id}")
+            else:
+                self.store.enqueue("DELETE", f"/{kind}/{item_id}", None)
+            self.replica.drop(kind, item_id)
+
+    def body_keys(self, kind: str) -> set[str]:
+        if kind == "link":
+            return {"url", "summary", "tags", "reminder", "reading"}
+        return {"note", "tags", "reminder", "reading"}
+
+    async def send(self, client: httpx.AsyncClient, entry: OutboxEntry) -> bool:
+        """
+        Replay one entry. False means the api can't be reached right now and
+        everything behind it has to wait. The lock is let go while the request
+        is out, an edit or delete of a create on its way is queued behind it
+        against the outbox id and pointed at the real id once the create lands.
+        """
+        async with self.lock:
+            # the batch was read before the last edits, the store has them
+            entry = self.store.get(entry.id)
+            if entry is None:
+                return True
+            self.sending = entry.id
+
+        try:
+            response = await client.request(
+                entry.method,
+                entry.path,
+                json=entry.body,
+                headers={"Idempotency-Key": entry.idempotency_key},
+            )
+        except httpx.HTTPError as e:
+            async with self.lock:
+                self.store.retry_later(entry.id, str(e))
+            return False
+        finally:
+            self.sending = None
+
+        async with self.lock:
+            return self.settle(entry, response)
+
+    def settle(self, entry: OutboxEntry, response: httpx.Response) -> bool:
+        error = f"{response.status_code} {response.text}"
+        saved = None
+
+        if response.status_code == 429 or response.is_server_error:
+            if entry.attempts + 1 < OUTBOX_MAX_ATTEMPTS:
+                self.store.retry_later(entry.id, error)
+                return False
+            # the api keeps turning it away, the rest of the queue shouldn't wait on it
+            self.store.fail(entry.id, error)
+        elif response.is_success and "error" not in response.json():
+            self.store.done(entry.id)
+            saved = response.json()
+        elif response.status_code == 404 and entry.method != "POST":
+            # already gone, which is what a delete wanted anyway
+            self.store.done(entry.id)
+        else:
+            self.store.fail(entry.id, error)
+
+        if entry.method == "POST":
+            kind, item_id, _ = pending_item(entry)
+            if saved:
+                # the real item comes down with the next sync
+                real_id = saved[f"{kind}_id"]
+                self.store.move_path(f"/{kind}/{item_id}", f"/{kind}/{real_id}")
+                self.replica.drop(kind, item_id)
+            else:
+                self.park(entry, kind, item_id, error)
+        return True
+
+    def park(self, entry: OutboxEntry, kind: str, item_id: int, error: str) -> None:
+        """
+        A create the api won't take, with the edits and deletes queued behind it
+        against its outbox id: there's no item on the api for them to reach
+        """
+        path = f"/{kind}/{item_id}"
+        item = self.replica.items(kind).get(item_id)
+        if item is None:
+            # deleted while it was on its way, nothing is left to keep
+            self.store.done(entry.id)
+            self.store.done_path(path)
+            return
+        self.store.fail_path(path, error)
+        self.replica.put(kind, item_id, {**item, "failed": True})
+
+    async def flush(self, client: httpx.AsyncClient) -> None:
+        """
+        Send what's queued, OUTBOX_BATCH_SIZE entries at a time, stopping at the
+        first one the api couldn't take
+        """
+        async with self.flushing:
+            while True:
+                async with self.lock:
+                    entries = self.store.pending(OUTBOX_BATCH_SIZE)
+                if not entries:
+                    return
+                for entry in entries:
+                    if not await self.send(client, entry):
+                        return
@@ -0,0 +1,214 @@
+import asyncio
+from dataclasses import dataclass, field
+
+import httpx
+
+from modules.store import LocalStore, OutboxEntry
+
+# the fields searched as you type, the same ones the api searches
+SEARCH_FIELDS = {
+    "link": ["url", "summary", "meta_title", "meta_description", "tags"],
+    "note": ["note", "tags"],
+}
+
+
+@dataclass
+class Delta:
+    """
+    What changed in the replica since the screens last drew it, by id
+    """
+
+    links: list[int] = field(default_factory=list)
+    notes: list[int] = field(default_factory=list)
+    deleted_links: list[int] = field(default_factory=list)
+    deleted_notes: list[int] = field(default_factory=list)
+    # the replica was rebuilt from scratch, anything drawn from it is stale
+    reset: bool = False
+
+    def merge(self, other: "Delta") -> None:
+        self.links += other.links
+        self.notes += other.notes
+        self.deleted_links += other.deleted_links
+        self.deleted_notes += other.deleted_notes
+        self.reset = self.reset or other.reset
+
+
+def search_text(kind: str, item: dict) -> str:
+    values = []
+    for name in SEARCH_FIELDS[kind]:
+        value = item.get(name) or ""
+        values.append(" ".join(value) if isinstance(value, list) else value)
+    return "\n".join(values).lower()
+
+
+def pending_item(entry: OutboxEntry) -> tuple[str, int, dict]:
+    """
+    How a create still in the outbox shows up in the replica: under the negative
+    of its outbox id until the api hands out the real one
+    """
+    kind = entry.path.strip("/").split("/")[0]
+    item_id = -entry.id
+    if kind == "link":
+        item = {"meta_title": "", "meta_description": "", **entry.body}
+    else:
+        item = {"created_at": "", **entry.body}
+    item[f"{kind}_id"] = item_id
+    return kind, item_id, item
+
+
+class Replica:
+    """
+    Local copy of the api's links, notes and tags, kept in step through
+    GET /changes. It starts from the local store, so screens have data before
+    the api answers, and after that only what was written since the last sync
+    is downloaded and redrawn. Writes waiting in the outbox are in it already.
+    """
+
+    def __init__(self, store: LocalStore | None = None):
+        self.version = 0
+        self.links: dict[int, dict] = {}
+        self.notes: dict[int, dict] = {}
+        self.tags: set[str] = set()
+        # lowercased search text of every item, kept in step with the items
+        self.index: dict[str, dict[int, str]] = {"link": {}, "note": {}}
+        self.store = store
+        # changes made here rather than synced, handed out with the next sync
+        self.local = Delta()
+        self.lock = asyncio.Lock()
+
+        if store is not None:
+            self.version, links, notes, self.tags = store.load()
+            for link_id, link in links.items():
+                self.set_item("link", link_id, link)
+            for note_id, note in notes.items():
+                self.set_item("note", note_id, note)
+            self.add_pending()
+
+    def items(self, kind: str) -> dict[int, dict]:
+        return self.links if kind == "link" else self.notes
+
+    def set_item(self, kind: str, item_id: int, item: dict) -> None:
+        self.items(kind)[item_id] = item
+        self.index[kind][item_id] = search_text(kind, item)
+
+    def pop_item(self, kind: str, item_id: int) -> dict | None:
+        self.index[kind].pop(item_id, None)
+        return self.items(kind).pop(item_id, None)
+
+    def search(
+        self, kind: str, query: str, within: list[int] | None = None
+    ) -> list[int]:
+        """
+        Ids of the items containing every word of the query. within narrows an
+        earlier result when the query was only added to.
+        """
+        index = self.index[kind]
+        terms = query.lower().split()
+        if within is None:
+            if not terms:
+                return list(index)
+            matches = [item_id for item_id, text in index.items() if terms[0] in text]
+            terms = terms[1:]
+        else:
+            matches = within
+        # one pass per word, each over what the last one left
+        for term in terms:
+            matches = [
+                item_id for item_id in matches if term in index.get(item_id, "")
+            ]
+        return matches
+
+    def add_pending(self) -> None:
+        for entry in self.store.pending():
+            if entry.method == "POST":
+                self.set_item(*pending_item(entry))
+        # creates the api turned away stay on screen until they're deleted
+        for entry in self.store.parked():
+            if entry.method == "POST":
+                kind, item_id, item = pending_item(entry)
+                self.set_item(kind, item_id, {**item, "failed": True})
+
+    def put(self, kind: str, item_id: int, item: dict) -> None:
+        self.set_item(kind, item_id, item)
+        (self.local.links if kind == "link" else self.local.notes).append(item_id)
+
+    def drop(self, kind: str, item_id: int) -> None:
+        if self.pop_item(kind, item_id) is not None:
+            if kind == "link":
+                self.local.deleted_links.append(item_id)
+            else:
+                self.local.deleted_notes.append(item_id)
+
+    def clear(self) -> None:
+        self.version = 0
+        self.links.clear()
+        self.notes.clear()
+        self.tags.clear()
+        self.index = {"link": {}, "note": {}}
+
+    async def fetch(self, client: httpx.AsyncClient, cursor: str | None = None) -> dict:
+        params = {"since": self.version}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/changes", params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def sync(self, client: httpx.AsyncClient) -> Delta:
+        """
+        Pull what changed on the api, page by page until there's no more. Offline
+        this only hands back the local changes, the screens keep showing what
+        they have.
+        """
+        # screens sync on their own schedule, one at a time keeps versions in order
+        async with self.lock:
+            delta, self.local = self.local, Delta()
+            delta.reset = delta.reset or self.version == 0
+
+            try:
+                changes = await self.fetch(client)
+                reset = changes["reset"]
+                if reset:
+                    # the api's database was replaced, nothing here can be trusted
+                    self.clear()
+                    changes = await self.fetch(client)
+            except httpx.HTTPError:
+                return delta
+
+            if reset:
+                delta.reset = True
+                if self.store is not None:
+                    self.add_pending()
+
+            while True:
+                self.apply(changes, delta)
+                if not changes["has_more"]:
+                    self.version = changes["version"]
+                if self.store is not None:
+                    # the version only moves on with the last page, a sync cut
+                    # short starts again from the one before
+                    self.store.save_changes({**changes, "version": self.version}, reset)
+                reset = False
+                if not changes["has_more"]:
+                    return delta
+                try:
+                    changes = await self.fetch(client, changes["cursor"])
+                except httpx.HTTPError:
+                    return delta
+
+    def apply(self, changes: dict, delta: Delta) -> None:
+        for link_id in changes["deleted"]["links"]:
+            if self.pop_item("link", link_id) is not None:
+                delta.deleted_links.append(link_id)
+        for note_id in changes["deleted"]["notes"]:
+            if self.pop_item("note", note_id) is not None:
+                delta.deleted_notes.append(note_id)
+
+        for link in changes["links"]:
+            self.set_item("link", link["link_id"], link)
+            delta.links.append(link["link_id"])
+        for note in changes["notes"]:
+            self.set_item("note", note["note_id"], note)
+            delta.notes.append(note["note_id"])
+
+        self.tags.update(changes["tags"])
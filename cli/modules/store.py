@@ -0,0 +1,198 @@
+import json
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass
+from os import getenv
+from pathlib import Path
+
+LOCAL_DB = getenv("LOCAL_DB", str(Path.home() / ".rememdia" / "rememdia.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS links (link_id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS notes (note_id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS tags (name TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    method TEXT NOT NULL,
+    path TEXT NOT NULL,
+    body TEXT,
+    idempotency_key TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+"""
+
+@dataclass
+class OutboxEntry:
+    id: int
+    method: str
+    path: str
+    body: dict | None
+    idempotency_key: str
+    attempts: int = 0
+
+
+class LocalStore:
+    """
+    A sqlite file next to the TUI holding the last synced copy of the replica
+    and the outbox of writes the api hasn't confirmed yet. The app starts from
+    it without waiting for the api, and nothing typed is lost while it's away.
+    """
+
+    def __init__(self, path: str = LOCAL_DB):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def load(self) -> tuple[int, dict[int, dict], dict[int, dict], set[str]]:
+        """
+        The replica as of the last sync: version, links, notes and tags
+        """
+        row = self.db.execute("SELECT value FROM state WHERE key = 'version'").fetchone()
+        version = int(row[0]) if row else 0
+        links = {
+            link_id: json.loads(data)
+            for link_id, data in self.db.execute("SELECT link_id, data FROM links")
+        }
+        notes = {
+            note_id: json.loads(data)
+            for note_id, data in self.db.execute("SELECT note_id, data FROM notes")
+        }
+        tags = {name for (name,) in self.db.execute("SELECT name FROM tags")}
+        return version, links, notes, tags
+
+    def save_changes(self, changes: dict, reset: bool = False) -> None:
+        """
+        Apply one GET /changes response, in a single transaction so the stored
+        version always matches the rows
+        """
+        with self.db:
+            if reset:
+                for table in ("links", "notes", "tags"):
+                    self.db.execute(f"DELETE FROM {table}")
+            self.db.executemany(
+                "DELETE FROM links WHERE link_id = ?",
+                [(link_id,) for link_id in changes["deleted"]["links"]],
+            )
+            self.db.executemany(
+                "DELETE FROM notes WHERE note_id = ?",
+                [(note_id,) for note_id in changes["deleted"]["notes"]],
+            )
+            self.db.executemany(
+                "INSERT OR REPLACE INTO links (link_id, data) VALUES (?, ?)",
+                [(link["link_id"], json.dumps(link)) for link in changes["links"]],
+            )
+            self.db.executemany(
+                "INSERT OR REPLACE INTO notes (note_id, data) VALUES (?, ?)",
+                [(note["note_id"], json.dumps(note)) for note in changes["notes"]],
+            )
+            self.db.executemany(
+                "INSERT OR IGNORE INTO tags (name) VALUES (?)",
+                [(name,) for name in changes["tags"]],
+            )
+            self.db.execute(
+                "INSERT OR REPLACE INTO state (key, value) VALUES ('version', ?)",
+                (str(changes["version"]),),
+            )
+
+    def enqueue(self, method: str, path: str, body: dict | None) -> OutboxEntry:
+        """
+        Persist a write before it's sent. The idempotency key is fixed here, so
+        every replay of the entry is the same request as far as the api knows.
+        """
+        key = str(uuid.uuid4())
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO outbox (method, path, body, idempotency_key, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (method, path, json.dumps(body), key, time.time()),
+            )
+        return OutboxEntry(cursor.lastrowid, method, path, body, key)
+
+    def pending(self, limit: int | None = None) -> list[OutboxEntry]:
+        rows = self.db.execute(
+            "SELECT id, method, path, body, idempotency_key, attempts FROM outbox "
+            "WHERE failed = 0 ORDER BY id LIMIT ?",
+            (-1 if limit is None else limit,),
+        )
+        return [
+            OutboxEntry(entry_id, method, path, json.loads(body), key, attempts)
+            for entry_id, method, path, body, key, attempts in rows
+        ]
+
+    def parked(self) -> list[OutboxEntry]:
+        rows = self.db.execute(
+            "SELECT id, method, path, body, idempotency_key, attempts FROM outbox "
+            "WHERE failed = 1 ORDER BY id"
+        )
+        return [
+            OutboxEntry(entry_id, method, path, json.loads(body), key, attempts)
+            for entry_id, method, path, body, key, attempts in rows
+        ]
+
+    def get(self, entry_id: int) -> OutboxEntry | None:
+        row = self.db.execute(
+            "SELECT id, method, path, body, idempotency_key, attempts FROM outbox "
+            "WHERE id = ? AND failed = 0",
+            (entry_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        entry_id, method, path, body, key, attempts = row
+        return OutboxEntry(entry_id, method, path, json.loads(body), key, attempts)
+
+    def move_path(self, old: str, new: str) -> None:
+        # edits queued against a create's outbox id, once it has a real one
+        with self.db:
+            self.db.execute("UPDATE outbox SET path = ? WHERE path = ?", (new, old))
+
+    def fail_path(self, path: str, error: str) -> None:
+        # edits queued against a create that was parked, they'd only get a 404
+        with self.db:
+            self.db.execute(
+                "UPDATE outbox SET failed = 1, last_error = ? "
+                "WHERE path = ? AND failed = 0",
+                (error, path),
+            )
+
+    def done_path(self, path: str) -> None:
+        with self.db:
+            self.db.execute("DELETE FROM outbox WHERE path = ?", (path,))
+
+    def update_body(self, entry_id: int, body: dict) -> None:
+        with self.db:
+            self.db.execute(
+                "UPDATE outbox SET body = ? WHERE id = ?", (json.dumps(body), entry_id)
+            )
+
+    def done(self, entry_id: int) -> None:
+        with self.db:
+            self.db.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+
+    def retry_later(self, entry_id: int, error: str) -> None:
+        with self.db:
+            self.db.execute(
+                "UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                (error, entry_id),
+            )
+
+    def fail(self, entry_id: int, error: str) -> None:
+        """
+        Park an entry the api rejected, replaying it would only fail again and
+        hold up everything queued after it
+        """
+        with self.db:
+            self.db.execute(
+                "UPDATE outbox SET failed = 1, attempts = attempts + 1, last_error = ? "
+                "WHERE id = ?",
+                (error, entry_id),
+            )
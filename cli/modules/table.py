@@ -0,0 +1,225 @@
+from typing import Callable, ClassVar
+
+from rich.cells import set_cell_size
+from rich.segment import Segment
+from textual.binding import Binding
+from textual.cache import LRUCache
+from textual.geometry import Size
+from textual.message import Message
+from textual.reactive import reactive
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+
+# rows drawn ahead of the end of what's loaded before asking for the next page
+PREFETCH_ROWS = 50
+
+
+def cell_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(item) for item in value)
+    return str(value).replace("\n", " ")
+
+
+class VirtualTable(ScrollView, can_focus=True):
+    """
+    A table that only holds the keys of its rows, the ids of the items in them.
+    A row's cells are asked for when it scrolls into view and the drawn line is
+    cached, so a screen with fifty thousand links costs the same to draw and
+    scroll as one with fifty. Columns have fixed widths, nothing is measured
+    across every row.
+    """
+
+    COMPONENT_CLASSES: ClassVar[set[str]] = {
+        "virtual-table--header",
+        "virtual-table--cursor",
+    }
+
+    DEFAULT_CSS = """
+    VirtualTable {
+        background: $surface;
+        color: $foreground;
+        height: 1fr;
+
+        & > .virtual-table--header {
+            text-style: bold;
+            background: $panel;
+            color: $foreground;
+        }
+
+        & > .virtual-table--cursor {
+            background: $block-cursor-blurred-background;
+            color: $block-cursor-blurred-foreground;
+        }
+
+        &:focus > .virtual-table--cursor {
+            background: $block-cursor-background;
+            color: $block-cursor-foreground;
+            text-style: $block-cursor-text-style;
+        }
+    }
+    """
+
+    BINDINGS = [
+        Binding("up", "cursor_up", show=False),
+        Binding("down", "cursor_down", show=False),
+        Binding("pageup", "page_up", show=False),
+        Binding("pagedown", "page_down", show=False),
+        Binding("home", "scroll_top", show=False),
+        Binding("end", "scroll_bottom", show=False),
+    ]
+
+    cursor_row = reactive(0)
+
+    class NearEnd(Message):
+        """
+        Rows close to the last loaded one are on screen, time for the next page
+        """
+
+    def __init__(
+        self,
+        columns: list[tuple[str, int]],
+        get_row: Callable[[int], tuple],
+        *args,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.columns = columns
+        self.get_row = get_row
+        self.keys: list[int] = []
+        # more rows exist than are loaded, NearEnd is posted when they're needed
+        self.has_more = False
+        self.lines: LRUCache[tuple[int, bool], Strip] = LRUCache(1024)
+        self.width = sum(width + 1 for _, width in columns)
+
+    @property
+    def cursor_key(self) -> int | None:
+        if 0 <= self.cursor_row < len(self.keys):
+            return self.keys[self.cursor_row]
+        return None
+
+    @property
+    def page_height(self) -> int:
+        # the header takes the first line of the view
+        return max(self.scrollable_content_region.height - 1, 1)
+
+    def set_keys(self, keys: list[int], has_more: bool = False) -> None:
+        """
+        Show these rows in this order. The cursor stays on the row it was on
+        if that row is still there.
+        """
+        current = self.cursor_key
+        self.keys = keys
+        self.has_more = has_more
+        self.lines.clear()
+        self.resize()
+        if current is not None and current in keys:
+            self.cursor_row = keys.index(current)
+        else:
+            self.cursor_row = min(self.cursor_row, max(len(keys) - 1, 0))
+            self.scroll_to(y=0, animate=False)
+
+    def append_keys(self, keys: list[int], has_more: bool = False) -> None:
+        self.keys.extend(keys)
+        self.has_more = has_more
+        self.resize()
+
+    def remove_keys(self, keys: set[int]) -> None:
+        if keys:
+            self.set_keys([key for key in self.keys if key not in keys], self.has_more)
+
+    def refresh_rows(self, keys: list[int]) -> None:
+        """
+        Forget the drawn lines of rows whose data changed
+        """
+        for key in keys:
+            self.lines.discard((key, False))
+            self.lines.discard((key, True))
+        self.refresh()
+
+    def resize(self) -> None:
+        self.virtual_size = Size(self.width, len(self.keys) + 1)
+        self.refresh()
+
+    def move_cursor(self, row: int) -> None:
+        self.cursor_row = row
+
+    def validate_cursor_row(self, row: int) -> int:
+        return max(0, min(row, len(self.keys) - 1))
+
+    def watch_cursor_row(self, old_row: int, new_row: int) -> None:
+        for row in (old_row, new_row):
+            if 0 <= row < len(self.keys):
+                self.lines.discard((self.keys[row], row == old_row))
+        top = round(self.scroll_y)
+        if new_row < top:
+            self.scroll_to(y=new_row, animate=False)
+        elif new_row >= top + self.page_height:
+            self.scroll_to(y=new_row - self.page_height + 1, animate=False)
+        self.refresh()
+
+    def action_cursor_up(self) -> None:
+        self.cursor_row -= 1
+
+    def action_cursor_down(self) -> None:
+        self.cursor_row += 1
+
+    def action_page_up(self) -> None:
+        self.cursor_row -= self.page_height
+
+    def action_page_down(self) -> None:
+        self.cursor_row += self.page_height
+
+    def action_scroll_top(self) -> None:
+        self.cursor_row = 0
+
+    def action_scroll_bottom(self) -> None:
+        self.cursor_row = len(self.keys) - 1
+
+    def on_focus(self) -> None:
+        self.lines.clear()
+
+    def on_blur(self) -> None:
+        self.lines.clear()
+
+    def notify_style_update(self) -> None:
+        super().notify_style_update()
+        self.lines.clear()
+
+    def render_cells(self, cells, style) -> Strip:
+        segments = []
+        for (_, width), value in zip(self.columns, cells):
+            text = set_cell_size(cell_text(value), width)
+            segments.append(Segment(text + " ", style))
+        return Strip(segments, self.width)
+
+    def render_row(self, index: int) -> Strip:
+        key = self.keys[index]
+        cursor = index == self.cursor_row
+        line = self.lines.get((key, cursor))
+        if line is None:
+            if cursor:
+                style = self.get_component_rich_style("virtual-table--cursor")
+            else:
+                style = self.rich_style
+            line = self.render_cells(self.get_row(key), style)
+            self.lines.set((key, cursor), line)
+        return line
+
+    def render_line(self, y: int) -> Strip:
+        scroll_x, scroll_y = self.scroll_offset
+        if y == 0:
+            style = self.get_component_rich_style("virtual-table--header")
+            line = self.render_cells([label for label, _ in self.columns], style)
+        else:
+            index = scroll_y + y - 1
+            if index >= len(self.keys):
+                return Strip.blank(self.size.width, self.rich_style)
+            if self.has_more and index >= len(self.keys) - PREFETCH_ROWS:
+                self.has_more = False
+                self.post_message(self.NearEnd())
+            line = self.render_row(index)
+        return line.crop(scroll_x, scroll_x + self.size.width).extend_cell_length(
+            self.size.width, self.rich_style
+        )
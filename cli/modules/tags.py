@@ -0,0 +1,83 @@
+import asyncio
+import time
+from bisect import bisect_left
+from os import getenv
+
+import httpx
+from textual.suggester import Suggester
+
+from modules.replica import Replica
+
+# seconds the tags from GET /tags are trusted before they're fetched again
+TAG_CACHE_TTL = float(getenv("TAG_CACHE_TTL", 300.0))
+
+
+class TagCache:
+    """
+    The api's tags, shared by every input screen. They're fetched at most once
+    per TAG_CACHE_TTL, and while the api is away the tags the replica synced
+    are used instead. Tags are kept sorted by their casefolded name so a prefix
+    is found by bisection however many there are.
+    """
+
+    def __init__(self, replica: Replica, ttl: float = TAG_CACHE_TTL):
+        self.replica = replica
+        self.ttl = ttl
+        self.keys: list[str] = []
+        self.tags: list[str] = []
+        self.fetched_at: float | None = None
+        self.lock = asyncio.Lock()
+
+    def set_tags(self, tags: set[str]) -> None:
+        pairs = sorted((tag.casefold(), tag) for tag in tags)
+        self.keys = [key for key, _ in pairs]
+        self.tags = [tag for _, tag in pairs]
+
+    def add(self, tags: list[str]) -> None:
+        # just typed into a save, suggested from now on
+        self.set_tags(set(self.tags) | set(tags))
+
+    async def load(self, client: httpx.AsyncClient) -> None:
+        async with self.lock:
+            fresh = self.fetched_at is not None and (
+                time.monotonic() - self.fetched_at < self.ttl
+            )
+            if fresh:
+                return
+            try:
+                response = await client.get("/tags")
+                response.raise_for_status()
+            except httpx.HTTPError:
+                # not marked as fetched, the next lookup tries the api again
+                self.set_tags(set(self.tags) | self.replica.tags)
+                return
+            self.set_tags(set(response.json()) | self.replica.tags)
+            self.fetched_at = time.monotonic()
+
+    def complete(self, prefix: str) -> str | None:
+        """
+        The first tag starting with the casefolded prefix
+        """
+        index = bisect_left(self.keys, prefix)
+        if index < len(self.keys) and self.keys[index].startswith(prefix):
+            return self.tags[index]
+        return None
+
+
+class TagSuggester(Suggester):
+    """
+    Completes tags from the app's tag cache. Input asks for suggestions in a
+    worker, so a cache that has to go to the api never holds up the screen.
+    """
+
+    def __init__(self, cache: TagCache, client: httpx.AsyncClient):
+        # the cache changes under it, so answers can't be kept
+        super().__init__(use_cache=False, case_sensitive=False)
+        self.tag_cache = cache
+        self.client = client
+
+    async def get_suggestion(self, value: str) -> str | None:
+        if not value:
+            return None
+        await self.tag_cache.load(self.client)
+        return self.tag_cache.complete(value)
@@ -0,0 +1,141 @@
+import httpx
+import pytest
+
+from modules.replica import Replica
+
+LINK = {
+    "url": "https://example.com",
+    "summary": "Example",
+    "tags": [],
+    "reminder": False,
+    "reading": False,
+}
+
+
+def mock_api(*responses) -> tuple[httpx.AsyncClient, list[tuple[str, str]]]:
+    """
+    A client answered with the given responses in order, or a callable per
+    request, returns it with the list of (method, path) it was asked for
+    """
+    requests = []
+    remaining = list(responses)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append((request.method, request.url.path))
+        response = remaining.pop(0) if remaining else httpx.Response(200, json={})
+        if callable(response):
+            response = await response(request)
+        return response
+
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(handler), base_url="http://api.test"
+    )
+    return client, requests
+
+
+@pytest.mark.asyncio
+async def test_edit_while_create_is_sent(outbox, store) -> None:
+    await outbox.save("link", LINK)
+
+    async def created(request: httpx.Request) -> httpx.Response:
+        # typed while the create is on its way, queued behind it
+        await outbox.update("link", -1, {"summary": "Changed"})
+        return httpx.Response(200, json={"link_id": 7, **LINK})
+
+    client, requests = mock_api(created)
+    await outbox.flush(client)
+
+    # pointed at the real id once the create landed
+    assert requests == [("POST", "/link"), ("PATCH", "/link/7")]
+    assert store.pending() == []
+    assert -1 not in outbox.replica.links
+
+
+@pytest.mark.asyncio
+async def test_parked_create(outbox, store) -> None:
+    await outbox.save("link", LINK)
+
+    async def rejected(request: httpx.Request) -> httpx.Response:
+        await outbox.update("link", -1, {"summary": "Changed"})
+        await outbox.save("note", {"note": "Next", "tags": []})
+        return httpx.Response(422, json={"detail": "invalid"})
+
+    client, requests = mock_api(rejected, httpx.Response(200, json={"note_id": 1}))
+    await outbox.flush(client)
+
+    # the edit is parked with the create instead of being sent to the placeholder
+    assert requests == [("POST", "/link"), ("POST", "/note")]
+    assert [(entry.method, entry.path) for entry in store.parked()] == [
+        ("POST", "/link"),
+        ("PATCH", "/link/-1"),
+    ]
+    assert store.pending() == []
+
+    # the link stays on screen as failed, edits included, after a restart too
+    link = outbox.replica.links[-1]
+    assert (link["summary"], link["failed"]) == ("Changed", True)
+    assert Replica(store).links[-1]["failed"]
+
+    # deleting it forgets the create and what was parked behind it
+    await outbox.delete("link", -1)
+    assert store.parked() == []
+    assert -1 not in outbox.replica.links
+
+
+@pytest.mark.asyncio
+async def test_create_deleted_while_sent(outbox, store) -> None:
+    await outbox.save("link", LINK)
+
+    async def rejected(request: httpx.Request) -> httpx.Response:
+        await outbox.delete("link", -1)
+        return httpx.Response(400, json={"detail": "invalid"})
+
+    client, requests = mock_api(rejected)
+    await outbox.flush(client)
+
+    assert requests == [("POST", "/link")]
+    assert store.pending() == [] and store.parked() == []
+    assert -1 not in outbox.replica.links
+
+
+@pytest.mark.asyncio
+async def test_server_errors_are_retried_until_parked(
+    outbox, store, monkeypatch
+) -> None:
+    monkeypatch.setattr("modules.outbox.OUTBOX_MAX_ATTEMPTS", 2)
+    await outbox.save("link", LINK)
+    client, requests = mock_api(httpx.Response(503), httpx.Response(503))
+
+    # the queue waits on the first failure
+    await outbox.flush(client)
+    assert [entry.attempts for entry in store.pending()] == [1]
+    assert not outbox.replica.links[-1].get("failed")
+
+    await outbox.flush(client)
+    assert requests == [("POST", "/link"), ("POST", "/link")]
+    assert store.pending() == []
+    assert outbox.replica.links[-1]["failed"]
+
+
+@pytest.mark.asyncio
+async def test_missing_item(outbox, store) -> None:
+    await outbox.update("link", 3, {"summary": "Changed"})
+    await outbox.delete("note", 4)
+    client, requests = mock_api(httpx.Response(404), httpx.Response(404))
+    await outbox.flush(client)
+
+    # already gone on the api, nothing to park
+    assert requests == [("PATCH", "/link/3"), ("DELETE", "/note/4")]
+    assert store.pending() == [] and store.parked() == []
+
+
+def test_move_path(store) -> None:
+    store.enqueue("PATCH", "/link/-1", {"summary": "Changed"})
+    store.enqueue("DELETE", "/link/-1", None)
+    store.enqueue("PATCH", "/link/-2", {"summary": "Other"})
+    store.move_path("/link/-1", "/link/7")
+    assert [entry.path for entry in store.pending()] == [
+        "/link/7",
+        "/link/7",
+        "/link/-2",
+    ]
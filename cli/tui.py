@@ -9,8 +9,13 @@ from textual.binding import Binding
 from textual.screen import Screen
 from textual.widgets import Footer, Static
 
+from modules.client import build_client
 from modules.link import FindLink, LinkInput
 from modules.note import FindNote, NoteInput
+from modules.outbox import OUTBOX_RETRY_INTERVAL, Outbox
+from modules.replica import Replica
+from modules.store import LocalStore
+from modules.tags import TagCache
 
 
 class Find(Screen):
@@ -88,8 +93,26 @@ class RemTui(App):
         yield Footer()
 
     def on_mount(self) -> None:
+        # one pooled client for every screen, closed when the app exits
+        self.client = build_client()
+        # links and notes as of the last sync, shared by the find screens, and
+        # the writes not sent yet, both kept on disk between runs
+        self.store = LocalStore()
+        self.replica = Replica(self.store)
+        self.outbox = Outbox(self.store, self.replica)
+        # tags for the input screens' suggesters
+        self.tag_cache = TagCache(self.replica)
+        self.set_interval(OUTBOX_RETRY_INTERVAL, self.flush_outbox)
+        self.flush_outbox()
         self.switch_mode("base")
 
+    def flush_outbox(self) -> None:
+        self.run_worker(self.outbox.flush(self.client), group="outbox")
+
+    async def on_unmount(self) -> None:
+        await self.client.aclose()
+        self.store.close()
+
 
 if __name__ == "__main__":
     app = RemTui()
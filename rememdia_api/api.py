@@ -2,39 +2,53 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import logging
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
-from fastapi import Depends, FastAPI, Request, status
+from fastapi import FastAPI, Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 
-from database import engine, Base, get_db
-from models import TagOrm
-from routers import links, notes
-from services.links import get_links_from_db
-from settings import REMINDER_INTERVAL, READING_INTERVAL
-from helpers import send_discord_message
+from database import ReadSessionLocal, get_db, migrate_database
+from helpers import client
+from routers import changes, items, links, notes, search, tags, webhooks
+from services.backfill import metadata_backfill
+from services.enrichment import enrichment_queue
+from services.idempotency import prune_idempotency_keys
+from services.metadata_cache import metadata_cache
+from services.notifications import notify_due_items
+from services.response_cache import response_cache, sync_caches
+from services.tag_index import tag_index
+from services.webhooks import webhook_dispatcher
+from settings import RESPONSE_CACHE_POLL_INTERVAL, SCHEDULER_TICK
 
 
 scheduler = AsyncIOScheduler()
 
 
-@scheduler.scheduled_job('interval', seconds=REMINDER_INTERVAL)
-async def check_reminders():
-    print("Checking reminders")
+@scheduler.scheduled_job('interval', seconds=SCHEDULER_TICK)
+async def check_due_items():
+    """
+    Send the reminder and reading items that are due, in one pass
+    """
+    print("Checking due items")
     async for db in get_db():
-        reminder_links = await get_links_from_db(db, reminder=True)
-        for link in reminder_links:
-            await send_discord_message(link.url)
+        await notify_due_items(db)
 
 
-@scheduler.scheduled_job('interval', seconds=READING_INTERVAL)
-async def check_reading():
-    print("Checking reading")
+@scheduler.scheduled_job('interval', hours=1)
+async def prune_expired_keys():
+    """
+    Forget Idempotency-Keys older than their ttl
+    """
     async for db in get_db():
-        reading_links = await get_links_from_db(db, reading=True)
-        for link in reading_links:
-            await send_discord_message(link.url)
+        await prune_idempotency_keys(db)
+
+
+@scheduler.scheduled_job('interval', seconds=RESPONSE_CACHE_POLL_INTERVAL)
+async def poll_change_version():
+    """
+    Drop the cached responses when another process wrote to the db
+    """
+    async with ReadSessionLocal() as db:
+        await sync_caches(db)
 
 
 @asynccontextmanager
@@ -42,11 +56,26 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     # Start scheduler when app starts
     scheduler.start()
     
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    
+    await migrate_database()
+
+    async with ReadSessionLocal() as db:
+        await tag_index.load(db)
+
+    # the cache table may have changed while the app was down
+    metadata_cache.clear()
+    # and so may the links and notes behind any cached response
+    response_cache.bump()
+    await client.start()
+    await enrichment_queue.start()
+    await webhook_dispatcher.start()
+
     yield
-    
+
+    await metadata_backfill.stop()
+    await enrichment_queue.stop()
+    await webhook_dispatcher.stop()
+    await client.stop()
+
     # Shut down scheduler when app stops
     scheduler.shutdown()
 
@@ -54,6 +83,11 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
 app = FastAPI(lifespan=lifespan)
 app.include_router(links.link_router)
 app.include_router(notes.note_router)
+app.include_router(items.item_router)
+app.include_router(search.search_router)
+app.include_router(tags.tag_router)
+app.include_router(webhooks.webhook_router)
+app.include_router(changes.change_router)
 
 
 # ref: https://github.com/tiangolo/fastapi/discussions/6678
@@ -67,14 +101,3 @@ async def validation_exception_handler(
     return JSONResponse(
         content=content, status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
     )
-
-
-@app.get("/tags")
-async def get_tags(db: AsyncSession = Depends(get_db)):
-    """
-    Get any tags that start with the tag_slice, used for autocomplete
-    """
-    query = select(TagOrm)
-    result = await db.execute(query)
-    tags = result.scalars().all()
-    return [tag.name for tag in tags]
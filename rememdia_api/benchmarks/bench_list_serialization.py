@@ -0,0 +1,119 @@
+"""
+Time and peak memory of a whole GET /link body, a LinkModel per row dumped by
+pydantic vs rows with their tags aggregated in sql dumped by orjson
+
+    REM_ENV=test uv run python -m benchmarks.bench_list_serialization
+"""
+
+import asyncio
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from database import Base
+from models import LinkModel, LinkOrm, LinkTagOrm, TagOrm
+from services.items import LINK, get_rows_page
+from services.pagination import apply_keyset
+
+ROW_COUNTS = [10_000, 100_000]
+TAGS_PER_LINK = 3
+TAG_POOL = 50
+
+LINK_LIST = TypeAdapter(list[LinkModel])
+
+
+def link_to_model(link: LinkOrm) -> LinkModel:
+    return LinkModel(
+        link_id=link.id,
+        url=link.url,
+        summary=link.summary,
+        tags=[tag.name for tag in link.tags],
+        reminder=link.reminder,
+        reading=link.reading,
+        created_at=link.created_at,
+        meta_title=link.meta_title,
+        meta_description=link.meta_description,
+        favicon_url=link.favicon_url,
+        enrichment_status=link.enrichment_status,
+    )
+
+
+def link_row(i: int) -> dict:
+    return {
+        "id": i,
+        "url": f"https://example.com/{i}",
+        "summary": f"link {i}",
+        "meta_title": f"Example {i}",
+        "meta_description": "An example page",
+        "enrichment_status": "done",
+        "reminder": i % 7 == 0,
+        "reading": i % 3 == 0,
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+async def models_body(db) -> bytes:
+    # the path GET /link used to take, ORM links with their tags selectin loaded
+    query = apply_keyset(
+        select(LinkOrm).options(selectinload(LinkOrm.tags)), LinkOrm, None, None
+    )
+    result = await db.execute(query)
+    return LINK_LIST.dump_json([link_to_model(link) for link in result.scalars()])
+
+
+async def rows_body(db) -> bytes:
+    links, _ = await get_rows_page(db, LINK)
+    return orjson.dumps(links)
+
+
+async def measure(sessions, build) -> tuple[float, float, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    async with sessions() as db:
+        body = await build(db)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 1024 / 1024, len(body)
+
+
+async def run(rows: int) -> None:
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            insert(TagOrm), [{"id": i, "name": f"tag{i}"} for i in range(TAG_POOL)]
+        )
+        await conn.execute(insert(LinkOrm), [link_row(i) for i in range(rows)])
+        await conn.execute(
+            insert(LinkTagOrm),
+            [
+                {"link_id": i, "tag_id": (i + j * 17) % TAG_POOL}
+                for i in range(rows)
+                for j in range(TAGS_PER_LINK)
+            ],
+        )
+    sessions = async_sessionmaker(engine, autoflush=False)
+
+    for label, build in [("LinkModel", models_body), ("rows+orjson", rows_body)]:
+        elapsed, peak, size = await measure(sessions, build)
+        print(f"{rows:>7} {label:<12} {elapsed:>9.0f} {peak:>9.1f} {size / 1024 / 1024:>8.1f}")
+
+    await engine.dispose()
+
+
+async def main() -> None:
+    print(f"{'rows':>7} {'path':<12} {'ms':>9} {'peak MB':>9} {'body MB':>8}")
+    for rows in ROW_COUNTS:
+        await run(rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+"""
+Metadata extraction per page, the old full download + BeautifulSoup path vs the
+streaming HeadParser in helpers.fetch_page_metadata. Pages are served from
+memory in network sized chunks so both paths pay for reading the body.
+
+    REM_ENV=test uv run python -m benchmarks.bench_metadata_parse [corpus dir]
+
+The corpus is every *.html file in the directory (default benchmarks/pages),
+e.g. saved with `curl -o benchmarks/pages/example.html https://example.com`.
+Without one a synthetic corpus of small, large and binary pages is used.
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+
+from helpers import fetch_page_metadata
+
+CORPUS_DIR = Path(__file__).parent / "pages"
+CHUNK_SIZE = 64 * 1024
+ROUNDS = 5
+
+HEAD = """<!doctype html><html><head>
+<title>Synthetic page {i}</title>
+<meta property="og:title" content="Synthetic page {i}">
+<meta property="og:description" content="A page with a {size} byte body">
+<link rel="canonical" href="https://example.com/{i}">
+{scripts}
+</head><body>
+"""
+
+
+def synthetic_corpus() -> dict[str, tuple[bytes, str]]:
+    pages = {}
+    for i, size in enumerate([20_000, 200_000, 2_000_000, 8_000_000]):
+        # inline scripts and styles bulk up real heads too
+        scripts = "<script>var x = 1;</script>\n" * (size // 10_000)
+        head = HEAD.format(i=i, size=size, scripts=scripts)
+        body = "<p>Lorem ipsum dolor sit amet.</p>\n" * (size // 34)
+        pages[f"page-{size}.html"] = ((head + body).encode(), "text/html")
+    pages["paper.pdf"] = (b"%PDF-1.7\n" + bytes(4_000_000), "application/pdf")
+    return pages
+
+
+def load_corpus(directory: Path) -> dict[str, tuple[bytes, str]]:
+    return {path.name: (path.read_bytes(), "text/html") for path in directory.glob("*.html")}
+
+
+def serve(corpus: dict[str, tuple[bytes, str]], read: dict[str, int]) -> httpx.AsyncClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        name = request.url.path.lstrip("/")
+        content, content_type = corpus[name]
+
+        async def body():
+            for start in range(0, len(content), CHUNK_SIZE):
+                read[name] += min(CHUNK_SIZE, len(content) - start)
+                yield content[start : start + CHUNK_SIZE]
+
+        return httpx.Response(200, headers={"Content-Type": content_type}, content=body())
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def soup_metadata(client: httpx.AsyncClient, url: str) -> tuple[str, str]:
+    """
+    the metadata fetch as it was before the streaming parser
+    """
+    result = await client.get(url)
+    result.raise_for_status()
+    soup = BeautifulSoup(result.content, "html.parser")
+
+    description = soup.find("meta", property="og:description")
+    description = str(description.get("content")) if isinstance(description, Tag) else ""
+
+    title = soup.find("meta", property="og:title")
+    title = str(title.get("content")) if isinstance(title, Tag) else ""
+
+    return title, description
+
+
+async def streaming_metadata(client: httpx.AsyncClient, url: str) -> tuple[str, str]:
+    with patch("helpers.client", client):
+        metadata = await fetch_page_metadata(url)
+    return metadata.title, metadata.description
+
+
+async def run(corpus: dict[str, tuple[bytes, str]], extract) -> dict[str, tuple[float, int]]:
+    results = {}
+    for name in corpus:
+        read = {name: 0}
+        client = serve(corpus, read)
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            await extract(client, f"https://bench.local/{name}")
+        elapsed = (time.perf_counter() - start) / ROUNDS
+        results[name] = (elapsed * 1000, read[name] // ROUNDS)
+        await client.aclose()
+    return results
+
+
+async def main() -> None:
+    directory = Path(sys.argv[1]) if len(sys.argv) > 1 else CORPUS_DIR
+    corpus = load_corpus(directory) if directory.is_dir() else {}
+    if not corpus:
+        print(f"No pages in {directory}, using a synthetic corpus")
+        corpus = synthetic_corpus()
+
+    before = await run(corpus, soup_metadata)
+    after = await run(corpus, streaming_metadata)
+
+    print(f"{'page':<28} {'size':>10} {'soup ms':>9} {'stream ms':>10} {'soup read':>10} {'stream read':>12}")
+    for name, (content, _) in corpus.items():
+        print(
+            f"{name[:28]:<28} {len(content):>10} {before[name][0]:>9.2f} "
+            f"{after[name][0]:>10.2f} {before[name][1]:>10} {after[name][1]:>12}"
+        )
+    print(
+        f"{'total':<28} {sum(len(c) for c, _ in corpus.values()):>10} "
+        f"{sum(ms for ms, _ in before.values()):>9.2f} "
+        f"{sum(ms for ms, _ in after.values()):>10.2f}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+"""
+Mixed read/write throughput on a sqlite file, bare engine vs the tuned
+writer/reader engines from database.create_sqlite_engines
+
+    REM_ENV=test uv run python -m benchmarks.bench_sqlite_engine
+"""
+
+import asyncio
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.future import select
+
+from database import Base, create_sqlite_engines
+from models import LinkOrm
+
+SEED_ROWS = 10_000
+WORKERS = 16
+DURATION = 5.0
+WRITE_RATIO = 0.2
+
+
+def link_row(i: int) -> dict:
+    return {
+        "url": f"https://example.com/{i}",
+        "summary": f"link {i}",
+        "meta_title": "",
+        "meta_description": "",
+        "enrichment_status": "done",
+        "reminder": False,
+        "reading": False,
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+async def seed(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(LinkOrm), [link_row(i) for i in range(SEED_ROWS)])
+
+
+async def run(writer: AsyncEngine, reader: AsyncEngine) -> dict:
+    await seed(writer)
+    write_sessions = async_sessionmaker(writer, autoflush=False)
+    read_sessions = async_sessionmaker(reader, autoflush=False)
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    deadline = time.perf_counter() + DURATION
+
+    async def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            try:
+                if rng.random() < WRITE_RATIO:
+                    async with write_sessions() as db:
+                        row = link_row(rng.randrange(10**9))
+                        await db.execute(insert(LinkOrm), [row])
+                        await db.commit()
+                    counts["writes"] += 1
+                else:
+                    offset = rng.randrange(SEED_ROWS - 50)
+                    async with read_sessions() as db:
+                        result = await db.execute(
+                            select(LinkOrm.id, LinkOrm.url)
+                            .order_by(LinkOrm.id)
+                            .limit(50)
+                            .offset(offset)
+                        )
+                        result.all()
+                    counts["reads"] += 1
+            except OperationalError:
+                counts["errors"] += 1
+
+    await asyncio.gather(*[worker(i) for i in range(WORKERS)])
+    await writer.dispose()
+    await reader.dispose()
+    return {key: value / DURATION for key, value in counts.items()}
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        bare = create_async_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bare.db'}")
+        before = await run(bare, bare)
+        after = await run(*create_sqlite_engines(str(Path(tmp) / "tuned.db")))
+
+    print(f"{WORKERS} workers, {DURATION}s, {WRITE_RATIO:.0%} writes, {SEED_ROWS} rows")
+    print(f"{'engine':<8} {'reads/s':>9} {'writes/s':>9} {'errors/s':>9}")
+    for label, result in [("bare", before), ("tuned", after)]:
+        print(
+            f"{label:<8} {result['reads']:>9.0f} {result['writes']:>9.0f} "
+            f"{result['errors']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
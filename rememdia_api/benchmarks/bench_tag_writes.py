@@ -0,0 +1,92 @@
+"""
+Query count and latency per link write, per-tag lookups vs resolve_tags
+
+    REM_ENV=test uv run python -m benchmarks.bench_tag_writes
+"""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.future import select
+
+from database import Base
+from models import LinkOrm, TagOrm
+from services.tags import resolve_tags
+
+WRITES = 200
+TAG_COUNTS = [1, 10, 50]
+# a tag pool a few times bigger than a write so every run mixes new and existing tags
+TAG_POOL = 150
+
+
+def new_link(i: int) -> LinkOrm:
+    return LinkOrm(
+        url=f"https://example.com/{i}",
+        summary="bench",
+        reminder=False,
+        reading=False,
+        created_at=datetime.now(timezone.utc),
+        meta_title="",
+        meta_description="",
+    )
+
+
+async def save_per_tag(db, i: int, names: list[str]) -> None:
+    link = new_link(i)
+    db.add(link)
+    for name in names:
+        result = await db.execute(select(TagOrm).where(TagOrm.name == name))
+        tag = result.scalar_one_or_none()
+        if tag is None:
+            tag = TagOrm(name=name)
+            db.add(tag)
+        link.tags.append(tag)
+    await db.commit()
+
+
+async def save_resolved(db, i: int, names: list[str]) -> None:
+    link = new_link(i)
+    tags = await resolve_tags(db, names)
+    link.tags = [tags[name] for name in names]
+    db.add(link)
+    await db.commit()
+
+
+async def run(save, tag_count: int) -> tuple[float, float]:
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    queries = 0
+
+    def count_query(*args) -> None:
+        nonlocal queries
+        queries += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_query)
+    sessions = async_sessionmaker(engine, autoflush=False)
+
+    start = time.perf_counter()
+    for i in range(WRITES):
+        names = [f"tag{(i * 7 + j) % TAG_POOL}" for j in range(tag_count)]
+        async with sessions() as db:
+            await save(db, i, names)
+    elapsed = time.perf_counter() - start
+
+    await engine.dispose()
+    return queries / WRITES, elapsed / WRITES * 1000
+
+
+async def main() -> None:
+    print(f"{'tags':>5} {'path':<14} {'queries/write':>14} {'ms/write':>9}")
+    for tag_count in TAG_COUNTS:
+        for label, save in [("per-tag", save_per_tag), ("resolve_tags", save_resolved)]:
+            queries, latency = await run(save, tag_count)
+            print(f"{tag_count:>5} {label:<14} {queries:>14.1f} {latency:>9.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
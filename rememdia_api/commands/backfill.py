@@ -0,0 +1,52 @@
+"""
+Fetch metadata for every link that has none, resuming the last run if it
+didn't finish. Ctrl-C leaves the checkpoint at the last committed batch.
+
+    uv run python -m commands.backfill [--restart] [--batch-size N]
+        [--concurrency N] [--host-concurrency N] [--host-interval SECONDS]
+"""
+
+import argparse
+import asyncio
+
+from database import migrate_database
+from helpers import client
+from services.backfill import MetadataBackfill
+from settings import (
+    BACKFILL_BATCH_SIZE,
+    BACKFILL_CONCURRENCY,
+    BACKFILL_HOST_CONCURRENCY,
+    BACKFILL_HOST_INTERVAL,
+)
+
+
+async def main(args: argparse.Namespace) -> None:
+    await migrate_database()
+    backfill = MetadataBackfill(
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        host_concurrency=args.host_concurrency,
+        host_interval=args.host_interval,
+    )
+    try:
+        checkpoint = await backfill.run(args.restart)
+    finally:
+        await client.stop()
+    print(
+        f"{checkpoint['status']}: {checkpoint['processed']} links looked at, "
+        f"{checkpoint['updated']} updated, {checkpoint['failed']} failed"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill link metadata")
+    parser.add_argument(
+        "--restart", action="store_true", help="start over from the first link"
+    )
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=BACKFILL_CONCURRENCY)
+    parser.add_argument(
+        "--host-concurrency", type=int, default=BACKFILL_HOST_CONCURRENCY
+    )
+    parser.add_argument("--host-interval", type=float, default=BACKFILL_HOST_INTERVAL)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,23 @@
+import pytest_asyncio
+
+from unittest.mock import AsyncMock, patch
+
+from database import reset_database
+from helpers import PageMetadata
+from services.metadata_cache import metadata_cache
+
+
+@pytest_asyncio.fixture(autouse=True, loop_scope="module")
+async def reset_db():
+    await reset_database()
+    metadata_cache.clear()
+    yield
+
+
+@pytest_asyncio.fixture(loop_scope="module", scope="module")
+async def mock_fetch_page_metadata():
+    with patch(
+        "services.metadata_cache.fetch_page_metadata", new_callable=AsyncMock
+    ) as mock:
+        mock.return_value = PageMetadata("Mocked Title", "Mocked Description")
+        yield mock
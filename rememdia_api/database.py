@@ -1,17 +1,120 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    create_async_engine,
+    async_sessionmaker,
+    AsyncSession,
+)
 from typing import AsyncGenerator
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from settings import (
+    DATABASE_PATH,
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_READ_POOL_SIZE,
+    ENVIRONMENT,
+    SQLITE_BUSY_TIMEOUT,
+    SQLITE_CACHE_SIZE,
+    SQLITE_MMAP_SIZE,
+    SQLITE_SYNCHRONOUS,
+    EnvironmentEnum,
+)
+
+
+def sqlite_pragmas(read_only: bool = False) -> list[str]:
+    pragmas = [
+        f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT}",
+        f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}",
+        f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}",
+        f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    else:
+        # WAL lets readers keep going while the writer commits
+        pragmas.insert(0, "PRAGMA journal_mode = WAL")
+    return pragmas
+
+
+def apply_pragmas(engine: AsyncEngine, pragmas: list[str]) -> None:
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def create_sqlite_engines(path: str) -> tuple[AsyncEngine, AsyncEngine]:
+    """
+    Build the writer and reader engines for a sqlite file. All writes go through
+    a single pooled connection so they queue in the pool instead of fighting over
+    the database lock, reads get their own pool of query_only connections.
+    """
+    url = f"sqlite+aiosqlite:///{path}"
+    writer = create_async_engine(
+        url,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    apply_pragmas(writer, sqlite_pragmas())
+
+    reader = create_async_engine(
+        url,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=DB_READ_POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    apply_pragmas(reader, sqlite_pragmas(read_only=True))
+
+    return writer, reader
 
-from settings import ENVIRONMENT, EnvironmentEnum
 
 # Create engine
-if ENVIRONMENT == EnvironmentEnum.TEST:
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:", connect_args={})
+if DATABASE_URL and ENVIRONMENT == EnvironmentEnum.TEST:
+    # every test runs on its own event loop, so don't keep connections around
+    engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+    read_engine = engine
+elif DATABASE_URL:
+    engine = create_async_engine(
+        DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+    )
+    read_engine = engine
+elif ENVIRONMENT == EnvironmentEnum.TEST:
+    # a single pooled connection keeps the in-memory db alive between sessions and
+    # makes background workers wait their turn instead of sharing a transaction
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={},
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+    )
+    read_engine = engine
 else:
-    engine = create_async_engine("sqlite+aiosqlite:///./rememdia.db", connect_args={})
+    engine, read_engine = create_sqlite_engines(DATABASE_PATH)
 
 # Create session
 SessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = async_sessionmaker(
+    autocommit=False, autoflush=False, bind=read_engine
+)
 
 
 class Base(DeclarativeBase):
@@ -26,7 +129,46 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         await db.close()
 
 
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+MIGRATIONS_CONFIG = Path(__file__).parent / "alembic.ini"
+# the schema Base.metadata.create_all built before there were migrations
+BASELINE_REVISION = "0001"
+
+
+def alembic_config(connection: Connection) -> Config:
+    config = Config(MIGRATIONS_CONFIG)
+    config.attributes["connection"] = connection
+    return config
+
+
+def upgrade_schema(connection: Connection) -> None:
+    config = alembic_config(connection)
+    tables = inspect(connection).get_table_names()
+    if "links" in tables and "alembic_version" not in tables:
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, "head")
+
+
+def rebuild_schema(connection: Connection) -> None:
+    config = alembic_config(connection)
+    command.downgrade(config, "base")
+    command.upgrade(config, "head")
+
+
+async def migrate_database() -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade_schema)
+
+
 async def reset_database() -> None:
+    # a fresh pool, the old one may be tied to the event loop of an earlier test
+    await engine.dispose()
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(rebuild_schema)
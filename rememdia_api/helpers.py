@@ -1,13 +1,72 @@
+import codecs
 import logging
 import httpx
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from settings import (
+    HTTP2,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_MAX_REDIRECTS,
+    HTTP_TIMEOUT,
+    METADATA_MAX_BYTES,
+)
+
+
+def build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        follow_redirects=True,
+        max_redirects=HTTP_MAX_REDIRECTS,
+        http2=HTTP2,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    )
+
+
+class SharedClient:
+    """
+    The one httpx client for outgoing requests, opened in the lifespan and closed
+    on shutdown. Everything shares its connection pool, so repeat requests to a
+    host reuse a kept alive connection instead of a new TCP and TLS handshake.
+    Outside the app (scripts, benchmarks) it opens on first use.
+    """
+
+    def __init__(self):
+        self.client: httpx.AsyncClient | None = None
+
+    @property
+    def current(self) -> httpx.AsyncClient:
+        if self.client is None or self.client.is_closed:
+            self.client = build_client()
+        return self.client
 
-from bs4 import BeautifulSoup
-from bs4.element import Tag
+    async def start(self) -> None:
+        self.current
 
-from settings import DISCORD_WEBHOOK
+    async def stop(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
 
+    def stream(self, method: str, url: str, **kwargs):
+        return self.current.stream(method, url, **kwargs)
 
-client = httpx.AsyncClient(follow_redirects=True)
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.current.get(url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.current.post(url, **kwargs)
+
+
+client = SharedClient()
 
 
 def configure_logging(logger_name: str = __name__) -> logging.Logger:
@@ -32,45 +91,127 @@ def configure_logging(logger_name: str = __name__) -> logging.Logger:
 logger = configure_logging()
 
 
-async def get_link_metadata(url: str) -> tuple[str, str]:
-    """
-    Parse the page with beautifulsoup and provide metadata about the link
-    https://www.reddit.com/r/discordapp/comments/82p8i6/a_basic_tutorial_on_how_to_get_the_most_out_of/
-    """
-    try:
-        if not url.startswith("http"):
-            url = f"https://{url}"
+HTML_CONTENT_TYPES = {"text/html", "application/xhtml+xml"}
 
-        result = await client.get(url)
-        soup = BeautifulSoup(result.content, "html.parser")
 
-        description = soup.find("meta", property="og:description")
-        description = (
-            str(description.get("content")) if isinstance(description, Tag) else ""
-        )
+@dataclass
+class PageMetadata:
+    title: str
+    description: str
+    etag: str | None = None
+    last_modified: str | None = None
+    canonical_url: str | None = None
+    favicon_url: str | None = None
 
-        title = soup.find("meta", property="og:title")
-        title = str(title.get("content")) if isinstance(title, Tag) else ""
 
-    except Exception as exc:
-        logger.exception("Error while fetching page metadata", exc_info=exc)
-        return "", ""
+class HeadParser(HTMLParser):
+    """
+    Incremental parser that collects the metadata tags of a page as it's fed,
+    done is set once the head closes or the body starts
+    """
 
-    else:
-        return title, description
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta: dict[str, str] = {}
+        self.title = ""
+        self.canonical: str | None = None
+        self.favicon: str | None = None
+        self.in_title = False
+        self.done = False
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        values = {name: value or "" for name, value in attrs}
+        if tag == "meta":
+            key = (values.get("property") or values.get("name") or "").lower()
+            if key and "content" in values:
+                self.meta.setdefault(key, values["content"])
+        elif tag == "link" and values.get("href"):
+            rel = values.get("rel", "").lower().split()
+            if "canonical" in rel and self.canonical is None:
+                self.canonical = values["href"]
+            elif "icon" in rel and self.favicon is None:
+                self.favicon = values["href"]
+        elif tag == "title":
+            self.in_title = True
+        elif tag == "body":
+            self.done = True
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "title":
+            self.in_title = False
+        elif tag == "head":
+            self.done = True
+
+    def handle_data(self, data: str) -> None:
+        if self.in_title:
+            self.title += data
+
+    def first_meta(self, *keys: str) -> str:
+        return next((self.meta[key] for key in keys if self.meta.get(key)), "")
+
+
+def response_decoder(response: httpx.Response) -> codecs.IncrementalDecoder:
+    try:
+        return codecs.getincrementaldecoder(response.charset_encoding or "utf-8")(
+            errors="replace"
+        )
+    except LookupError:
+        return codecs.getincrementaldecoder("utf-8")(errors="replace")
 
 
-async def send_discord_message(message: str):
-    if not DISCORD_WEBHOOK:
-        logger.warning("No discord webhook found")
-        return
+async def fetch_page_metadata(
+    url: str, etag: str | None = None, last_modified: str | None = None
+) -> PageMetadata | None:
+    """
+    Stream the page through HeadParser and provide metadata about the link,
+    raises on failure. Reading stops at the end of the head or after
+    METADATA_MAX_BYTES, and anything that isn't html isn't read at all.
+    With the validators from an earlier fetch the request is conditional and
+    None is returned when the page hasn't changed.
+    https://www.reddit.com/r/discordapp/comments/82p8i6/a_basic_tutorial_on_how_to_get_the_most_out_of/
+    """
+    if not url.startswith("http"):
+        url = f"https://{url}"
+
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    async with client.stream("GET", url, headers=headers) as result:
+        if result.status_code == 304:
+            return None
+        result.raise_for_status()
+        metadata = PageMetadata(
+            title="",
+            description="",
+            etag=result.headers.get("ETag"),
+            last_modified=result.headers.get("Last-Modified"),
+        )
+
+        media_type = result.headers.get("Content-Type", "").split(";")[0]
+        if media_type and media_type.strip().lower() not in HTML_CONTENT_TYPES:
+            return metadata
+
+        parser = HeadParser()
+        decoder = response_decoder(result)
+        read = 0
+        async for chunk in result.aiter_bytes():
+            parser.feed(decoder.decode(chunk))
+            read += len(chunk)
+            if parser.done or read >= METADATA_MAX_BYTES:
+                break
+        page_url = str(result.url)
+
+    title = " ".join(parser.title.split())
+    metadata.title = parser.first_meta("og:title", "twitter:title") or title
+    metadata.description = parser.first_meta(
+        "og:description", "twitter:description", "description"
+    )
+    if parser.canonical:
+        metadata.canonical_url = urljoin(page_url, parser.canonical)
+    if parser.favicon:
+        metadata.favicon_url = urljoin(page_url, parser.favicon)
+    return metadata
 
-    try:
-        webhook_embed = {
-            "title": "Rememdia",
-            "description": message,
-            "color": 0x00ff00,
-        }
-        await client.post(DISCORD_WEBHOOK, json={"embeds": [webhook_embed]})
-    except Exception as exc:
-        logger.exception("Error while sending discord message", exc_info=exc)
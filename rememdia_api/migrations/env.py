@@ -0,0 +1,54 @@
+import asyncio
+
+from alembic import context
+from sqlalchemy.engine import Connection
+
+from database import Base, engine
+import models  # noqa: F401 registers the tables on Base.metadata
+
+config = context.config
+target_metadata = Base.metadata
+
+
+def include_object(object, name, type_, reflected, compare_to) -> bool:
+    # the fts5 tables and their shadow tables are managed by hand in the migrations
+    return not (type_ == "table" and reflected and "_fts" in name)
+
+
+def run_migrations(connection: Connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(run_migrations)
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=engine.url.render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+# the app passes in its own connection so migrations share the app's engine
+# (and the in-memory db in tests), the alembic cli opens one from the engine
+connection = config.attributes.get("connection")
+if connection is not None:
+    run_migrations(connection)
+elif context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_async_migrations())
@@ -0,0 +1,111 @@
+"""enrichment status and search indexes
+
+Adds links.enrichment_status, then the search indexes for the backend:
+FTS5 tables kept in sync by triggers on sqlite, pg_trgm GIN indexes on
+postgres (skipped with a warning when the extension isn't available).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FTS_TABLES = {
+    "links_fts": ("links", ["url", "summary", "meta_title", "meta_description"]),
+    "notes_fts": ("notes", ["note"]),
+}
+
+TRIGRAM_INDEXES = {
+    "links": ["url", "summary", "meta_title", "meta_description"],
+    "notes": ["note"],
+}
+
+
+def fts_ddl(fts_table: str) -> list[str]:
+    source_table, columns = FTS_TABLES[fts_table]
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+
+    return [
+        f"CREATE VIRTUAL TABLE {fts_table} USING fts5("
+        f"{column_list}, content='{source_table}', content_rowid='id')",
+        f"CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {source_table} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {source_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) "
+        f"VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER {fts_table}_au AFTER UPDATE ON {source_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) "
+        f"VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+        # index the rows that were saved before the search index existed
+        f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')",
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # rows from before the enrichment queue had their metadata fetched on save
+    op.add_column(
+        "links",
+        sa.Column(
+            "enrichment_status", sa.String(), nullable=False, server_default="done"
+        ),
+    )
+
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        for fts_table in FTS_TABLES:
+            for statement in fts_ddl(fts_table):
+                op.execute(statement)
+
+    elif bind.dialect.name == "postgresql":
+        available = bind.execute(
+            sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        ).scalar()
+        if not available:
+            logging.getLogger("alembic").warning(
+                "pg_trgm is not available, search will run without trigram indexes"
+            )
+            return
+
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table, columns in TRIGRAM_INDEXES.items():
+            for column in columns:
+                op.create_index(
+                    f"ix_{table}_{column}_trgm",
+                    table,
+                    [column],
+                    postgresql_using="gin",
+                    postgresql_ops={column: "gin_trgm_ops"},
+                )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        for fts_table in FTS_TABLES:
+            op.execute(f"DROP TABLE IF EXISTS {fts_table}")
+            for suffix in ["ai", "ad", "au"]:
+                op.execute(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}")
+
+    elif bind.dialect.name == "postgresql":
+        for table, columns in TRIGRAM_INDEXES.items():
+            for column in columns:
+                op.execute(f"DROP INDEX IF EXISTS ix_{table}_{column}_trgm")
+
+    op.drop_column("links", "enrichment_status")
@@ -0,0 +1,54 @@
+"""filter indexes
+
+Indexes for the hot filters: (created_at, id) for the paginated listings,
+partial indexes over the rows flagged for reminder and reading, and tag_id
+indexes on the association tables for lookups by tag.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FLAGGED_TABLES = ["links", "notes"]
+TAG_TABLES = ["link_tags", "note_tags"]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in FLAGGED_TABLES:
+        op.create_index(f"ix_{table}_created_at", table, ["created_at", "id"])
+        for flag in ["reminder", "reading"]:
+            where = sa.column(flag) == sa.true()
+            op.create_index(
+                f"ix_{table}_{flag}",
+                table,
+                ["created_at", "id"],
+                sqlite_where=where,
+                postgresql_where=where,
+            )
+
+    for table in TAG_TABLES:
+        op.create_index(f"ix_{table}_tag_id", table, ["tag_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TAG_TABLES:
+        op.drop_index(f"ix_{table}_tag_id", table_name=table)
+
+    for table in FLAGGED_TABLES:
+        for flag in ["reminder", "reading"]:
+            op.drop_index(f"ix_{table}_{flag}", table_name=table)
+        op.drop_index(f"ix_{table}_created_at", table_name=table)
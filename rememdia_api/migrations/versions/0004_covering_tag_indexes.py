@@ -0,0 +1,36 @@
+"""covering tag indexes
+
+Widens the tag_id indexes on the association tables to (tag_id, item id) so
+filtering by tag is answered from the index alone.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TAG_TABLES = {"link_tags": "link_id", "note_tags": "note_id"}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, item_key in TAG_TABLES.items():
+        op.drop_index(f"ix_{table}_tag_id", table_name=table)
+        op.create_index(f"ix_{table}_tag_id", table, ["tag_id", item_key])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TAG_TABLES:
+        op.drop_index(f"ix_{table}_tag_id", table_name=table)
+        op.create_index(f"ix_{table}_tag_id", table, ["tag_id"])
@@ -0,0 +1,67 @@
+"""notification schedule
+
+Adds next_due_at and last_notified_at to links and notes with a partial index
+over the scheduled rows. Rows already flagged for reminder or reading are due
+straight away.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FLAGGED_TABLES = ["links", "notes"]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    now = datetime.now(timezone.utc)
+    for table in FLAGGED_TABLES:
+        op.add_column(
+            table, sa.Column("next_due_at", sa.DateTime(timezone=True), nullable=True)
+        )
+        op.add_column(
+            table,
+            sa.Column("last_notified_at", sa.DateTime(timezone=True), nullable=True),
+        )
+
+        due = sa.column("next_due_at").is_not(None)
+        op.create_index(
+            f"ix_{table}_next_due_at",
+            table,
+            ["next_due_at"],
+            sqlite_where=due,
+            postgresql_where=due,
+        )
+
+        rows = sa.table(
+            table,
+            sa.column("reminder", sa.Boolean()),
+            sa.column("reading", sa.Boolean()),
+            sa.column("next_due_at", sa.DateTime(timezone=True)),
+        )
+        op.execute(
+            rows.update()
+            .where(sa.or_(rows.c.reminder == sa.true(), rows.c.reading == sa.true()))
+            .values(next_due_at=now)
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in FLAGGED_TABLES:
+        op.drop_index(f"ix_{table}_next_due_at", table_name=table)
+        op.drop_column(table, "last_notified_at")
+        op.drop_column(table, "next_due_at")
@@ -0,0 +1,63 @@
+"""change versions
+
+Adds a change version to links, notes and tags, the change_version counter and
+tombstones for deleted items, the data behind GET /changes. Existing rows get
+version 1 so a replica starting from 0 receives them.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, Sequence[str], None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VERSIONED_TABLES = ["links", "notes", "tags"]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in VERSIONED_TABLES:
+        op.add_column(
+            table,
+            sa.Column("version", sa.Integer(), server_default="0", nullable=False),
+        )
+        op.execute(sa.table(table, sa.column("version")).update().values(version=1))
+        op.create_index(f"ix_{table}_version", table, ["version"])
+
+    change_version = op.create_table(
+        "change_version",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.bulk_insert(change_version, [{"id": 1, "version": 1}])
+
+    op.create_table(
+        "tombstones",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("item_type", sa.String(), nullable=False),
+        sa.Column("item_id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_tombstones_version", "tombstones", ["version"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_tombstones_version", table_name="tombstones")
+    op.drop_table("tombstones")
+    op.drop_table("change_version")
+    for table in VERSIONED_TABLES:
+        op.drop_index(f"ix_{table}_version", table_name=table)
+        op.drop_column(table, "version")
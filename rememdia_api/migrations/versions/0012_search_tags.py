@@ -0,0 +1,127 @@
+"""tags in the search index
+
+Rebuilds the sqlite FTS5 tables with a tags column. Tag names don't live in
+the links and notes tables, so the index keeps its own copy of the text instead
+of reading it from the content table. Triggers on the tag tables keep the
+names current, and the update triggers now fire only when an indexed column
+changes, not on every reminder or version bump. Postgres matches tag names in
+the query itself and needs nothing here.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0012"
+down_revision: Union[str, Sequence[str], None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FTS_TABLES = {
+    "links_fts": (
+        "links",
+        "link_tags",
+        "link_id",
+        ["url", "summary", "meta_title", "meta_description"],
+    ),
+    "notes_fts": ("notes", "note_tags", "note_id", ["note"]),
+}
+
+
+def tag_names(tag_table: str, item_key: str, item_id: str) -> str:
+    return (
+        f"(SELECT coalesce(group_concat(tags.name, ' '), '') FROM {tag_table} "
+        f"JOIN tags ON tags.id = {tag_table}.tag_id "
+        f"WHERE {tag_table}.{item_key} = {item_id})"
+    )
+
+
+def fts_ddl(fts_table: str) -> list[str]:
+    source_table, tag_table, item_key, columns = FTS_TABLES[fts_table]
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    assignments = ", ".join(f"{column} = new.{column}" for column in columns)
+    saved_tags = tag_names(tag_table, item_key, f"{source_table}.id")
+
+    def retag(row: str) -> str:
+        item_id = f"{row}.{item_key}"
+        return (
+            f"UPDATE {fts_table} SET tags = {tag_names(tag_table, item_key, item_id)} "
+            f"WHERE rowid = {item_id}; END"
+        )
+
+    return [
+        f"CREATE VIRTUAL TABLE {fts_table} USING fts5({column_list}, tags)",
+        f"CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {source_table} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, {column_list}, tags) "
+        f"VALUES (new.id, {new_values}, ''); END",
+        f"CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {source_table} BEGIN "
+        f"DELETE FROM {fts_table} WHERE rowid = old.id; END",
+        f"CREATE TRIGGER {fts_table}_au AFTER UPDATE OF {column_list} "
+        f"ON {source_table} BEGIN "
+        f"UPDATE {fts_table} SET {assignments} WHERE rowid = new.id; END",
+        f"CREATE TRIGGER {fts_table}_tags_ai AFTER INSERT ON {tag_table} BEGIN "
+        + retag("new"),
+        f"CREATE TRIGGER {fts_table}_tags_ad AFTER DELETE ON {tag_table} BEGIN "
+        + retag("old"),
+        # everything saved so far, with its tags
+        f"INSERT INTO {fts_table}(rowid, {column_list}, tags) "
+        f"SELECT id, {column_list}, {saved_tags} FROM {source_table}",
+    ]
+
+
+def content_fts_ddl(fts_table: str) -> list[str]:
+    # the index as 0002 made it, reading its text from the content table
+    source_table, _, _, columns = FTS_TABLES[fts_table]
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+
+    return [
+        f"CREATE VIRTUAL TABLE {fts_table} USING fts5("
+        f"{column_list}, content='{source_table}', content_rowid='id')",
+        f"CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {source_table} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {source_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) "
+        f"VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER {fts_table}_au AFTER UPDATE ON {source_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) "
+        f"VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+        f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')",
+    ]
+
+
+def drop_fts(fts_table: str) -> None:
+    for suffix in ["ai", "ad", "au", "tags_ai", "tags_ad"]:
+        op.execute(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}")
+    op.execute(f"DROP TABLE IF EXISTS {fts_table}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    for fts_table in FTS_TABLES:
+        drop_fts(fts_table)
+        for statement in fts_ddl(fts_table):
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    for fts_table in FTS_TABLES:
+        drop_fts(fts_table)
+        for statement in content_fts_ddl(fts_table):
+            op.execute(statement)
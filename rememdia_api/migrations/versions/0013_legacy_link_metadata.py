@@ -0,0 +1,35 @@
+"""links saved before enrichment
+
+0002 gave the links saved before metadata was fetched at all a done
+enrichment_status and an empty title. Those are marked pending once here, so
+the metadata backfill can go by the status alone and leave the pages that
+really have no title, like every non-HTML one, alone after they're fetched.
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0013"
+down_revision: Union[str, Sequence[str], None] = "0012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        "UPDATE links SET enrichment_status = 'pending' "
+        "WHERE enrichment_status = 'done' AND coalesce(meta_title, '') = ''"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # the backfill before this revision picks the empty titles up on its own
@@ -1,12 +1,70 @@
 from datetime import datetime, timezone
+from enum import Enum
 
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Boolean, String, Integer, ForeignKey
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    true,
+)
 from pydantic import BaseModel, ConfigDict
 
 from database import Base
 
 
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def add_filter_indexes(orm: type[Base]) -> None:
+    """
+    Index (created_at, id) for the paginated listings, plus partial indexes over
+    just the flagged rows for the reminder and reading checks. Only scheduled
+    rows go in the next_due_at index, so a scheduler tick reads just the due ones.
+    """
+    table = orm.__tablename__
+    Index(f"ix_{table}_created_at", orm.created_at, orm.id)
+    for flag in (orm.reminder, orm.reading):
+        Index(
+            f"ix_{table}_{flag.key}",
+            orm.created_at,
+            orm.id,
+            sqlite_where=flag == true(),
+            postgresql_where=flag == true(),
+        )
+    due = orm.next_due_at.is_not(None)
+    Index(
+        f"ix_{table}_next_due_at",
+        orm.next_due_at,
+        sqlite_where=due,
+        postgresql_where=due,
+    )
+
+
+class EnrichmentStatus(str, Enum):
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class WebhookStatus(str, Enum):
+    PENDING = "pending"
+    DEAD = "dead"
+    # given up at shutdown, the sender queues its items again itself
+    CANCELLED = "cancelled"
+
+
+class BackfillStatus(str, Enum):
+    RUNNING = "running"
+    STOPPED = "stopped"
+    DONE = "done"
+
+
 class LinkModel(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     link_id: int | None = None
@@ -14,6 +72,8 @@ class LinkModel(BaseModel):
     summary: str
     meta_title: str | None = None
     meta_description: str | None = None
+    favicon_url: str | None = None
+    enrichment_status: EnrichmentStatus | None = None
     reminder: bool
     reading: bool
     tags: list[str]
@@ -37,26 +97,49 @@ class LinkOrm(Base):
     summary: Mapped[str] = mapped_column(String, nullable=False)
     meta_title: Mapped[str] = mapped_column(String)
     meta_description: Mapped[str] = mapped_column(String)
+    favicon_url: Mapped[str | None] = mapped_column(String, nullable=True)
+    enrichment_status: Mapped[str] = mapped_column(
+        String,
+        default=EnrichmentStatus.PENDING.value,
+        server_default=EnrichmentStatus.DONE.value,
+        nullable=False,
+    )
     reminder: Mapped[bool] = mapped_column(Boolean)
     reading: Mapped[bool] = mapped_column(Boolean)
     created_at: Mapped[datetime] = mapped_column(
-        default=datetime.now(timezone.utc), nullable=False
+        DateTime(timezone=True), default=utc_now, nullable=False
+    )
+    next_due_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    last_notified_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
     )
+    # the change version of the last write, see services.changes
+    version: Mapped[int] = mapped_column(Integer, server_default="0", nullable=False)
     tags: Mapped[list["TagOrm"]] = relationship(
         "TagOrm", secondary="link_tags", back_populates="links"
     )
 
 
+add_filter_indexes(LinkOrm)
+Index("ix_links_version", LinkOrm.version)
+
+
 class LinkTagOrm(Base):
     __tablename__ = "link_tags"
+    # the reverse of the primary key, covers lookups of links by tag
+    __table_args__ = (Index("ix_link_tags_tag_id", "tag_id", "link_id"),)
     link_id: Mapped[int] = mapped_column(ForeignKey("links.id"), primary_key=True)
     tag_id: Mapped[int] = mapped_column(ForeignKey("tags.id"), primary_key=True)
 
 
 class TagOrm(Base):
     __tablename__ = "tags"
+    __table_args__ = (Index("ix_tags_version", "version"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, nullable=False)
     name: Mapped[str] = mapped_column(String, nullable=False, unique=True)
+    version: Mapped[int] = mapped_column(Integer, server_default="0", nullable=False)
     notes: Mapped[list["NoteOrm"]] = relationship(
         "NoteOrm", secondary="note_tags", back_populates="tags"
     )
@@ -89,14 +172,142 @@ class NoteOrm(Base):
     reminder: Mapped[bool] = mapped_column(Boolean)
     reading: Mapped[bool] = mapped_column(Boolean)
     created_at: Mapped[datetime] = mapped_column(
-        default=datetime.now(timezone.utc), nullable=False
+        DateTime(timezone=True), default=utc_now, nullable=False
+    )
+    next_due_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    last_notified_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
     )
+    # the change version of the last write, see services.changes
+    version: Mapped[int] = mapped_column(Integer, server_default="0", nullable=False)
     tags: Mapped[list["TagOrm"]] = relationship(
         "TagOrm", secondary="note_tags", back_populates="notes"
     )
 
 
+add_filter_indexes(NoteOrm)
+Index("ix_notes_version", NoteOrm.version)
+
+
 class NoteTagOrm(Base):
     __tablename__ = "note_tags"
+    # the reverse of the primary key, covers lookups of notes by tag
+    __table_args__ = (Index("ix_note_tags_tag_id", "tag_id", "note_id"),)
     note_id: Mapped[int] = mapped_column(ForeignKey("notes.id"), primary_key=True)
     tag_id: Mapped[int] = mapped_column(ForeignKey("tags.id"), primary_key=True)
+
+
+class UrlMetadataOrm(Base):
+    """
+    Page metadata keyed by normalized url, with the validators for revalidating it
+    """
+
+    __tablename__ = "url_metadata"
+    url: Mapped[str] = mapped_column(String, primary_key=True, nullable=False)
+    title: Mapped[str] = mapped_column(String, nullable=False)
+    description: Mapped[str] = mapped_column(String, nullable=False)
+    etag: Mapped[str | None] = mapped_column(String, nullable=True)
+    last_modified: Mapped[str | None] = mapped_column(String, nullable=True)
+    canonical_url: Mapped[str | None] = mapped_column(String, nullable=True)
+    favicon_url: Mapped[str | None] = mapped_column(String, nullable=True)
+    fetched_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=utc_now, nullable=False
+    )
+
+
+class WebhookOutboxOrm(Base):
+    """
+    Webhook messages that failed to send, retried with backoff while pending
+    and kept as dead letters once they run out of attempts
+    """
+
+    __tablename__ = "webhook_outbox"
+    __table_args__ = (Index("ix_webhook_outbox_due", "status", "next_attempt_at"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    status: Mapped[str] = mapped_column(
+        String, default=WebhookStatus.PENDING.value, nullable=False
+    )
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_error: Mapped[str | None] = mapped_column(String, nullable=True)
+    next_attempt_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=utc_now, nullable=False
+    )
+
+
+class ChangeVersionOrm(Base):
+    """
+    A single row holding the last change version handed out. Bumping it takes a
+    row lock, so versions become visible in the order their writes commit.
+    """
+
+    __tablename__ = "change_version"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, nullable=False)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class TombstoneOrm(Base):
+    """
+    A deleted link or note, kept so GET /changes can tell replicas to drop it
+    """
+
+    __tablename__ = "tombstones"
+    __table_args__ = (Index("ix_tombstones_version", "version"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, nullable=False)
+    item_type: Mapped[str] = mapped_column(String, nullable=False)
+    item_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class IdempotencyKeyOrm(Base):
+    """
+    The response to a create sent with an Idempotency-Key, returned again when
+    a client retries it instead of saving a duplicate
+    """
+
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (Index("ix_idempotency_keys_created_at", "created_at"),)
+    key: Mapped[str] = mapped_column(String, primary_key=True, nullable=False)
+    response: Mapped[dict] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=utc_now, nullable=False
+    )
+
+
+class BackfillCheckpointOrm(Base):
+    """
+    How far a backfill job got, written with every batch it commits so a run
+    that was stopped or crashed picks up after the last batch that landed
+    """
+
+    __tablename__ = "backfill_checkpoints"
+    job: Mapped[str] = mapped_column(String, primary_key=True, nullable=False)
+    status: Mapped[str] = mapped_column(String, nullable=False)
+    last_id: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    processed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    failed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    started_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=utc_now, nullable=False
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=utc_now, nullable=False
+    )
+
+
+class SearchResultModel(BaseModel):
+    item_type: str
+    rank: float
+    link: LinkModel | None = None
+    note: NoteModel | None = None
+
+
+class ItemModel(BaseModel):
+    item_type: str
+    link: LinkModel | None = None
+    note: NoteModel | None = None
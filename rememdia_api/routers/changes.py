@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_read_db
+from services.changes import get_changes
+from services.pagination import InvalidCursorError
+from settings import CHANGES_PAGE_SIZE, MAX_PAGE_SIZE
+
+change_router = APIRouter()
+
+
+@change_router.get("/changes")
+async def get_changes_since(
+    since: int = Query(default=0, ge=0),
+    limit: int = Query(default=CHANGES_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
+) -> dict:
+    """
+    Links, notes and tags written after the since version and the ids of deleted
+    items, for keeping a local replica in sync, limit changes a page. While
+    has_more is true ask again with the same since and the returned cursor, then
+    pass the returned version as since next time. Start from 0, and start over
+    from 0 when reset is true.
+    """
+    try:
+        return await get_changes(db, since, limit, cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
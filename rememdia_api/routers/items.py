@@ -0,0 +1,128 @@
+from typing import Awaitable, Callable
+
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_read_db
+from helpers import logger
+from models import ItemModel
+from services.items import (
+    ItemKind,
+    ItemType,
+    get_items_page,
+    get_rows_page,
+    stream_rows,
+)
+from services.pagination import (
+    InvalidCursorError,
+    decode_cursor,
+    decode_item_cursor,
+    ndjson_lines,
+)
+from services.response_cache import cache_key, response_cache
+from services.tags import TagMatch, split_tags
+from settings import MAX_PAGE_SIZE
+
+item_router = APIRouter()
+
+
+async def cached_page(
+    request: Request,
+    if_none_match: str | None,
+    read_page: Callable[[], Awaitable[tuple[list[dict], str | None]]],
+) -> Response:
+    """
+    Serve a list page from the response cache, or read it with read_page and
+    cache it. A client sending back the page's ETag gets a 304.
+    """
+    key = cache_key(request)
+    not_modified = response_cache.not_modified(key, if_none_match)
+    if not_modified:
+        return not_modified
+    cached = response_cache.get(key)
+    if cached:
+        return cached
+
+    # a write landing during the read moves the generation on and nothing is cached
+    generation = response_cache.generation
+    try:
+        rows, next_cursor = await read_page()
+    except Exception as e:
+        logger.exception(f"Error while listing {request.url.path}", exc_info=e)
+        raise HTTPException(status_code=500, detail=str(e))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return response_cache.put(key, generation, orjson.dumps(rows), headers)
+
+
+async def list_rows(
+    kind: ItemKind,
+    request: Request,
+    db: AsyncSession,
+    if_none_match: str | None,
+    reminder: bool | None,
+    reading: bool | None,
+    tags: str | None,
+    match: TagMatch,
+    limit: int | None,
+    cursor: str | None,
+    stream: bool,
+) -> Response:
+    """
+    GET /link and GET /note: a cached keyset page, or every row as NDJSON
+    """
+    tag_names = split_tags(tags)
+    if stream:
+        return StreamingResponse(
+            ndjson_lines(stream_rows(kind, reminder, reading, tag_names, match)),
+            media_type="application/x-ndjson",
+        )
+
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return await cached_page(
+        request,
+        if_none_match,
+        lambda: get_rows_page(
+            db, kind, reminder, reading, limit, cursor, tag_names, match
+        ),
+    )
+
+
+@item_router.get("/items")
+async def get_items(
+    request: Request,
+    type: ItemType | None = None,
+    reminder: bool | None = None,
+    reading: bool | None = None,
+    tags: str | None = None,
+    match: TagMatch = "all",
+    limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    if_none_match: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_read_db),
+) -> list[ItemModel] | dict:
+    """
+    List links and notes together, newest first, or just one of them with type.
+    Filters and paging work as on GET /link, the cursor for the next page is
+    returned in the X-Next-Cursor header. Pages are served from the response
+    cache until a write lands, a client sending back the ETag gets a 304.
+    """
+    if cursor:
+        try:
+            decode_item_cursor(cursor)
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return await cached_page(
+        request,
+        if_none_match,
+        lambda: get_items_page(
+            db, type, reminder, reading, limit, cursor, split_tags(tags), match
+        ),
+    )
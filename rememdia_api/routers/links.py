@@ -1,75 +1,194 @@
 from datetime import datetime, timezone
-import traceback
-from fastapi import APIRouter, Depends, HTTPException
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 
-from database import get_db
-from models import LinkModel, LinkUpdateModel, LinkOrm, TagOrm
-from helpers import get_link_metadata
-from services.links import get_links_from_db
+from database import get_db, get_read_db
+from models import EnrichmentStatus, LinkModel, LinkUpdateModel, LinkOrm
+from routers.items import list_rows
+from services.backfill import metadata_backfill
+from services.bulk import BulkImportError, bulk_import_links, read_bulk_items
+from services.enrichment import (
+    enrichment_queue,
+    get_enrichment_status_counts,
+    refresh_link_metadata,
+)
+from services.idempotency import get_saved_response, save_response
+from services.items import LINK, delete_item, update_item
+from services.metadata_cache import metadata_cache
+from services.notifications import first_due_at
+from services.tag_index import tag_index
+from services.tags import TagMatch, resolve_tags
+from settings import MAX_PAGE_SIZE
 
 link_router = APIRouter()
 
 
 @link_router.post("/link")
-async def save_link(link_obj: LinkModel, db: AsyncSession = Depends(get_db)) -> dict:
+async def save_link(
+    link_obj: LinkModel,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: str | None = Header(default=None),
+) -> dict:
+    """
+    Save a link. With an Idempotency-Key header a retry of the same request
+    gets the first response back instead of saving the link twice.
+    """
+    saved = await get_saved_response(db, idempotency_key)
+    if saved is not None:
+        return saved
+
     try:
-        meta_title, meta_description = await get_link_metadata(link_obj.url)
+        now = datetime.now(timezone.utc)
         new_link = LinkOrm(
             url=link_obj.url,
             summary=link_obj.summary,
             reminder=link_obj.reminder,
             reading=link_obj.reading,
-            created_at=datetime.now(timezone.utc),
-            meta_title=meta_title,
-            meta_description=meta_description,
+            created_at=now,
+            next_due_at=first_due_at(link_obj.reminder, link_obj.reading, now),
+            meta_title="",
+            meta_description="",
+            enrichment_status=EnrichmentStatus.PENDING.value,
         )
+        tags = await resolve_tags(db, link_obj.tags)
+        new_link.tags = [tags[name] for name in dict.fromkeys(link_obj.tags)]
         db.add(new_link)
 
-        for tag in link_obj.tags:
-            result = await db.execute(select(TagOrm).where(TagOrm.name == tag))
-            tag_instance = result.scalar_one_or_none()
-
-            if tag_instance is None:
-                tag_instance = TagOrm(name=tag)
-                db.add(tag_instance)
+        await db.flush()
+        link_id = new_link.id
+        response = {"success": "Link saved", "link_id": link_id}
+        save_response(db, idempotency_key, response)
+        await db.commit()
+        tag_index.track(added=tags)
 
-            new_link.tags.append(tag_instance)
+        # metadata is fetched in the background so a slow site can't hold up the save
+        enrichment_queue.submit(link_id)
+        return response
 
-        await db.commit()
-        return {"success": "Link saved"}
+    except IntegrityError as e:
+        # a retry with the same key got there first
+        await db.rollback()
+        return await get_saved_response(db, idempotency_key) or {"error": str(e)}
 
     except Exception as e:
         return {"error": str(e)}
 
 
+@link_router.post("/link/bulk")
+async def save_links_bulk(request: Request, db: AsyncSession = Depends(get_db)) -> dict:
+    """
+    Import many links at once from a JSON array or an NDJSON stream
+    (Content-Type: application/x-ndjson). Metadata for the whole batch is
+    left to the enrichment queue. Returns a per-item report.
+    """
+    items = read_bulk_items(request.headers.get("content-type", ""), request.stream())
+    try:
+        report = await bulk_import_links(db, items)
+    except BulkImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # links that don't fit in the queue stay pending until the next startup
+    for entry in report["items"]:
+        if entry["status"] == "created" and not enrichment_queue.submit(entry["link_id"]):
+            break
+
+    return report
+
+
 @link_router.get("/link")
 async def get_links(
+    request: Request,
     reminder: bool | None = None,
     reading: bool | None = None,
-    db: AsyncSession = Depends(get_db),
+    tags: str | None = None,
+    match: TagMatch = "all",
+    limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    stream: bool = False,
+    if_none_match: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_read_db),
 ) -> list[LinkModel] | dict:
+    """
+    List links ordered by (created_at, id). When a limit is given and more links
+    remain, the cursor for the next page is returned in the X-Next-Cursor header.
+    With stream=true the links are sent as NDJSON while they're read from the db.
+    tags takes a comma separated list, match=all keeps links with every tag and
+    match=any links with at least one. Pages are served from the response cache
+    until a write lands, a client sending back the ETag gets a 304.
+    """
+    return await list_rows(
+        LINK,
+        request,
+        db,
+        if_none_match,
+        reminder,
+        reading,
+        tags,
+        match,
+        limit,
+        cursor,
+        stream,
+    )
+
+
+@link_router.get("/link/enrichment")
+async def get_enrichment_status(db: AsyncSession = Depends(get_read_db)) -> dict:
+    """
+    Metadata enrichment queue depth and worker counters, links per enrichment_status
+    and the metadata cache counters
+    """
+    return {
+        **enrichment_queue.stats(),
+        "links": await get_enrichment_status_counts(db),
+        "metadata_cache": metadata_cache.stats(),
+    }
+
+
+@link_router.post("/link/backfill")
+async def start_backfill(restart: bool = False) -> dict:
+    """
+    Fetch metadata for every link that has none, in the background. Picks up
+    where the last run stopped unless restart is set or it finished.
+    """
+    if not metadata_backfill.start(restart):
+        raise HTTPException(status_code=409, detail="Backfill already running")
+    return {"success": "Backfill started"}
+
+
+@link_router.get("/link/backfill")
+async def get_backfill_status(db: AsyncSession = Depends(get_read_db)) -> dict:
+    """
+    The metadata backfill's checkpoint and counters, and the links still to go
+    """
+    return await metadata_backfill.status(db)
+
+
+@link_router.post("/link/{link_id}/metadata/refresh")
+async def refresh_metadata(link_id: int) -> dict:
+    """
+    Revalidate the link's page metadata now instead of waiting for the cache ttl
+    """
     try:
-        return await get_links_from_db(db, reminder, reading)
+        metadata = await refresh_link_metadata(link_id)
     except Exception as e:
-        print(traceback.format_exc())
-        return {"error": str(e)}
+        raise HTTPException(status_code=502, detail=f"Metadata fetch failed: {e!r}")
+
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="Link not found")
+    return {
+        "success": "Link metadata refreshed",
+        "meta_title": metadata.title,
+        "meta_description": metadata.description,
+    }
 
 
 @link_router.delete("/link/{link_id}")
 async def delete_link(link_id: int, db: AsyncSession = Depends(get_db)) -> dict:
-    query = select(LinkOrm).where(LinkOrm.id == link_id)
-    result = await db.execute(query)
-    link = result.scalar_one_or_none()
-    if link:
-        await db.delete(link)
-        await db.commit()
-        return {"success": "Link deleted"}
-
-    else:
+    if not await delete_item(db, LINK, link_id):
         raise HTTPException(status_code=404, detail="Link not found")
+    return {"success": "Link deleted"}
 
 
 @link_router.patch("/link/{link_id}")
@@ -77,50 +196,9 @@ async def update_link(
     link_id: int, link_update: LinkUpdateModel, db: AsyncSession = Depends(get_db)
 ) -> dict:
     try:
-        query = (
-            select(LinkOrm)
-            .where(LinkOrm.id == link_id)
-            .options(selectinload(LinkOrm.tags))
-        )
-        result = await db.execute(query)
-        link = result.scalar_one_or_none()
-
-        if not link:
-            raise HTTPException(status_code=404, detail="Link not found")
-
-        if link_update.url:
-            link.url = link_update.url
-        if link_update.summary:
-            link.summary = link_update.summary
-        if link_update.meta_title:
-            link.meta_title = link_update.meta_title
-        if link_update.meta_description:
-            link.meta_description = link_update.meta_description
-        if link_update.reminder is not None:
-            link.reminder = link_update.reminder
-        if link_update.reading is not None:
-            link.reading = link_update.reading
-
-        if link_update.tags:
-            # remove the previous tags
-            for tag in link.tags:
-                link.tags.clear()
-
-            # add the updated tags
-            for tag in link_update.tags:
-                result = await db.execute(select(TagOrm).where(TagOrm.name == tag))
-                tag_instance = result.scalar_one_or_none()
-
-                if tag_instance is None:
-                    tag_instance = TagOrm(name=tag)
-                    db.add(tag_instance)
-
-                link.tags.append(tag_instance)
-
-        await db.commit()
-        await db.refresh(link)
-
-        return {"success": "Link updated"}
-
+        updated = await update_item(db, LINK, link_id, link_update)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not updated:
+        raise HTTPException(status_code=404, detail="Link not found")
+    return {"success": "Link updated"}
@@ -1,77 +1,116 @@
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 
-from database import get_db
-from models import TagOrm, NoteModel, NoteOrm, NoteUpdateModel
+from database import get_db, get_read_db
+from models import NoteModel, NoteOrm, NoteUpdateModel
+from routers.items import list_rows
+from services.bulk import BulkImportError, bulk_import_notes, read_bulk_items
+from services.idempotency import get_saved_response, save_response
+from services.items import NOTE, delete_item, update_item
+from services.notifications import first_due_at
+from services.tag_index import tag_index
+from services.tags import TagMatch, resolve_tags
+from settings import MAX_PAGE_SIZE
 
 note_router = APIRouter()
 
 
 @note_router.post("/note")
-async def save_note(note_obj: NoteModel, db: AsyncSession = Depends(get_db)) -> dict:
+async def save_note(
+    note_obj: NoteModel,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: str | None = Header(default=None),
+) -> dict:
+    """
+    Save a note. With an Idempotency-Key header a retry of the same request
+    gets the first response back instead of saving the note twice.
+    """
+    saved = await get_saved_response(db, idempotency_key)
+    if saved is not None:
+        return saved
+
     try:
+        now = datetime.now(timezone.utc)
         new_note = NoteOrm(
             note=note_obj.note,
             reminder=note_obj.reminder,
             reading=note_obj.reading,
-            created_at=datetime.now(timezone.utc),
+            created_at=now,
+            next_due_at=first_due_at(note_obj.reminder, note_obj.reading, now),
         )
+        tags = await resolve_tags(db, note_obj.tags)
+        new_note.tags = [tags[name] for name in dict.fromkeys(note_obj.tags)]
         db.add(new_note)
 
-        for tag in note_obj.tags:
-            result = await db.execute(select(TagOrm).where(TagOrm.name == tag))
-            tag_instance = result.scalar_one_or_none()
-
-            if tag_instance is None:
-                tag_instance = TagOrm(name=tag)
-                db.add(tag_instance)
-
-            new_note.tags.append(tag_instance)
-
+        await db.flush()
+        response = {"success": "Note saved", "note_id": new_note.id}
+        save_response(db, idempotency_key, response)
         await db.commit()
-        return {"success": "Note saved"}
+        tag_index.track(added=tags)
+        return response
+
+    except IntegrityError as e:
+        # a retry with the same key got there first
+        await db.rollback()
+        saved = await get_saved_response(db, idempotency_key)
+        if saved is None:
+            raise HTTPException(status_code=500, detail=str(e))
+        return saved
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@note_router.post("/note/bulk")
+async def save_notes_bulk(request: Request, db: AsyncSession = Depends(get_db)) -> dict:
+    """
+    Import many notes at once from a JSON array or an NDJSON stream
+    (Content-Type: application/x-ndjson). Returns a per-item report.
+    """
+    items = read_bulk_items(request.headers.get("content-type", ""), request.stream())
+    try:
+        return await bulk_import_notes(db, items)
+    except BulkImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @note_router.get("/note")
 async def get_notes(
+    request: Request,
     reminder: bool | None = None,
     reading: bool | None = None,
-    db: AsyncSession = Depends(get_db),
+    tags: str | None = None,
+    match: TagMatch = "all",
+    limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    stream: bool = False,
+    if_none_match: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_read_db),
 ) -> list[NoteModel] | dict:
-    try:
-        query = select(NoteOrm).options(selectinload(NoteOrm.tags))
-        if reminder is not None:
-            query = query.where(NoteOrm.reminder == reminder)
-        if reading is not None:
-            query = query.where(NoteOrm.reading == reading)
-
-        result = await db.execute(query)
-        notes = result.scalars().all()
-
-        note_models = []
-
-        for note in notes:
-            note_model = NoteModel(
-                note_id=note.id,
-                note=note.note,
-                tags=[tag.name for tag in note.tags],
-                reminder=note.reminder,
-                reading=note.reading,
-                created_at=note.created_at,
-            )
-            note_models.append(note_model)
-
-        return note_models
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    """
+    List notes ordered by (created_at, id). When a limit is given and more notes
+    remain, the cursor for the next page is returned in the X-Next-Cursor header.
+    With stream=true the notes are sent as NDJSON while they're read from the db.
+    tags takes a comma separated list, match=all keeps notes with every tag and
+    match=any notes with at least one. Pages are served from the response cache
+    until a write lands, a client sending back the ETag gets a 304.
+    """
+    return await list_rows(
+        NOTE,
+        request,
+        db,
+        if_none_match,
+        reminder,
+        reading,
+        tags,
+        match,
+        limit,
+        cursor,
+        stream,
+    )
 
 
 @note_router.patch("/note/{note_id}")
@@ -79,58 +118,16 @@ async def update_note(
     note_id: int, note_update: NoteUpdateModel, db: AsyncSession = Depends(get_db)
 ) -> dict:
     try:
-        query = (
-            select(NoteOrm)
-            .where(NoteOrm.id == note_id)
-            .options(selectinload(NoteOrm.tags))
-        )
-        result = await db.execute(query)
-        note = result.scalar_one_or_none()
-
-        if not note:
-            raise HTTPException(status_code=404, detail="Link not found")
-
-        if note_update.note:
-            note.note = note_update.note
-        if note_update.reminder is not None:
-            note.reminder = note_update.reminder
-        if note_update.reading is not None:
-            note.reading = note_update.reading
-
-        if note_update.tags:
-            # remove the previous tags
-            for tag in note.tags:
-                note.tags.clear()
-
-            # add the updated tags
-            for tag in note_update.tags:
-                result = await db.execute(select(TagOrm).where(TagOrm.name == tag))
-                tag_instance = result.scalar_one_or_none()
-
-                if tag_instance is None:
-                    tag_instance = TagOrm(name=tag)
-                    db.add(tag_instance)
-
-                note.tags.append(tag_instance)
-
-        await db.commit()
-        await db.refresh(note)
-
-        return {"success": "Note updated"}
-
+        updated = await update_item(db, NOTE, note_id, note_update)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not updated:
+        raise HTTPException(status_code=404, detail="Note not found")
+    return {"success": "Note updated"}
 
 
 @note_router.delete("/note/{note_id}")
-async def delete_link(note_id: int, db: AsyncSession = Depends(get_db)) -> dict:
-    query = select(NoteOrm).where(NoteOrm.id == note_id)
-    result = await db.execute(query)
-    link = result.scalar_one_or_none()
-    if link:
-        await db.delete(link)
-        await db.commit()
-        return {"success": "Note deleted"}
-
-    else:
+async def delete_note(note_id: int, db: AsyncSession = Depends(get_db)) -> dict:
+    if not await delete_item(db, NOTE, note_id):
         raise HTTPException(status_code=404, detail="Note not found")
+    return {"success": "Note deleted"}
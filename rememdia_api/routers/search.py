@@ -0,0 +1,28 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_read_db
+from models import SearchResultModel
+from services.search import search_items
+from settings import MAX_PAGE_SIZE
+
+search_router = APIRouter()
+
+
+@search_router.get("/search")
+async def search(
+    q: str,
+    type: Literal["link", "note"] | None = None,
+    limit: int = Query(default=50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(default=0, ge=0),
+    db: AsyncSession = Depends(get_read_db),
+) -> list[SearchResultModel]:
+    """
+    Full text search over links and notes, best matches first
+    """
+    try:
+        return await search_items(db, q, type, limit, offset)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from database import get_read_db
+from models import TagOrm
+from services.items import LINK, NOTE, get_rows_page
+from services.pagination import InvalidCursorError, decode_cursor
+from services.tag_index import tag_index
+from settings import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+tag_router = APIRouter()
+
+
+@tag_router.get("/tags")
+async def get_tags(
+    response: Response,
+    prefix: str = "",
+    limit: int | None = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    if_none_match: str | None = Header(default=None),
+) -> list[str]:
+    """
+    Get any tags that start with the prefix, most used first, used for autocomplete
+    """
+    if if_none_match == tag_index.etag:
+        return Response(status_code=304, headers={"ETag": tag_index.etag})
+
+    response.headers["ETag"] = tag_index.etag
+    return tag_index.search(prefix, limit)
+
+
+@tag_router.get("/tags/{name}/items")
+async def get_tag_items(
+    name: str,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    link_cursor: str | None = None,
+    note_cursor: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
+) -> dict:
+    """
+    Get the links and notes carrying a tag, oldest first, up to limit of each.
+    The links and notes are paged separately, next_link_cursor and
+    next_note_cursor are null once there are no more of that kind.
+    """
+    for cursor in (link_cursor, note_cursor):
+        if cursor:
+            try:
+                decode_cursor(cursor)
+            except InvalidCursorError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+    # ask the db, the tag index only knows the tags this process has seen
+    result = await db.execute(select(TagOrm.id).where(TagOrm.name == name))
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Tag not found")
+
+    links, next_link_cursor = await get_rows_page(
+        db, LINK, limit=limit, cursor=link_cursor, tags=[name]
+    )
+    notes, next_note_cursor = await get_rows_page(
+        db, NOTE, limit=limit, cursor=note_cursor, tags=[name]
+    )
+    return {
+        "tag": name,
+        "links": links,
+        "notes": notes,
+        "next_link_cursor": next_link_cursor,
+        "next_note_cursor": next_note_cursor,
+    }
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_read_db
+from services.webhooks import get_outbox_counts, webhook_dispatcher
+
+webhook_router = APIRouter()
+
+
+@webhook_router.get("/webhook")
+async def get_webhook_status(db: AsyncSession = Depends(get_read_db)) -> dict:
+    """
+    Webhook dispatcher queue depth, counters and queue latency in seconds,
+    plus outbox messages per status
+    """
+    return {
+        **webhook_dispatcher.stats(),
+        "outbox": await get_outbox_counts(db),
+    }
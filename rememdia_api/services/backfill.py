@@ -0,0 +1,289 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from database import ReadSessionLocal, SessionLocal
+from helpers import logger
+from models import BackfillCheckpointOrm, BackfillStatus, EnrichmentStatus, LinkOrm
+from services.metadata_cache import CachedMetadata, metadata_cache
+from services.versions import next_version
+from settings import (
+    BACKFILL_BATCH_SIZE,
+    BACKFILL_CONCURRENCY,
+    BACKFILL_HOST_CONCURRENCY,
+    BACKFILL_HOST_INTERVAL,
+    ENRICH_TIMEOUT,
+)
+
+
+def needs_metadata():
+    # links saved before metadata worked were marked pending by migration 0013,
+    # a done link with an empty title is a page that has none
+    return LinkOrm.enrichment_status != EnrichmentStatus.DONE.value
+
+
+class MetadataBackfill:
+    """
+    Fetches metadata for the links that never got any: failed or still pending
+    enrichment, or saved before metadata was fetched at all. Links are read by
+    id in batches of batch_size and a batch's pages are fetched together, at
+    most concurrency at once and host_concurrency at once from any one host,
+    with requests to a host spaced out by host_interval. Each batch is written
+    in one transaction along with the checkpoint, so a run that stops or
+    crashes resumes after the last batch that landed and only ever holds one
+    batch in memory.
+    """
+
+    job = "metadata"
+
+    def __init__(
+        self,
+        batch_size: int = BACKFILL_BATCH_SIZE,
+        concurrency: int = BACKFILL_CONCURRENCY,
+        host_concurrency: int = BACKFILL_HOST_CONCURRENCY,
+        host_interval: float = BACKFILL_HOST_INTERVAL,
+        timeout: float = ENRICH_TIMEOUT,
+    ):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.host_concurrency = host_concurrency
+        self.host_interval = host_interval
+        self.timeout = timeout
+
+        self.task: asyncio.Task | None = None
+        self.stopping = False
+        self.semaphore: asyncio.Semaphore | None = None
+        self.host_slots: dict[str, asyncio.Semaphore] = {}
+        self.host_locks: dict[str, asyncio.Lock] = {}
+        self.host_next_request: dict[str, float] = {}
+        self.in_flight = 0
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self, restart: bool = False) -> bool:
+        """
+        Run in the background, False when a run is already going
+        """
+        if self.running:
+            return False
+        self.task = asyncio.create_task(self.run(restart))
+        return True
+
+    async def stop(self) -> None:
+        # the batch in hand is dropped, not written, and fetched again on resume
+        if not self.running:
+            return
+        self.stopping = True
+        _, pending = await asyncio.wait([self.task], timeout=self.timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+    async def run(self, restart: bool = False) -> dict:
+        """
+        Resume the last run, or start over when it finished or restart is set.
+        Returns the checkpoint as it was left.
+        """
+        self.stopping = False
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.host_next_request = {}
+        self.forget_hosts()
+
+        checkpoint = await self.begin(restart)
+        try:
+            while not self.stopping:
+                async with ReadSessionLocal() as db:
+                    result = await db.execute(
+                        select(LinkOrm.id, LinkOrm.url)
+                        .where(LinkOrm.id > checkpoint["last_id"], needs_metadata())
+                        .order_by(LinkOrm.id)
+                        .limit(self.batch_size)
+                    )
+                    batch = result.all()
+                if not batch:
+                    checkpoint = await self.finish(BackfillStatus.DONE)
+                    break
+
+                found = await asyncio.gather(*(self.fetch(url) for _, url in batch))
+                self.forget_hosts()
+                if self.stopping:
+                    checkpoint = await self.finish(BackfillStatus.STOPPED)
+                    break
+                checkpoint = await self.save_batch(batch, found)
+                logger.info(
+                    f"Metadata backfill at link {checkpoint['last_id']}: "
+                    f"{checkpoint['updated']} updated, {checkpoint['failed']} failed"
+                )
+        except Exception as exc:
+            # left running, the next run picks up after the last batch
+            logger.exception("Metadata backfill stopped by an error", exc_info=exc)
+            raise
+        return checkpoint
+
+    async def begin(self, restart: bool) -> dict:
+        now = datetime.now(timezone.utc)
+        async with SessionLocal() as db:
+            checkpoint = await db.get(BackfillCheckpointOrm, self.job)
+            if checkpoint is None:
+                checkpoint = BackfillCheckpointOrm(job=self.job)
+                db.add(checkpoint)
+                restart = True
+            if restart or checkpoint.status == BackfillStatus.DONE.value:
+                checkpoint.last_id = 0
+                checkpoint.processed = 0
+                checkpoint.updated = 0
+                checkpoint.failed = 0
+                checkpoint.started_at = now
+            checkpoint.status = BackfillStatus.RUNNING.value
+            checkpoint.updated_at = now
+            # read before the commit expires it
+            data = checkpoint_dict(checkpoint)
+            await db.commit()
+            return data
+
+    async def finish(self, status: BackfillStatus) -> dict:
+        async with SessionLocal() as db:
+            checkpoint = await db.get(BackfillCheckpointOrm, self.job)
+            checkpoint.status = status.value
+            checkpoint.updated_at = datetime.now(timezone.utc)
+            data = checkpoint_dict(checkpoint)
+            await db.commit()
+            return data
+
+    async def save_batch(
+        self, batch: list, found: list[CachedMetadata | None]
+    ) -> dict:
+        """
+        Write a batch's metadata and move the checkpoint past it, in one transaction
+        """
+        links = LinkOrm.__table__
+        by_id = update(links).where(links.c.id == bindparam("link_id"))
+
+        async with SessionLocal() as db:
+            version = await next_version(db)
+            updated = [
+                {
+                    "link_id": link_id,
+                    "meta_title": metadata.title,
+                    "meta_description": metadata.description,
+                    "favicon_url": metadata.favicon_url,
+                    "enrichment_status": EnrichmentStatus.DONE.value,
+                    "version": version,
+                }
+                for (link_id, _), metadata in zip(batch, found)
+                if metadata is not None
+            ]
+            failed = [
+                {
+                    "link_id": link_id,
+                    "enrichment_status": EnrichmentStatus.FAILED.value,
+                    "version": version,
+                }
+                for (link_id, _), metadata in zip(batch, found)
+                if metadata is None
+            ]
+            for rows in (updated, failed):
+                if rows:
+                    await db.execute(by_id, rows)
+
+            checkpoint = await db.get(BackfillCheckpointOrm, self.job)
+            checkpoint.last_id = batch[-1][0]
+            checkpoint.processed += len(batch)
+            checkpoint.updated += len(updated)
+            checkpoint.failed += len(failed)
+            checkpoint.updated_at = datetime.now(timezone.utc)
+            data = checkpoint_dict(checkpoint)
+            await db.commit()
+            return data
+
+    def forget_hosts(self) -> None:
+        # nothing waits between batches, only a spacing still to run out is kept
+        now = time.monotonic()
+        self.host_slots = {}
+        self.host_locks = {}
+        self.host_next_request = {
+            host: at for host, at in self.host_next_request.items() if at > now
+        }
+
+    @asynccontextmanager
+    async def host_slot(self, host: str):
+        """
+        At most host_concurrency requests to the host at once, each starting at
+        least host_interval seconds after the one before
+        """
+        slot = self.host_slots.setdefault(host, asyncio.Semaphore(self.host_concurrency))
+        async with slot:
+            lock = self.host_locks.setdefault(host, asyncio.Lock())
+            async with lock:
+                delay = self.host_next_request.get(host, 0) - time.monotonic()
+                if delay > 0 and not self.stopping:
+                    await asyncio.sleep(delay)
+                self.host_next_request[host] = time.monotonic() + self.host_interval
+            yield
+
+    async def fetch(self, url: str) -> CachedMetadata | None:
+        if not url.startswith("http"):
+            url = f"https://{url}"
+
+        # a fresh cache entry needs no request, so no host spacing either
+        metadata = await metadata_cache.lookup(url)
+        if metadata is not None:
+            return metadata
+
+        # the host's turn is waited for outside the semaphore, a slow host
+        # doesn't keep the others from being fetched
+        async with self.host_slot(urlsplit(url).hostname or ""):
+            async with self.semaphore:
+                if self.stopping:
+                    return None
+                self.in_flight += 1
+                try:
+                    return await asyncio.wait_for(
+                        metadata_cache.refresh(url), timeout=self.timeout
+                    )
+                except Exception as exc:
+                    logger.warning(f"Metadata backfill fetch failed for {url}: {exc!r}")
+                    return None
+                finally:
+                    self.in_flight -= 1
+
+    async def status(self, db: AsyncSession) -> dict:
+        """
+        The checkpoint, whether a run is going in this process and how many
+        links are still to be looked at
+        """
+        checkpoint = await db.get(BackfillCheckpointOrm, self.job)
+        last_id = checkpoint.last_id if checkpoint else 0
+        result = await db.execute(
+            select(func.count()).where(LinkOrm.id > last_id, needs_metadata())
+        )
+        return {
+            **(checkpoint_dict(checkpoint) if checkpoint else {"job": self.job}),
+            "active": self.running,
+            "in_flight": self.in_flight,
+            "remaining": result.scalar_one(),
+        }
+
+
+def checkpoint_dict(checkpoint: BackfillCheckpointOrm) -> dict:
+    return {
+        "job": checkpoint.job,
+        "status": checkpoint.status,
+        "last_id": checkpoint.last_id,
+        "processed": checkpoint.processed,
+        "updated": checkpoint.updated,
+        "failed": checkpoint.failed,
+        "started_at": checkpoint.started_at,
+        "updated_at": checkpoint.updated_at,
+    }
+
+
+metadata_backfill = MetadataBackfill()
@@ -0,0 +1,197 @@
+import json
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Base
+from helpers import logger
+from models import (
+    EnrichmentStatus,
+    LinkModel,
+    LinkOrm,
+    LinkTagOrm,
+    NoteModel,
+    NoteOrm,
+    NoteTagOrm,
+)
+from services.notifications import first_due_at
+from services.tag_index import tag_index
+from services.tags import resolve_tags
+from services.versions import next_version
+from settings import BULK_CHUNK_SIZE
+
+
+class BulkImportError(ValueError):
+    pass
+
+
+async def read_bulk_items(
+    content_type: str, body: AsyncIterator[bytes]
+) -> AsyncIterator[object]:
+    """
+    Yield the raw items of a bulk request, either a JSON array or NDJSON.
+    NDJSON is read line by line as it arrives so big imports aren't buffered.
+    Lines that aren't valid JSON are yielded as BulkImportError.
+    """
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        buffer = b""
+        async for chunk in body:
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield parse_ndjson_line(line)
+        if buffer.strip():
+            yield parse_ndjson_line(buffer)
+        return
+
+    raw = b"".join([chunk async for chunk in body])
+    try:
+        items = json.loads(raw)
+    except json.JSONDecodeError as exc:
+        raise BulkImportError(f"Invalid JSON body: {exc}") from exc
+    if not isinstance(items, list):
+        raise BulkImportError("Expected a JSON array of items")
+    for item in items:
+        yield item
+
+
+def parse_ndjson_line(line: bytes) -> object:
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as exc:
+        return BulkImportError(f"Invalid JSON line: {exc}")
+
+
+def link_row(link: LinkModel, now: datetime) -> dict:
+    return {
+        "url": link.url,
+        "summary": link.summary,
+        "reminder": link.reminder,
+        "reading": link.reading,
+        "created_at": now,
+        "next_due_at": first_due_at(link.reminder, link.reading, now),
+        "meta_title": "",
+        "meta_description": "",
+        "enrichment_status": EnrichmentStatus.PENDING.value,
+    }
+
+
+def note_row(note: NoteModel, now: datetime) -> dict:
+    return {
+        "note": note.note,
+        "reminder": note.reminder,
+        "reading": note.reading,
+        "created_at": now,
+        "next_due_at": first_due_at(note.reminder, note.reading, now),
+    }
+
+
+async def insert_chunk(
+    db: AsyncSession,
+    chunk: list[tuple[int, BaseModel]],
+    orm: type[Base],
+    tag_orm: type[Base],
+    item_key: str,
+    build_row: Callable[[BaseModel, datetime], dict],
+) -> list[int]:
+    """
+    Insert one chunk of validated items in a single transaction: one query to
+    resolve every tag in the chunk, one executemany for the rows and one for
+    the tag associations. Returns the new ids in the same order as the chunk.
+    """
+    now = datetime.now(timezone.utc)
+    tags = await resolve_tags(db, [tag for _, item in chunk for tag in item.tags])
+
+    # a bulk insert skips the flush hooks, the rows get their version here
+    version = await next_version(db)
+    result = await db.execute(
+        insert(orm).returning(orm.id, sort_by_parameter_order=True),
+        [{**build_row(item, now), "version": version} for _, item in chunk],
+    )
+    new_ids = list(result.scalars().all())
+
+    tag_rows = [
+        {item_key: new_id, "tag_id": tags[tag].id}
+        for new_id, (_, item) in zip(new_ids, chunk)
+        for tag in dict.fromkeys(item.tags)
+    ]
+    if tag_rows:
+        await db.execute(insert(tag_orm), tag_rows)
+
+    await db.commit()
+    tag_index.track(
+        added=[tag for _, item in chunk for tag in dict.fromkeys(item.tags)]
+    )
+    return new_ids
+
+
+async def bulk_import(
+    db: AsyncSession,
+    items: AsyncIterator[object],
+    model: type[BaseModel],
+    orm: type[Base],
+    tag_orm: type[Base],
+    item_key: str,
+    build_row: Callable[[BaseModel, datetime], dict],
+    chunk_size: int = BULK_CHUNK_SIZE,
+) -> dict:
+    """
+    Validate and insert items in chunked transactions, returns a per-item report.
+    A failing chunk is rolled back and reported without stopping the import.
+    """
+    report = []
+    chunk: list[tuple[int, BaseModel]] = []
+
+    async def flush() -> None:
+        try:
+            new_ids = await insert_chunk(db, chunk, orm, tag_orm, item_key, build_row)
+        except Exception as exc:
+            logger.exception("Error while importing a bulk chunk", exc_info=exc)
+            await db.rollback()
+            report.extend(
+                {"index": index, "status": "error", "error": str(exc)}
+                for index, _ in chunk
+            )
+        else:
+            report.extend(
+                {"index": index, "status": "created", item_key: new_id}
+                for (index, _), new_id in zip(chunk, new_ids)
+            )
+        chunk.clear()
+
+    index = 0
+    async for raw_item in items:
+        if isinstance(raw_item, BulkImportError):
+            report.append({"index": index, "status": "error", "error": str(raw_item)})
+        else:
+            try:
+                chunk.append((index, model.model_validate(raw_item)))
+            except ValidationError as exc:
+                report.append({"index": index, "status": "error", "error": str(exc)})
+
+        if len(chunk) >= chunk_size:
+            await flush()
+        index += 1
+
+    if chunk:
+        await flush()
+
+    report.sort(key=lambda entry: entry["index"])
+    created = sum(1 for entry in report if entry["status"] == "created")
+    return {"created": created, "failed": len(report) - created, "items": report}
+
+
+async def bulk_import_links(db: AsyncSession, items: AsyncIterator[object]) -> dict:
+    return await bulk_import(
+        db, items, LinkModel, LinkOrm, LinkTagOrm, "link_id", link_row
+    )
+
+
+async def bulk_import_notes(db: AsyncSession, items: AsyncIterator[object]) -> dict:
+    return await bulk_import(
+        db, items, NoteModel, NoteOrm, NoteTagOrm, "note_id", note_row
+    )
@@ -0,0 +1,138 @@
+import heapq
+
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models import ChangeVersionOrm, LinkOrm, NoteOrm, TagOrm, TombstoneOrm
+from services.items import LINK, NOTE, build_rows_query
+from services.pagination import decode_change_cursor, encode_change_cursor
+from settings import CHANGES_PAGE_SIZE
+
+
+def apply_change_keyset(
+    query: Select,
+    kind: str,
+    orm,
+    since: int,
+    upto: int,
+    position: tuple | None,
+    limit: int,
+) -> Select:
+    """
+    Order one kind of change by (version, id) and start it after the (version,
+    kind, id) position, within the since..upto window. The kind is fixed for
+    the query, so the position comes down to a (version, id) keyset on the
+    kind's version index.
+    """
+    query = query.where(orm.version > since, orm.version <= upto).order_by(
+        orm.version, orm.id
+    )
+
+    if position:
+        version, cursor_kind, row_id = position
+        if kind == cursor_kind:
+            query = query.where(
+                or_(
+                    orm.version > version,
+                    and_(orm.version == version, orm.id > row_id),
+                )
+            )
+        elif kind > cursor_kind:
+            # sorts after the cursor's kind, so its changes at the same version are still to come
+            query = query.where(orm.version >= version)
+        else:
+            query = query.where(orm.version > version)
+
+    return query.limit(limit + 1)
+
+
+async def get_changes(
+    db: AsyncSession,
+    since: int = 0,
+    limit: int = CHANGES_PAGE_SIZE,
+    cursor: str | None = None,
+) -> dict:
+    """
+    A page of what was written after the since version: links and notes in
+    full, the names of new tags and the ids of deleted items, at most limit of
+    them together in (version, kind, id) order. While has_more is set, ask again
+    with the same since and the returned cursor, after that the version is the
+    since for next time. reset is set when since is ahead of the server, the
+    replica should be dropped and rebuilt from 0.
+    """
+    if cursor:
+        upto, *position = decode_change_cursor(cursor)
+    else:
+        result = await db.execute(
+            select(ChangeVersionOrm.version).where(ChangeVersionOrm.id == 1)
+        )
+        # a write landing while the pages are read waits for next time
+        upto, position = result.scalar_one_or_none() or 0, None
+        if since > upto:
+            return {"version": upto, "reset": True}
+
+    def page(query, kind, orm):
+        return apply_change_keyset(query, kind, orm, since, upto, position, limit)
+
+    def items(result, kind):
+        changes = []
+        for row in result.mappings():
+            item = dict(row)
+            changes.append((item.pop("version"), kind, item[f"{kind}_id"], item))
+        return changes
+
+    query = build_rows_query(LINK).add_columns(LinkOrm.version)
+    links = items(await db.execute(page(query, "link", LinkOrm)), "link")
+    query = build_rows_query(NOTE).add_columns(NoteOrm.version)
+    notes = items(await db.execute(page(query, "note", NoteOrm)), "note")
+
+    result = await db.execute(
+        page(select(TagOrm.version, TagOrm.id, TagOrm.name), "tag", TagOrm)
+    )
+    tags = [(version, "tag", tag_id, name) for version, tag_id, name in result.all()]
+    result = await db.execute(
+        page(
+            select(
+                TombstoneOrm.version,
+                TombstoneOrm.id,
+                TombstoneOrm.item_type,
+                TombstoneOrm.item_id,
+            ),
+            "tombstone",
+            TombstoneOrm,
+        )
+    )
+    tombstones = [
+        (version, "tombstone", row_id, (item_type, item_id))
+        for version, row_id, item_type, item_id in result.all()
+    ]
+
+    changes = list(heapq.merge(links, notes, tags, tombstones, key=lambda c: c[:3]))
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    by_kind = {"link": [], "note": [], "tag": [], "tombstone": []}
+    for _, kind, _, change in changes:
+        by_kind[kind].append(change)
+
+    # sqlite can hand a deleted id out again, the row that exists now wins
+    live = {
+        "link": {link["link_id"] for link in by_kind["link"]},
+        "note": {note["note_id"] for note in by_kind["note"]},
+    }
+    deleted = {"link": [], "note": []}
+    for item_type, item_id in by_kind["tombstone"]:
+        if item_id not in live[item_type]:
+            deleted[item_type].append(item_id)
+
+    return {
+        "version": upto,
+        "reset": False,
+        "has_more": has_more,
+        "cursor": encode_change_cursor(upto, *changes[-1][:3]) if has_more else None,
+        "links": by_kind["link"],
+        "notes": by_kind["note"],
+        "tags": sorted(by_kind["tag"]),
+        "deleted": {"links": deleted["link"], "notes": deleted["note"]},
+    }
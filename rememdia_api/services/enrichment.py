@@ -0,0 +1,254 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+import httpx
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from database import ReadSessionLocal, SessionLocal
+from helpers import logger
+from models import EnrichmentStatus, LinkOrm
+from services.metadata_cache import CachedMetadata, metadata_cache
+from settings import (
+    ENRICH_BACKOFF,
+    ENRICH_HOST_INTERVAL,
+    ENRICH_QUEUE_SIZE,
+    ENRICH_RETRIES,
+    ENRICH_TIMEOUT,
+    ENRICH_WORKERS,
+)
+
+
+def is_retryable(exc: Exception) -> bool:
+    # a missing or forbidden page won't get better by asking again
+    if isinstance(exc, httpx.HTTPStatusError):
+        status_code = exc.response.status_code
+        return status_code == 429 or status_code >= 500
+    return True
+
+
+class EnrichmentQueue:
+    """
+    Bounded pool of workers that fill in link metadata after the link is saved.
+    Links that don't fit in the queue stay pending in the db and are picked up
+    again the next time the queue starts.
+    """
+
+    def __init__(
+        self,
+        workers: int = ENRICH_WORKERS,
+        max_size: int = ENRICH_QUEUE_SIZE,
+        host_interval: float = ENRICH_HOST_INTERVAL,
+        retries: int = ENRICH_RETRIES,
+        backoff: float = ENRICH_BACKOFF,
+        timeout: float = ENRICH_TIMEOUT,
+    ):
+        self.worker_count = workers
+        self.max_size = max_size
+        self.host_interval = host_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.queue: asyncio.Queue[int] | None = None
+        self.workers: list[asyncio.Task] = []
+        self.busy: set[asyncio.Task] = set()
+        self.stopping = False
+        self.host_locks: dict[str, asyncio.Lock] = {}
+        self.host_waiting: dict[str, int] = {}
+        self.host_next_request: dict[str, float] = {}
+
+        self.in_flight = 0
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue(maxsize=self.max_size)
+        self.busy = set()
+        self.stopping = False
+        self.host_locks = {}
+        self.host_waiting = {}
+        self.host_next_request = {}
+        self.workers = [
+            asyncio.create_task(self.worker()) for _ in range(self.worker_count)
+        ]
+
+        async with ReadSessionLocal() as db:
+            result = await db.execute(
+                select(LinkOrm.id)
+                .where(LinkOrm.enrichment_status == EnrichmentStatus.PENDING.value)
+                .order_by(LinkOrm.id)
+                .limit(self.max_size)
+            )
+            for link_id in result.scalars().all():
+                self.submit(link_id)
+
+    async def stop(self) -> None:
+        # idle workers go straight away, busy ones get to finish their link since
+        # a query cancelled half way takes its connection down with it
+        self.stopping = True
+        for worker in self.workers:
+            if worker not in self.busy:
+                worker.cancel()
+        if self.workers:
+            _, pending = await asyncio.wait(self.workers, timeout=self.timeout)
+            for worker in pending:
+                worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self.queue = None
+
+    def submit(self, link_id: int) -> bool:
+        if self.queue is None:
+            return False
+        try:
+            self.queue.put_nowait(link_id)
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"Enrichment queue full, link {link_id} stays pending")
+            return False
+
+    async def join(self) -> None:
+        if self.queue is not None:
+            await self.queue.join()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "queue_size": self.max_size,
+            "workers": len(self.workers),
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    async def worker(self) -> None:
+        task = asyncio.current_task()
+        while not self.stopping:
+            link_id = await self.queue.get()
+            self.in_flight += 1
+            self.busy.add(task)
+            try:
+                await self.enrich(link_id)
+            except Exception as exc:
+                logger.exception(f"Error while enriching link {link_id}", exc_info=exc)
+            finally:
+                self.busy.discard(task)
+                self.in_flight -= 1
+                self.queue.task_done()
+
+    async def wait_for_host(self, host: str) -> None:
+        """
+        Space out requests to the same host by at least host_interval seconds
+        """
+        lock = self.host_locks.setdefault(host, asyncio.Lock())
+        self.host_waiting[host] = self.host_waiting.get(host, 0) + 1
+        try:
+            async with lock:
+                delay = self.host_next_request.get(host, 0) - time.monotonic()
+                if delay > 0 and not self.stopping:
+                    await asyncio.sleep(delay)
+                self.host_next_request[host] = time.monotonic() + self.host_interval
+        finally:
+            self.host_waiting[host] -= 1
+            if not self.host_waiting[host]:
+                self.forget_host(host)
+
+    def forget_host(self, host: str) -> None:
+        # nobody waits on the host any more, only a spacing still to run out is kept
+        del self.host_waiting[host]
+        del self.host_locks[host]
+        now = time.monotonic()
+        self.host_next_request = {
+            host: at for host, at in self.host_next_request.items() if at > now
+        }
+
+    async def enrich(self, link_id: int) -> None:
+        async with ReadSessionLocal() as db:
+            link = await db.get(LinkOrm, link_id)
+            if link is None:
+                return
+            url = link.url
+
+        if not url.startswith("http"):
+            url = f"https://{url}"
+        host = urlsplit(url).hostname or ""
+
+        # a fresh cache entry needs no request, so no host spacing either
+        metadata = await metadata_cache.lookup(url)
+        for attempt in range(self.retries + 1):
+            if metadata is not None:
+                break
+            await self.wait_for_host(host)
+            if self.stopping:
+                # left pending for the next start
+                return
+            try:
+                metadata = await asyncio.wait_for(
+                    metadata_cache.refresh(url), timeout=self.timeout
+                )
+            except Exception as exc:
+                logger.warning(f"Metadata fetch failed for {url}: {exc!r}")
+                if attempt == self.retries or not is_retryable(exc):
+                    break
+                self.retried += 1
+                await asyncio.sleep(self.backoff * 2**attempt)
+
+        status = EnrichmentStatus.FAILED if metadata is None else EnrichmentStatus.DONE
+
+        async with SessionLocal() as db:
+            link = await db.get(LinkOrm, link_id)
+            if link is None:
+                return
+            if metadata is not None:
+                link.meta_title = metadata.title
+                link.meta_description = metadata.description
+                link.favicon_url = metadata.favicon_url
+            else:
+                self.failed += 1
+            link.enrichment_status = status.value
+            await db.commit()
+
+        self.processed += 1
+
+
+async def refresh_link_metadata(link_id: int) -> CachedMetadata | None:
+    """
+    Revalidate a link's metadata right away, returns None when there's no such link.
+    No connection is held while the page is fetched.
+    """
+    async with ReadSessionLocal() as db:
+        link = await db.get(LinkOrm, link_id)
+        if link is None:
+            return None
+        url = link.url
+
+    metadata = await metadata_cache.refresh(url)
+
+    async with SessionLocal() as db:
+        link = await db.get(LinkOrm, link_id)
+        if link is None:
+            return None
+        link.meta_title = metadata.title
+        link.meta_description = metadata.description
+        link.favicon_url = metadata.favicon_url
+        link.enrichment_status = EnrichmentStatus.DONE.value
+        await db.commit()
+
+    return metadata
+
+
+async def get_enrichment_status_counts(db: AsyncSession) -> dict[str, int]:
+    result = await db.execute(
+        select(LinkOrm.enrichment_status, func.count()).group_by(
+            LinkOrm.enrichment_status
+        )
+    )
+    return {status: count for status, count in result.all()}
+
+
+enrichment_queue = EnrichmentQueue()
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import IdempotencyKeyOrm
+from settings import IDEMPOTENCY_KEY_TTL
+
+
+async def get_saved_response(db: AsyncSession, key: str | None) -> dict | None:
+    """
+    The response already sent for the key, None when it's new
+    """
+    if not key:
+        return None
+    row = await db.get(IdempotencyKeyOrm, key)
+    return row.response if row is not None else None
+
+
+def save_response(db: AsyncSession, key: str | None, response: dict) -> None:
+    """
+    Store the response in the transaction that made it, so a retry either finds
+    it or finds nothing was saved. Two requests racing with the same key trip
+    the primary key and only one of them commits.
+    """
+    if key:
+        db.add(IdempotencyKeyOrm(key=key, response=response))
+
+
+async def prune_idempotency_keys(
+    db: AsyncSession, now: datetime | None = None, ttl: int = IDEMPOTENCY_KEY_TTL
+) -> int:
+    now = now or datetime.now(timezone.utc)
+    result = await db.execute(
+        delete(IdempotencyKeyOrm).where(
+            IdempotencyKeyOrm.created_at < now - timedelta(seconds=ttl)
+        )
+    )
+    await db.commit()
+    return result.rowcount
@@ -0,0 +1,356 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Literal
+
+from pydantic import BaseModel
+from sqlalchemy import (
+    Select,
+    String,
+    and_,
+    cast,
+    false,
+    literal,
+    null,
+    or_,
+    true,
+    union_all,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from database import Base, ReadSessionLocal
+from models import LinkOrm, LinkTagOrm, NoteOrm, NoteTagOrm
+from services.notifications import reschedule
+from services.pagination import (
+    apply_keyset,
+    decode_item_cursor,
+    encode_cursor,
+    encode_item_cursor,
+)
+from services.tag_index import tag_index
+from services.tags import TagMatch, resolve_tags, tag_names, tagged_ids
+from settings import STREAM_BATCH_SIZE
+
+ItemType = Literal["link", "note"]
+
+
+@dataclass(frozen=True)
+class ItemKind:
+    """
+    What links and notes differ in as far as listing and editing goes: the
+    table, its tag association table and the columns only it has
+    """
+
+    name: ItemType
+    orm: type[Base]
+    tag_orm: type[Base]
+    fields: tuple[str, ...]
+    # set by a PATCH that gives them a value
+    editable: tuple[str, ...]
+
+    @property
+    def id_key(self) -> str:
+        return f"{self.name}_id"
+
+
+LINK = ItemKind(
+    "link",
+    LinkOrm,
+    LinkTagOrm,
+    (
+        "url",
+        "summary",
+        "meta_title",
+        "meta_description",
+        "favicon_url",
+        "enrichment_status",
+    ),
+    ("url", "summary", "meta_title", "meta_description"),
+)
+NOTE = ItemKind("note", NoteOrm, NoteTagOrm, ("note",), ("note",))
+ITEM_KINDS = {"link": LINK, "note": NOTE}
+SHARED_FIELDS = ["reminder", "reading", "created_at", "tags"]
+
+
+def filter_items(
+    query: Select,
+    kind: ItemKind,
+    reminder: bool | None = None,
+    reading: bool | None = None,
+    tags: list[str] | None = None,
+    match: TagMatch = "all",
+) -> Select:
+    orm = kind.orm
+    # literals, a generic plan for a bound flag on postgres skips the partial indexes
+    if reminder is not None:
+        query = query.where(orm.reminder == (true() if reminder else false()))
+    if reading is not None:
+        query = query.where(orm.reading == (true() if reading else false()))
+
+    if tags:
+        query = query.where(
+            orm.id.in_(tagged_ids(kind.tag_orm, kind.id_key, tags, match))
+        )
+
+    return query
+
+
+def build_rows_query(
+    kind: ItemKind,
+    reminder: bool | None = None,
+    reading: bool | None = None,
+    tags: list[str] | None = None,
+    match: TagMatch = "all",
+) -> Select:
+    orm = kind.orm
+    query = select(
+        orm.id.label(kind.id_key),
+        *(getattr(orm, field) for field in kind.fields),
+        orm.reminder,
+        orm.reading,
+        orm.created_at,
+        tag_names(kind.tag_orm, kind.id_key, orm).label("tags"),
+    )
+    return filter_items(query, kind, reminder, reading, tags, match)
+
+
+async def get_rows_page(
+    db: AsyncSession,
+    kind: ItemKind,
+    reminder: bool | None = None,
+    reading: bool | None = None,
+    limit: int | None = None,
+    cursor: str | None = None,
+    tags: list[str] | None = None,
+    match: TagMatch = "all",
+) -> tuple[list[dict], str | None]:
+    """
+    Fetch one keyset page of links or notes as plain dicts, read with their tags
+    in one query and ready to be dumped to json without a model per row. Returns
+    the rows and the cursor for the next page.
+    """
+    query = apply_keyset(
+        build_rows_query(kind, reminder, reading, tags, match), kind.orm, cursor, limit
+    )
+    result = await db.execute(query)
+    rows = [dict(row) for row in result.mappings()]
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1][kind.id_key])
+
+    return rows, next_cursor
+
+
+async def stream_rows(
+    kind: ItemKind,
+    reminder: bool | None = None,
+    reading: bool | None = None,
+    tags: list[str] | None = None,
+    match: TagMatch = "all",
+) -> AsyncIterator[dict]:
+    """
+    Yield link or note rows as they come off the database cursor, in batches of
+    STREAM_BATCH_SIZE. Uses its own session since the response outlives the
+    request dependencies.
+    """
+    query = apply_keyset(
+        build_rows_query(kind, reminder, reading, tags, match), kind.orm, None, None
+    )
+    async with ReadSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for row in result.mappings():
+            yield dict(row)
+
+
+async def get_item(db: AsyncSession, kind: ItemKind, item_id: int):
+    result = await db.execute(
+        select(kind.orm)
+        .where(kind.orm.id == item_id)
+        .options(selectinload(kind.orm.tags))
+    )
+    return result.scalar_one_or_none()
+
+
+async def update_item(
+    db: AsyncSession, kind: ItemKind, item_id: int, changes: BaseModel
+) -> bool:
+    """
+    Apply a PATCH body to a link or note, rescheduling its notifications when
+    the flags change and replacing its tags when some are given. False when
+    there's no such item.
+    """
+    item = await get_item(db, kind, item_id)
+    if item is None:
+        return False
+
+    for field in kind.editable:
+        value = getattr(changes, field)
+        if value:
+            setattr(item, field, value)
+    was_flagged = item.reminder or item.reading
+    if changes.reminder is not None:
+        item.reminder = changes.reminder
+    if changes.reading is not None:
+        item.reading = changes.reading
+    reschedule(item, was_flagged, datetime.now(timezone.utc))
+
+    added_tags, removed_tags = [], []
+    if changes.tags:
+        tags = await resolve_tags(db, changes.tags)
+        removed_tags = [tag.name for tag in item.tags]
+        added_tags = list(tags)
+        item.tags = [tags[name] for name in dict.fromkeys(changes.tags)]
+
+    await db.commit()
+    tag_index.track(added=added_tags, removed=removed_tags)
+    return True
+
+
+async def delete_item(db: AsyncSession, kind: ItemKind, item_id: int) -> bool:
+    """
+    Delete a link or note, False when there's no such item
+    """
+    item = await get_item(db, kind, item_id)
+    if item is None:
+        return False
+
+    removed_tags = [tag.name for tag in item.tags]
+    await db.delete(item)
+    await db.commit()
+    tag_index.track(removed=removed_tags)
+    return True
+
+
+def blank(field: str):
+    return cast(null(), String).label(field)
+
+
+def build_item_rows_query(item_type: ItemType) -> Select:
+    """
+    One branch of the items union. Both branches have the same columns in the
+    same order, the fields of the other type are null.
+    """
+    kind = ITEM_KINDS[item_type]
+    fields = []
+    for other in ITEM_KINDS.values():
+        if other is kind:
+            fields += [getattr(kind.orm, field) for field in other.fields]
+        else:
+            fields += [blank(field) for field in other.fields]
+
+    return select(
+        literal(item_type, String).label("item_type"),
+        kind.orm.id.label("item_id"),
+        kind.orm.reminder,
+        kind.orm.reading,
+        kind.orm.created_at,
+        tag_names(kind.tag_orm, kind.id_key, kind.orm).label("tags"),
+        *fields,
+    )
+
+
+def apply_item_keyset(
+    query: Select,
+    item_type: ItemType,
+    orm,
+    position: tuple | None,
+    limit: int | None,
+) -> Select:
+    """
+    Order a branch newest first and start it after the (created_at, item type,
+    id) position. The type is fixed within a branch, so the position comes down
+    to a (created_at, id) keyset that the branch's own index answers.
+    """
+    query = query.order_by(orm.created_at.desc(), orm.id.desc())
+
+    if position:
+        created_at, cursor_type, cursor_id = position
+        if item_type == cursor_type:
+            query = query.where(
+                or_(
+                    orm.created_at < created_at,
+                    and_(orm.created_at == created_at, orm.id < cursor_id),
+                )
+            )
+        elif item_type < cursor_type:
+            # sorts after the cursor's type, so its rows at the same instant are still to come
+            query = query.where(orm.created_at <= created_at)
+        else:
+            query = query.where(orm.created_at < created_at)
+
+    if limit is not None:
+        query = query.limit(limit + 1)
+
+    return query
+
+
+def build_items_query(
+    item_type: ItemType | None = None,
+    reminder: bool | None = None,
+    reading: bool | None = None,
+    tags: list[str] | None = None,
+    match: TagMatch = "all",
+    cursor: str | None = None,
+    limit: int | None = None,
+) -> Select:
+    """
+    One UNION ALL over links and notes ordered by (created_at, item type, id),
+    newest first. Each branch is cut to the page on its own (created_at, id)
+    index before the union, so a page reads at most limit + 1 rows per table.
+    """
+    position = decode_item_cursor(cursor) if cursor else None
+    branches = []
+    for name, kind in ITEM_KINDS.items():
+        if item_type in (None, name):
+            query = build_item_rows_query(name)
+            query = filter_items(query, kind, reminder, reading, tags, match)
+            branches.append(apply_item_keyset(query, name, kind.orm, position, limit))
+
+    # sqlite only takes ORDER BY and LIMIT on a union member inside a subquery
+    items = union_all(*(select(branch.subquery()) for branch in branches)).subquery()
+    query = select(items).order_by(
+        items.c.created_at.desc(), items.c.item_type.desc(), items.c.item_id.desc()
+    )
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return query
+
+
+def item_from_row(row) -> dict:
+    item_type = row["item_type"]
+    kind = ITEM_KINDS[item_type]
+    item = {kind.id_key: row["item_id"]}
+    item.update((field, row[field]) for field in [*kind.fields, *SHARED_FIELDS])
+    return {"item_type": item_type, "link": None, "note": None, item_type: item}
+
+
+async def get_items_page(
+    db: AsyncSession,
+    item_type: ItemType | None = None,
+    reminder: bool | None = None,
+    reading: bool | None = None,
+    limit: int | None = None,
+    cursor: str | None = None,
+    tags: list[str] | None = None,
+    match: TagMatch = "all",
+) -> tuple[list[dict], str | None]:
+    """
+    Fetch one keyset page of links and notes together, newest first, as plain
+    dicts shaped like ItemModel. Returns the items and the cursor for the next page.
+    """
+    query = build_items_query(item_type, reminder, reading, tags, match, cursor, limit)
+    result = await db.execute(query)
+    rows = result.mappings().all()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_item_cursor(
+            last["created_at"], last["item_type"], last["item_id"]
+        )
+
+    return [item_from_row(row) for row in rows], next_cursor
@@ -0,0 +1,199 @@
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from database import ReadSessionLocal, SessionLocal
+from helpers import fetch_page_metadata
+from models import UrlMetadataOrm
+from settings import METADATA_CACHE_SIZE, METADATA_CACHE_TTL
+
+# query parameters that only say where a link was shared, not what it points at
+TRACKING_PARAMS = {"fbclid", "gclid", "igshid", "mc_cid", "mc_eid", "ref_src", "si"}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Cache key for a url, so variants of the same page share an entry: https,
+    lowercase host without www or a default port, no fragment, trailing slash
+    or tracking parameters, and the remaining parameters sorted.
+    """
+    url = url.strip()
+    if not url.startswith("http"):
+        url = f"https://{url}"
+
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower().removeprefix("www.")
+    if parts.port and parts.port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{parts.port}"
+
+    query = urlencode(
+        sorted(
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if key.lower() not in TRACKING_PARAMS
+            and not key.lower().startswith("utm_")
+        )
+    )
+    return urlunsplit(("https", host, parts.path.rstrip("/") or "/", query, ""))
+
+
+@dataclass
+class CachedMetadata:
+    url: str
+    title: str
+    description: str
+    etag: str | None
+    last_modified: str | None
+    canonical_url: str | None
+    favicon_url: str | None
+    fetched_at: datetime
+
+    @classmethod
+    def from_orm(cls, row: UrlMetadataOrm) -> "CachedMetadata":
+        fetched_at = row.fetched_at
+        # sqlite hands back naive datetimes, everything is stored in utc
+        if fetched_at.tzinfo is None:
+            fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+        return cls(
+            url=row.url,
+            title=row.title,
+            description=row.description,
+            etag=row.etag,
+            last_modified=row.last_modified,
+            canonical_url=row.canonical_url,
+            favicon_url=row.favicon_url,
+            fetched_at=fetched_at,
+        )
+
+
+class MetadataCache:
+    """
+    Page metadata by normalized url, in the url_metadata table with an LRU of
+    recent entries in front of it. Entries older than the ttl are revalidated
+    with a conditional GET, so an unchanged page costs a 304 instead of a download.
+    """
+
+    def __init__(
+        self, ttl: int = METADATA_CACHE_TTL, max_size: int = METADATA_CACHE_SIZE
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries: OrderedDict[str, CachedMetadata] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+        }
+
+    def is_fresh(self, entry: CachedMetadata) -> bool:
+        age = datetime.now(timezone.utc) - entry.fetched_at
+        return age < timedelta(seconds=self.ttl)
+
+    def remember(self, entry: CachedMetadata) -> None:
+        self.entries[entry.url] = entry
+        self.entries.move_to_end(entry.url)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    async def load(self, key: str) -> CachedMetadata | None:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry
+
+        async with ReadSessionLocal() as db:
+            row = await db.get(UrlMetadataOrm, key)
+            if row is None:
+                return None
+            entry = CachedMetadata.from_orm(row)
+
+        self.remember(entry)
+        return entry
+
+    async def lookup(self, url: str) -> CachedMetadata | None:
+        """
+        The cached metadata for the url if it's still fresh
+        """
+        entry = await self.load(normalize_url(url))
+        if entry is not None and self.is_fresh(entry):
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        return None
+
+    async def refresh(self, url: str) -> CachedMetadata:
+        """
+        Fetch the page, conditionally when there's a stale entry to revalidate,
+        and store the result under the url and the page's canonical url. Raises
+        when the fetch fails.
+        """
+        key = normalize_url(url)
+        cached = await self.load(key)
+        now = datetime.now(timezone.utc)
+
+        page = await fetch_page_metadata(
+            url,
+            etag=cached.etag if cached else None,
+            last_modified=cached.last_modified if cached else None,
+        )
+        if page is None and cached is not None:
+            self.revalidated += 1
+            entry = replace(cached, fetched_at=now)
+        else:
+            page = page or await fetch_page_metadata(url)
+            entry = CachedMetadata(
+                url=key,
+                title=page.title,
+                description=page.description,
+                etag=page.etag,
+                last_modified=page.last_modified,
+                canonical_url=page.canonical_url,
+                favicon_url=page.favicon_url,
+                fetched_at=now,
+            )
+
+        entries = [entry]
+        if entry.canonical_url and normalize_url(entry.canonical_url) != key:
+            entries.append(replace(entry, url=normalize_url(entry.canonical_url)))
+        await self.save(entries)
+        return entry
+
+    async def get(self, url: str) -> CachedMetadata:
+        return await self.lookup(url) or await self.refresh(url)
+
+    async def save(self, entries: list[CachedMetadata]) -> None:
+        async with SessionLocal() as db:
+            for entry in entries:
+                await db.merge(
+                    UrlMetadataOrm(
+                        url=entry.url,
+                        title=entry.title,
+                        description=entry.description,
+                        etag=entry.etag,
+                        last_modified=entry.last_modified,
+                        canonical_url=entry.canonical_url,
+                        favicon_url=entry.favicon_url,
+                        fetched_at=entry.fetched_at,
+                    )
+                )
+            await db.commit()
+
+        for entry in entries:
+            self.remember(entry)
+
+
+metadata_cache = MetadataCache()
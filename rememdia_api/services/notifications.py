@@ -0,0 +1,260 @@
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
+from urllib.parse import urlsplit
+
+from sqlalchemy import Select, and_, case, literal, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from database import Base, SessionLocal
+from helpers import logger
+from models import LinkOrm, NoteOrm
+from services.webhooks import webhook_dispatcher
+from settings import NOTIFY_BATCH_SIZE, READING_INTERVAL, REMINDER_INTERVAL
+
+# discord rejects messages over these
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_MESSAGE_CHARS = 6000
+MAX_TITLE_CHARS = 256
+MAX_DESCRIPTION_CHARS = 4096
+
+REMINDER_COLOR = 0x00FF00
+READING_COLOR = 0x3498DB
+
+# ids of the items in a message the dispatcher hasn't delivered yet, left out of
+# the due items so the next tick doesn't send them again
+sending: dict[type[Base], set[int]] = {LinkOrm: set(), NoteOrm: set()}
+
+
+def first_due_at(reminder: bool, reading: bool, now: datetime) -> datetime | None:
+    """
+    Flagged items are due on the first scheduler tick after they're saved
+    """
+    return now if reminder or reading else None
+
+
+def next_due_at(reminder: bool, reading: bool, now: datetime) -> datetime | None:
+    """
+    When a notified item is due again, the shorter of its flags' intervals.
+    None once no flag repeats.
+    """
+    intervals = [
+        interval
+        for flag, interval in [(reminder, REMINDER_INTERVAL), (reading, READING_INTERVAL)]
+        if flag and interval > 0
+    ]
+    return now + timedelta(seconds=min(intervals)) if intervals else None
+
+
+def reschedule(item: LinkOrm | NoteOrm, was_flagged: bool, now: datetime) -> None:
+    """
+    Keep next_due_at in step with the flags after an update. An item that just got
+    flagged is due straight away, one that already was keeps its schedule.
+    """
+    if not (item.reminder or item.reading):
+        item.next_due_at = None
+    elif not was_flagged:
+        item.next_due_at = now
+
+
+def truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def embed_url(url: str) -> str | None:
+    """
+    Discord rejects the whole message over an embed url that isn't absolute
+    http(s), a link saved without a scheme gets https like everywhere else
+    """
+    if not url.startswith("http"):
+        url = f"https://{url}"
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return None
+    return url
+
+
+def item_embed(item: LinkOrm | NoteOrm) -> dict:
+    labels = [
+        label
+        for flag, label in [(item.reminder, "Reminder"), (item.reading, "Reading")]
+        if flag
+    ]
+    embed = {
+        "color": REMINDER_COLOR if item.reminder else READING_COLOR,
+        "footer": {"text": " · ".join(labels)},
+    }
+    if isinstance(item, LinkOrm):
+        embed["title"] = truncate(item.meta_title or item.url, MAX_TITLE_CHARS)
+        url = embed_url(item.url)
+        if url:
+            embed["url"] = url
+        embed["description"] = truncate(item.summary, MAX_DESCRIPTION_CHARS)
+    else:
+        embed["title"] = "Note"
+        embed["description"] = truncate(item.note, MAX_DESCRIPTION_CHARS)
+    return embed
+
+
+def embed_chars(embed: dict) -> int:
+    return (
+        len(embed.get("title", ""))
+        + len(embed.get("description", ""))
+        + len(embed["footer"]["text"])
+    )
+
+
+def batch_embeds(
+    items: list[LinkOrm | NoteOrm],
+) -> Iterator[list[tuple[LinkOrm | NoteOrm, dict]]]:
+    """
+    Group items into webhook messages within Discord's embed count and size limits
+    """
+    batch, chars = [], 0
+    for item in items:
+        embed = item_embed(item)
+        size = embed_chars(embed)
+        if batch and (
+            len(batch) == MAX_EMBEDS_PER_MESSAGE or chars + size > MAX_MESSAGE_CHARS
+        ):
+            yield batch
+            batch, chars = [], 0
+        batch.append((item, embed))
+        chars += size
+
+    if batch:
+        yield batch
+
+
+def build_due_query(
+    orm: type[Base], now: datetime, limit: int, exclude: set[int] = frozenset()
+) -> Select:
+    query = (
+        select(orm)
+        # flags cleared while a message was on its way can leave a schedule behind
+        .where(orm.next_due_at <= now, or_(orm.reminder, orm.reading))
+        .order_by(orm.next_due_at)
+        .limit(limit)
+    )
+    if exclude:
+        query = query.where(orm.id.not_in(exclude))
+    return query
+
+
+async def get_due_items(
+    db: AsyncSession, orm: type[Base], now: datetime, limit: int
+) -> list[LinkOrm | NoteOrm]:
+    result = await db.execute(build_due_query(orm, now, limit, sending[orm]))
+    return list(result.scalars().all())
+
+
+def notified_ids(
+    batch: list[tuple[LinkOrm | NoteOrm, dict]], orm: type[Base]
+) -> list[int]:
+    return [item.id for item, _ in batch if isinstance(item, orm)]
+
+
+def next_due_case(orm: type[Base], now: datetime):
+    """
+    next_due_at for the flags a row has when it's written, not the ones it
+    had when its message was queued
+    """
+
+    def due(reminder: bool, reading: bool):
+        return literal(next_due_at(reminder, reading, now), orm.next_due_at.type)
+
+    return case(
+        (and_(orm.reminder, orm.reading), due(True, True)),
+        (orm.reminder, due(True, False)),
+        (orm.reading, due(False, True)),
+        else_=due(False, False),
+    )
+
+
+async def mark_notified(
+    db: AsyncSession, links: list[int], notes: list[int], now: datetime
+) -> None:
+    """
+    Reschedule the items of a delivered message, one UPDATE per table. Items
+    deleted since it was queued are simply not matched.
+    """
+    for orm, ids in [(LinkOrm, links), (NoteOrm, notes)]:
+        if ids:
+            await db.execute(
+                update(orm)
+                .where(orm.id.in_(ids))
+                .values(last_notified_at=now, next_due_at=next_due_case(orm, now))
+                .execution_options(synchronize_session=False)
+            )
+    await db.commit()
+
+
+def track_message(links: list[int], notes: list[int], now: datetime) -> tuple:
+    """
+    The dispatcher callbacks for one message: its items are rescheduled once
+    it's delivered, and due again straight away when it's dropped
+    """
+    ids = {LinkOrm: set(links), NoteOrm: set(notes)}
+
+    def release() -> None:
+        for orm, item_ids in ids.items():
+            sending[orm].difference_update(item_ids)
+
+    async def on_delivered() -> None:
+        try:
+            async with SessionLocal() as db:
+                await mark_notified(db, links, notes, now)
+        finally:
+            release()
+
+    async def on_dropped() -> None:
+        release()
+
+    for orm, item_ids in ids.items():
+        sending[orm].update(item_ids)
+    return on_delivered, on_dropped
+
+
+async def notify_due_items(
+    db: AsyncSession,
+    now: datetime | None = None,
+    batch_size: int = NOTIFY_BATCH_SIZE,
+) -> int:
+    """
+    Hand every due reminder and reading item to the webhook dispatcher, links and
+    notes together, several to a message. Only due rows are read, through the
+    next_due_at index. Items are rescheduled once their message is delivered and
+    left out of the due items until then, a message the dispatcher gives up on
+    leaves them due. Items that don't fit in the queue stay due for the next
+    tick. Returns how many items were queued.
+    """
+    if not webhook_dispatcher.url:
+        logger.warning("No discord webhook found, skipping notifications")
+        return 0
+
+    now = now or datetime.now(timezone.utc)
+    sent = 0
+    while True:
+        items = [
+            *await get_due_items(db, LinkOrm, now, batch_size),
+            *await get_due_items(db, NoteOrm, now, batch_size),
+        ]
+        if not items:
+            return sent
+
+        messages = [
+            (
+                [embed for _, embed in batch],
+                notified_ids(batch, LinkOrm),
+                notified_ids(batch, NoteOrm),
+            )
+            for batch in batch_embeds(items)
+        ]
+        for embeds, links, notes in messages:
+            on_delivered, on_dropped = track_message(links, notes, now)
+            if not webhook_dispatcher.submit(
+                {"embeds": embeds}, on_delivered=on_delivered, on_dropped=on_dropped
+            ):
+                await on_dropped()
+                return sent
+            sent += len(embeds)
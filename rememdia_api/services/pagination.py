@@ -0,0 +1,98 @@
+import base64
+from datetime import datetime
+from typing import AsyncIterator
+
+import orjson
+from sqlalchemy import Select, and_, or_
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """
+    Encode the (created_at, id) keyset position of the last row on a page
+    """
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception as exc:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from exc
+
+
+def encode_item_cursor(created_at: datetime, item_type: str, item_id: int) -> str:
+    """
+    Encode the (created_at, item type, id) position of the last item on a page of
+    links and notes, ids alone repeat across the two tables
+    """
+    raw = f"{created_at.isoformat()}|{item_type}|{item_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_item_cursor(cursor: str) -> tuple[datetime, str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, item_type, item_id = raw.rsplit("|", 2)
+        if item_type not in ("link", "note"):
+            raise ValueError(item_type)
+        return datetime.fromisoformat(created_at), item_type, int(item_id)
+    except Exception as exc:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from exc
+
+
+CHANGE_KINDS = ("link", "note", "tag", "tombstone")
+
+
+def encode_change_cursor(upto: int, version: int, kind: str, row_id: int) -> str:
+    """
+    Encode the (version, kind, id) position of the last change on a page of
+    GET /changes, with the version the listing stops at so every page reads the
+    same window
+    """
+    raw = f"{upto}|{version}|{kind}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_change_cursor(cursor: str) -> tuple[int, int, str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        upto, version, kind, row_id = raw.split("|")
+        if kind not in CHANGE_KINDS:
+            raise ValueError(kind)
+        return int(upto), int(version), kind, int(row_id)
+    except Exception as exc:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from exc
+
+
+def apply_keyset(query: Select, orm, cursor: str | None, limit: int | None) -> Select:
+    """
+    Order the query by (created_at, id) and start it after the cursor position.
+    One extra row is requested so the caller can tell if there is a next page.
+    """
+    query = query.order_by(orm.created_at, orm.id)
+
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.where(
+            or_(
+                orm.created_at > created_at,
+                and_(orm.created_at == created_at, orm.id > row_id),
+            )
+        )
+
+    if limit is not None:
+        query = query.limit(limit + 1)
+
+    return query
+
+
+async def ndjson_lines(rows: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    async for row in rows:
+        yield orjson.dumps(row) + b"\n"
@@ -0,0 +1,147 @@
+import hashlib
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import Session
+
+from models import ChangeVersionOrm
+from services.metadata_cache import metadata_cache
+from settings import RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_SIZE
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    headers: dict[str, str]
+
+
+class ResponseCache:
+    """
+    Serialized bodies of the list endpoints, keyed by path and query string.
+    Every committed write to links, notes or tags moves the generation on and
+    drops what was cached, so an entry is only ever served for the generation
+    it was read in. The ETag hashes the key with the generation, a client that
+    has seen a page gets a 304 for that page without reading it again. Writes
+    from another process, like a backfill run from the command line, are caught
+    by polling the db's change version in the background, so a hit never
+    touches the db.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_SIZE,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self.size = 0
+        # a restart starts the generation over, the epoch keeps old ETags from matching
+        self.epoch = uuid.uuid4().hex[:8]
+        self.generation = 0
+        # the db's change version as of the last write this process saw
+        self.version: int | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def etag(self, key: str, generation: int | None = None) -> str:
+        if generation is None:
+            generation = self.generation
+        digest = hashlib.blake2b(
+            f"{self.epoch}-{generation}-{key}".encode(), digest_size=8
+        ).hexdigest()
+        # another page, or the same one under another filter, never matches
+        return f'"{digest}"'
+
+    def bump(self) -> None:
+        self.generation += 1
+        self.entries.clear()
+        self.size = 0
+
+    async def sync(self, db: AsyncSession) -> bool:
+        """
+        Move the generation on when the db's change version isn't the last one
+        seen here, True when it was
+        """
+        result = await db.execute(
+            select(ChangeVersionOrm.version).where(ChangeVersionOrm.id == 1)
+        )
+        version = result.scalar_one_or_none() or 0
+        if version == self.version:
+            return False
+        self.version = version
+        self.bump()
+        return True
+
+    def get(self, key: str) -> Response | None:
+        cached = self.entries.get(key)
+        if cached is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return Response(
+            content=cached.body,
+            media_type="application/json",
+            headers={**cached.headers, "ETag": self.etag(key)},
+        )
+
+    def put(
+        self, key: str, generation: int, body: bytes, headers: dict[str, str]
+    ) -> Response:
+        """
+        Cache a body read during generation, unless a write has landed since,
+        and return it as the response
+        """
+        if generation == self.generation and len(body) <= self.max_bytes:
+            self.discard(key)
+            self.entries[key] = CachedResponse(body, headers)
+            self.size += len(body)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted.body)
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={**headers, "ETag": self.etag(key, generation)},
+        )
+
+    def discard(self, key: str) -> None:
+        cached = self.entries.pop(key, None)
+        if cached is not None:
+            self.size -= len(cached.body)
+
+    def not_modified(self, key: str, if_none_match: str | None) -> Response | None:
+        etag = self.etag(key)
+        if if_none_match == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return None
+
+
+def cache_key(request: Request) -> str:
+    return f"{request.url.path}?{request.url.query}"
+
+
+response_cache = ResponseCache()
+
+
+async def sync_caches(db: AsyncSession) -> None:
+    """
+    Drop the cached responses, and the page metadata a backfill may have
+    rewritten, when the db was written to by another process
+    """
+    if await response_cache.sync(db):
+        metadata_cache.clear()
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_responses(session: Session) -> None:
+    # a transaction that wrote a link, note or tag was given a change version
+    if "change_version" in session.info:
+        response_cache.bump()
+        response_cache.version = session.info["change_version"]
@@ -0,0 +1,181 @@
+import re
+
+from sqlalchemy import Select, and_, case, literal, or_, text, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models import LinkModel, LinkOrm, NoteModel, NoteOrm, SearchResultModel, TagOrm
+from services.items import LINK, NOTE, build_rows_query
+
+
+# bm25 column weights, a hit in the summary, title or tags counts for more than the url
+SEARCH_WEIGHTS = {
+    "links_fts": "1.0, 3.0, 2.0, 1.0, 2.0",
+    "notes_fts": "1.0, 2.0",
+}
+
+# the same weights for the ILIKE ranking used on postgres
+LINK_COLUMN_WEIGHTS = [
+    (LinkOrm.url, 1),
+    (LinkOrm.summary, 3),
+    (LinkOrm.meta_title, 2),
+    (LinkOrm.meta_description, 1),
+]
+NOTE_COLUMN_WEIGHTS = [(NoteOrm.note, 1)]
+TAG_WEIGHT = 2
+
+
+def build_match_query(query: str) -> str | None:
+    """
+    Turn free text into an FTS5 match expression. Every word is quoted so user
+    input can't break the query syntax, and the last word is a prefix match so
+    partially typed words still find results.
+    """
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return None
+
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+async def search_hits_fts(
+    db: AsyncSession,
+    query: str,
+    item_type: str | None,
+    limit: int,
+    offset: int,
+) -> list:
+    match = build_match_query(query)
+    if match is None:
+        return []
+
+    selects = []
+    if item_type in (None, "link"):
+        selects.append(
+            f"SELECT 'link' AS item_type, rowid AS item_id, "
+            f"bm25(links_fts, {SEARCH_WEIGHTS['links_fts']}) AS rank "
+            f"FROM links_fts WHERE links_fts MATCH :match"
+        )
+    if item_type in (None, "note"):
+        selects.append(
+            f"SELECT 'note' AS item_type, rowid AS item_id, "
+            f"bm25(notes_fts, {SEARCH_WEIGHTS['notes_fts']}) AS rank "
+            f"FROM notes_fts WHERE notes_fts MATCH :match"
+        )
+
+    ranked_query = text(
+        " UNION ALL ".join(selects) + " ORDER BY rank LIMIT :limit OFFSET :offset"
+    )
+    result = await db.execute(
+        ranked_query, {"match": match, "limit": limit, "offset": offset}
+    )
+    return result.all()
+
+
+def trigram_select(
+    item_type: str, orm, column_weights: list, terms: list[str]
+) -> Select:
+    """
+    Every word has to appear in one of the columns or tag names, the rank adds
+    up the weights of every hit. Negated so lower is better, the same as bm25.
+    """
+
+    def tagged(term: str):
+        return orm.tags.any(TagOrm.name.icontains(term, autoescape=True))
+
+    matches = [
+        or_(
+            *[column.icontains(term, autoescape=True) for column, _ in column_weights],
+            tagged(term),
+        )
+        for term in terms
+    ]
+    rank = sum(
+        case((column.icontains(term, autoescape=True), weight), else_=0)
+        for term in terms
+        for column, weight in column_weights
+    ) + sum(case((tagged(term), TAG_WEIGHT), else_=0) for term in terms)
+    return select(
+        literal(item_type).label("item_type"),
+        orm.id.label("item_id"),
+        (-rank).label("rank"),
+    ).where(and_(*matches))
+
+
+async def search_hits_trigram(
+    db: AsyncSession,
+    query: str,
+    item_type: str | None,
+    limit: int,
+    offset: int,
+) -> list:
+    """
+    ILIKE search for postgres, served by the pg_trgm GIN indexes from the migrations
+    """
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return []
+
+    selects = []
+    if item_type in (None, "link"):
+        selects.append(trigram_select("link", LinkOrm, LINK_COLUMN_WEIGHTS, terms))
+    if item_type in (None, "note"):
+        selects.append(trigram_select("note", NoteOrm, NOTE_COLUMN_WEIGHTS, terms))
+
+    ranked = union_all(*selects).subquery()
+    result = await db.execute(
+        select(ranked)
+        .order_by(ranked.c.rank, ranked.c.item_id)
+        .limit(limit)
+        .offset(offset)
+    )
+    return result.all()
+
+
+async def search_items(
+    db: AsyncSession,
+    query: str,
+    item_type: str | None = None,
+    limit: int = 50,
+    offset: int = 0,
+) -> list[SearchResultModel]:
+    if db.bind.dialect.name == "postgresql":
+        hits = await search_hits_trigram(db, query, item_type, limit, offset)
+    else:
+        hits = await search_hits_fts(db, query, item_type, limit, offset)
+
+    link_ids = [hit.item_id for hit in hits if hit.item_type == "link"]
+    note_ids = [hit.item_id for hit in hits if hit.item_type == "note"]
+
+    links = {}
+    if link_ids:
+        result = await db.execute(build_rows_query(LINK).where(LinkOrm.id.in_(link_ids)))
+        links = {row["link_id"]: row for row in result.mappings()}
+
+    notes = {}
+    if note_ids:
+        result = await db.execute(build_rows_query(NOTE).where(NoteOrm.id.in_(note_ids)))
+        notes = {row["note_id"]: row for row in result.mappings()}
+
+    results = []
+    for hit in hits:
+        if hit.item_type == "link" and hit.item_id in links:
+            results.append(
+                SearchResultModel(
+                    item_type="link",
+                    rank=hit.rank,
+                    link=LinkModel(**links[hit.item_id]),
+                )
+            )
+        elif hit.item_type == "note" and hit.item_id in notes:
+            results.append(
+                SearchResultModel(
+                    item_type="note",
+                    rank=hit.rank,
+                    note=NoteModel(**notes[hit.item_id]),
+                )
+            )
+
+    return results
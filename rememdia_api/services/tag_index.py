@@ -0,0 +1,84 @@
+import heapq
+import uuid
+from bisect import bisect_left, insort
+from typing import Iterable
+
+from sqlalchemy import func, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models import LinkTagOrm, NoteTagOrm, TagOrm
+
+
+class TagIndex:
+    """
+    In-memory prefix index over tag names for autocomplete. Names are kept in a
+    sorted list so a prefix is a bisect range, and results are ranked by how many
+    links and notes use the tag. The version is bumped on every change and feeds
+    the ETag of GET /tags.
+    """
+
+    def __init__(self):
+        self.names: list[str] = []
+        self.usage: dict[str, int] = {}
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.epoch}-{self.version}"'
+
+    async def load(self, db: AsyncSession) -> None:
+        tag_ids = union_all(
+            select(LinkTagOrm.tag_id.label("tag_id")),
+            select(NoteTagOrm.tag_id.label("tag_id")),
+        ).subquery()
+        usage = (
+            select(tag_ids.c.tag_id, func.count().label("uses"))
+            .group_by(tag_ids.c.tag_id)
+            .subquery()
+        )
+        result = await db.execute(
+            select(TagOrm.name, func.coalesce(usage.c.uses, 0))
+            .outerjoin(usage, usage.c.tag_id == TagOrm.id)
+        )
+
+        self.usage = {name: uses for name, uses in result.all()}
+        self.names = sorted(self.usage)
+        # a reload can change the tag set without the version moving past an old ETag
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+
+    def track(self, added: Iterable[str] = (), removed: Iterable[str] = ()) -> None:
+        """
+        Record tags being attached to or detached from a link or note
+        """
+        changed = False
+        for name in added:
+            if name not in self.usage:
+                insort(self.names, name)
+                self.usage[name] = 0
+            self.usage[name] += 1
+            changed = True
+        for name in removed:
+            if name in self.usage:
+                self.usage[name] = max(self.usage[name] - 1, 0)
+                changed = True
+
+        if changed:
+            self.version += 1
+
+    def search(self, prefix: str = "", limit: int | None = None) -> list[str]:
+        start = bisect_left(self.names, prefix)
+        end = bisect_left(self.names, prefix + "\U0010ffff") if prefix else len(self.names)
+        matches = self.names[start:end]
+
+        def rank(name: str) -> tuple[int, str]:
+            return -self.usage[name], name
+
+        if limit is not None and limit < len(matches):
+            return heapq.nsmallest(limit, matches, key=rank)
+        return sorted(matches, key=rank)
+
+
+tag_index = TagIndex()
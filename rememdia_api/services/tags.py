@@ -0,0 +1,136 @@
+from typing import Literal
+
+from sqlalchemy import JSON, ScalarSelect, Select, String, func
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.future import select
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import TypeDecorator
+
+from database import Base
+from models import TagOrm
+from services.versions import next_version
+
+TagMatch = Literal["all", "any"]
+
+
+class TagList(TypeDecorator):
+    """
+    A list of tag names aggregated by the db, a json array on sqlite and a
+    text[] on postgres, either way a python list once read
+    """
+
+    impl = JSON
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(ARRAY(String))
+        return dialect.type_descriptor(JSON())
+
+    def process_result_value(self, value, dialect):
+        # array_agg over no rows is NULL
+        return value or []
+
+
+class tag_list(FunctionElement):
+    type = TagList()
+    inherit_cache = True
+
+
+@compiles(tag_list)
+def compile_tag_list(element, compiler, **kw):
+    return f"json_group_array({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(tag_list, "postgresql")
+def compile_tag_list_postgresql(element, compiler, **kw):
+    return f"array_agg({compiler.process(element.clauses, **kw)})"
+
+
+def split_tags(value: str | None) -> list[str]:
+    """
+    Parse a comma separated tags query parameter
+    """
+    if not value:
+        return []
+    return list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+
+
+def tagged_ids(
+    tag_orm: type[Base], item_key: str, names: list[str], match: TagMatch = "all"
+) -> Select:
+    """
+    Ids of the items carrying all (or any) of the tags, read from the tag_id
+    index on the association table without touching the items themselves.
+    Meant as an IN semi-join so the outer query keeps its own ordering.
+    """
+    item_id = getattr(tag_orm, item_key)
+    unique_names = list(dict.fromkeys(names))
+    query = select(item_id).where(
+        tag_orm.tag_id.in_(select(TagOrm.id).where(TagOrm.name.in_(unique_names)))
+    )
+    if match == "all":
+        query = query.group_by(item_id).having(func.count() == len(unique_names))
+    return query
+
+
+def tag_names(tag_orm: type[Base], item_key: str, item_orm: type[Base]) -> ScalarSelect:
+    """
+    The item's tag names as a list in tag id order, a column of the item query
+    so tags come back with their rows instead of from a second IN query that
+    loads a TagOrm per tag into the session
+    """
+    names = (
+        select(TagOrm.name)
+        .join(tag_orm, tag_orm.tag_id == TagOrm.id)
+        .where(getattr(tag_orm, item_key) == item_orm.id)
+        # the (item, tag) primary key hands them over in this order, no sort per row
+        .order_by(tag_orm.tag_id)
+        .correlate(item_orm)
+        .subquery()
+    )
+    return select(tag_list(names.c.name)).scalar_subquery()
+
+
+async def resolve_tags(db: AsyncSession, names: list[str]) -> dict[str, TagOrm]:
+    """
+    Look up every tag name with one IN query, returns the tags keyed by name.
+    Missing tags are created with a single INSERT ... ON CONFLICT DO NOTHING
+    RETURNING, so a concurrent writer creating the same tag can't trip the
+    unique constraint on tags.name. Only the names another writer got to first
+    are read back. Names that all exist already cost the one query and no
+    change version.
+    """
+    unique_names = list(dict.fromkeys(names))
+    if not unique_names:
+        return {}
+
+    result = await db.execute(select(TagOrm).where(TagOrm.name.in_(unique_names)))
+    tags = {tag.name: tag for tag in result.scalars().all()}
+
+    missing = [name for name in unique_names if name not in tags]
+    if not missing:
+        return tags
+
+    insert = (
+        postgresql_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    )
+    version = await next_version(db)
+    result = await db.execute(
+        insert(TagOrm)
+        .values([{"name": name, "version": version} for name in missing])
+        .on_conflict_do_nothing(index_elements=[TagOrm.name])
+        .returning(TagOrm)
+    )
+    tags.update({tag.name: tag for tag in result.scalars().all()})
+
+    conflicted = [name for name in missing if name not in tags]
+    if conflicted:
+        result = await db.execute(select(TagOrm).where(TagOrm.name.in_(conflicted)))
+        tags.update({tag.name: tag for tag in result.scalars().all()})
+
+    return tags
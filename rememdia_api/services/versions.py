@@ -0,0 +1,80 @@
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models import ChangeVersionOrm, LinkOrm, NoteOrm, TagOrm, TombstoneOrm
+
+ITEM_TYPES = {LinkOrm: "link", NoteOrm: "note"}
+
+
+def allocate_version(session: Session) -> int:
+    """
+    The change version for everything the session writes in its current
+    transaction, bumped once on first use. On postgres the counter row stays
+    locked until commit, so concurrent writers get their versions in commit order
+    and a replica never sees a version before an earlier one has landed.
+    """
+    version = session.info.get("change_version")
+    if version is None:
+        insert = (
+            postgresql_insert
+            if session.get_bind().dialect.name == "postgresql"
+            else sqlite_insert
+        )
+        table = ChangeVersionOrm.__table__
+        result = session.execute(
+            insert(table)
+            .values(id=1, version=1)
+            .on_conflict_do_update(
+                index_elements=[table.c.id], set_={"version": table.c.version + 1}
+            )
+            .returning(table.c.version)
+        )
+        version = result.scalar_one()
+        session.info["change_version"] = version
+    return version
+
+
+async def next_version(db: AsyncSession) -> int:
+    """
+    allocate_version for writes that bypass the unit of work, like bulk inserts
+    """
+    return await db.run_sync(allocate_version)
+
+
+@event.listens_for(Session, "before_flush")
+def stamp_versions(session: Session, flush_context, instances) -> None:
+    """
+    Give new and modified links, notes and tags the transaction's version, and
+    leave a tombstone for every deleted link or note
+    """
+    changed = [
+        obj for obj in session.new if isinstance(obj, (LinkOrm, NoteOrm, TagOrm))
+    ]
+    # tags never change after they're created, only links and notes count as dirty
+    changed += [
+        obj
+        for obj in session.dirty
+        if isinstance(obj, (LinkOrm, NoteOrm)) and session.is_modified(obj)
+    ]
+    deleted = [obj for obj in session.deleted if isinstance(obj, (LinkOrm, NoteOrm))]
+    if not changed and not deleted:
+        return
+
+    version = allocate_version(session)
+    for obj in changed:
+        obj.version = version
+    for obj in deleted:
+        session.add(
+            TombstoneOrm(
+                item_type=ITEM_TYPES[type(obj)], item_id=obj.id, version=version
+            )
+        )
+
+
+@event.listens_for(Session, "after_transaction_end")
+def forget_version(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop("change_version", None)
@@ -0,0 +1,390 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from database import SessionLocal
+from helpers import client, logger
+from models import WebhookOutboxOrm, WebhookStatus
+from settings import (
+    DISCORD_WEBHOOK,
+    WEBHOOK_BACKOFF,
+    WEBHOOK_BURST,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_RATE,
+    WEBHOOK_RETRIES,
+    WEBHOOK_RETRY_INTERVAL,
+    WEBHOOK_TIMEOUT,
+)
+
+
+class TokenBucket:
+    """
+    Allows bursts of up to capacity requests, refilled at rate tokens a second.
+    pause() holds every request until a rate limit resets, the bucket is full
+    again after that like Discord's own.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = float(self.capacity)
+        self.updated = self.paused_until
+
+
+@dataclass
+class WebhookMessage:
+    payload: dict
+    queued_at: float = field(default_factory=time.time)
+    outbox_id: int | None = None
+    attempts: int = 0
+    # called once Discord took the message, or once it's given up on
+    on_delivered: Callable[[], Awaitable[None]] | None = None
+    on_dropped: Callable[[], Awaitable[None]] | None = None
+
+
+def retry_after(response: httpx.Response) -> float:
+    """
+    Seconds to wait after a 429, from the body Discord sends or the Retry-After header
+    """
+    try:
+        return float(response.json()["retry_after"])
+    except Exception:
+        return float(response.headers.get("Retry-After", 1))
+
+
+class WebhookDispatcher:
+    """
+    Sends webhook messages from a bounded queue so callers never wait on Discord.
+    A single worker posts through a token bucket that follows Discord's rate limit
+    headers. Messages that fail go to the webhook_outbox table and are retried
+    with backoff, after the last attempt they stay there as dead letters.
+    """
+
+    def __init__(
+        self,
+        url: str | None = DISCORD_WEBHOOK,
+        max_size: int = WEBHOOK_QUEUE_SIZE,
+        rate: float = WEBHOOK_RATE,
+        burst: int = WEBHOOK_BURST,
+        retries: int = WEBHOOK_RETRIES,
+        backoff: float = WEBHOOK_BACKOFF,
+        retry_interval: float = WEBHOOK_RETRY_INTERVAL,
+        timeout: float = WEBHOOK_TIMEOUT,
+    ):
+        self.url = url
+        self.max_size = max_size
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+
+        self.queue: asyncio.Queue[WebhookMessage] | None = None
+        self.bucket = TokenBucket(rate, burst)
+        self.tasks: list[asyncio.Task] = []
+        # outbox rows sitting in the queue, so a sweep doesn't queue them twice
+        self.queued_outbox_ids: set[int] = set()
+        # callbacks of messages waiting in the outbox, they can't be stored with the row
+        self.outbox_callbacks: dict[int, tuple] = {}
+
+        self.sent = 0
+        self.retried = 0
+        self.dropped = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue(maxsize=self.max_size)
+        self.bucket = TokenBucket(self.rate, self.burst)
+        self.queued_outbox_ids = set()
+        self.outbox_callbacks = {}
+        self.tasks = [
+            asyncio.create_task(self.worker()),
+            asyncio.create_task(self.sweeper()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+        # keep whatever didn't get sent for the next start, except messages whose
+        # sender is told, it sends them again
+        unsent, dropped = [], []
+        while self.queue is not None and not self.queue.empty():
+            message = self.queue.get_nowait()
+            if message.outbox_id is not None:
+                # already in the outbox, with its callbacks in outbox_callbacks
+                continue
+            if message.on_dropped is not None:
+                dropped.append(message.on_dropped)
+            else:
+                unsent.append(message)
+        self.queue = None
+
+        # the sender sends these again too, the sweeper mustn't after a restart
+        cancelled = [
+            outbox_id
+            for outbox_id, (_, on_dropped) in self.outbox_callbacks.items()
+            if on_dropped is not None
+        ]
+        dropped += [self.outbox_callbacks[outbox_id][1] for outbox_id in cancelled]
+        self.outbox_callbacks = {}
+
+        if unsent or cancelled:
+            async with SessionLocal() as db:
+                if cancelled:
+                    await db.execute(
+                        update(WebhookOutboxOrm)
+                        .where(
+                            WebhookOutboxOrm.id.in_(cancelled),
+                            WebhookOutboxOrm.status == WebhookStatus.PENDING.value,
+                        )
+                        .values(
+                            status=WebhookStatus.CANCELLED.value, next_attempt_at=None
+                        )
+                    )
+                db.add_all(
+                    WebhookOutboxOrm(
+                        payload=message.payload,
+                        next_attempt_at=datetime.now(timezone.utc),
+                    )
+                    for message in unsent
+                )
+                await db.commit()
+        for on_dropped in dropped:
+            await on_dropped()
+
+    def submit(
+        self,
+        payload: dict,
+        on_delivered: Callable[[], Awaitable[None]] | None = None,
+        on_dropped: Callable[[], Awaitable[None]] | None = None,
+    ) -> bool:
+        """
+        Queue a message without waiting for it to be sent, returns False when
+        there's no webhook or the queue is full. on_delivered is awaited once
+        Discord has taken the message, on_dropped when it never will.
+        """
+        if self.queue is None or not self.url:
+            return False
+        message = WebhookMessage(
+            payload, on_delivered=on_delivered, on_dropped=on_dropped
+        )
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            logger.warning("Webhook queue full, message not queued")
+            return False
+
+    async def join(self) -> None:
+        if self.queue is not None:
+            await self.queue.join()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "queue_size": self.max_size,
+            "sent": self.sent,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "queue_latency_avg": self.latency_total / self.sent if self.sent else 0.0,
+            "queue_latency_max": self.latency_max,
+        }
+
+    async def worker(self) -> None:
+        while True:
+            message = await self.queue.get()
+            try:
+                await self.deliver(message)
+            except Exception as exc:
+                logger.exception("Error while sending webhook message", exc_info=exc)
+            finally:
+                if message.outbox_id is not None:
+                    self.queued_outbox_ids.discard(message.outbox_id)
+                self.queue.task_done()
+
+    async def sweeper(self) -> None:
+        while True:
+            await asyncio.sleep(self.retry_interval)
+            try:
+                await self.retry_outbox()
+            except Exception as exc:
+                logger.exception("Error while retrying webhook outbox", exc_info=exc)
+
+    async def retry_outbox(self) -> None:
+        """
+        Queue the pending outbox messages whose backoff has passed
+        """
+        free = self.max_size - self.queue.qsize()
+        if free <= 0:
+            return
+
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(WebhookOutboxOrm)
+                .where(
+                    WebhookOutboxOrm.status == WebhookStatus.PENDING.value,
+                    WebhookOutboxOrm.next_attempt_at <= datetime.now(timezone.utc),
+                )
+                .order_by(WebhookOutboxOrm.next_attempt_at)
+                .limit(free)
+            )
+            rows = result.scalars().all()
+
+        for row in rows:
+            if row.id in self.queued_outbox_ids:
+                continue
+            self.queued_outbox_ids.add(row.id)
+            on_delivered, on_dropped = self.outbox_callbacks.get(row.id, (None, None))
+            self.queue.put_nowait(
+                WebhookMessage(
+                    row.payload,
+                    queued_at=row.created_at.replace(tzinfo=timezone.utc).timestamp(),
+                    outbox_id=row.id,
+                    attempts=row.attempts,
+                    on_delivered=on_delivered,
+                    on_dropped=on_dropped,
+                )
+            )
+
+    async def deliver(self, message: WebhookMessage) -> None:
+        # a 429 isn't the message's fault, wait it out without using up an attempt
+        for _ in range(self.retries + 1):
+            await self.bucket.acquire()
+            try:
+                response = await client.post(
+                    self.url, json=message.payload, timeout=self.timeout
+                )
+            except httpx.HTTPError as exc:
+                await self.defer(message, repr(exc))
+                return
+
+            self.follow_rate_limit(response)
+            if response.status_code != 429:
+                break
+            self.retried += 1
+            self.bucket.pause(retry_after(response))
+        else:
+            await self.defer(message, "rate limited")
+            return
+
+        if response.is_success:
+            await self.delivered(message)
+        elif response.status_code >= 500:
+            await self.defer(message, f"HTTP {response.status_code}")
+        else:
+            # the message itself was rejected, sending it again won't help
+            await self.dead_letter(message, f"HTTP {response.status_code}")
+
+    def follow_rate_limit(self, response: httpx.Response) -> None:
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            self.bucket.pause(float(response.headers.get("X-RateLimit-Reset-After", 1)))
+
+    async def delivered(self, message: WebhookMessage) -> None:
+        latency = time.time() - message.queued_at
+        self.sent += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+        if message.outbox_id is not None:
+            self.outbox_callbacks.pop(message.outbox_id, None)
+            async with SessionLocal() as db:
+                row = await db.get(WebhookOutboxOrm, message.outbox_id)
+                if row is not None:
+                    await db.delete(row)
+                    await db.commit()
+        if message.on_delivered is not None:
+            await message.on_delivered()
+
+    async def defer(self, message: WebhookMessage, error: str) -> None:
+        message.attempts += 1
+        if message.attempts > self.retries:
+            await self.dead_letter(message, error)
+            return
+
+        logger.warning(f"Webhook message failed ({error}), retrying later")
+        self.retried += 1
+        delay = self.backoff * 2 ** (message.attempts - 1)
+        await self.save(
+            message,
+            WebhookStatus.PENDING,
+            error,
+            datetime.now(timezone.utc) + timedelta(seconds=delay),
+        )
+
+    async def dead_letter(self, message: WebhookMessage, error: str) -> None:
+        logger.error(f"Webhook message dropped ({error})")
+        self.dropped += 1
+        await self.save(message, WebhookStatus.DEAD, error, None)
+        self.outbox_callbacks.pop(message.outbox_id, None)
+        if message.on_dropped is not None:
+            await message.on_dropped()
+
+    async def save(
+        self,
+        message: WebhookMessage,
+        status: WebhookStatus,
+        error: str,
+        next_attempt_at: datetime | None,
+    ) -> None:
+        async with SessionLocal() as db:
+            row = None
+            if message.outbox_id is not None:
+                row = await db.get(WebhookOutboxOrm, message.outbox_id)
+            if row is None:
+                row = WebhookOutboxOrm(payload=message.payload)
+                db.add(row)
+            row.status = status.value
+            row.attempts = message.attempts
+            row.last_error = error
+            row.next_attempt_at = next_attempt_at
+            await db.flush()
+            # read before the commit expires it
+            message.outbox_id = row.id
+            await db.commit()
+        if message.on_delivered or message.on_dropped:
+            callbacks = (message.on_delivered, message.on_dropped)
+            self.outbox_callbacks[message.outbox_id] = callbacks
+
+
+async def get_outbox_counts(db: AsyncSession) -> dict[str, int]:
+    result = await db.execute(
+        select(WebhookOutboxOrm.status, func.count()).group_by(WebhookOutboxOrm.status)
+    )
+    return {status: count for status, count in result.all()}
+
+
+webhook_dispatcher = WebhookDispatcher()
@@ -0,0 +1,166 @@
+import asyncio
+
+import pytest
+
+from asgi_lifespan import LifespanManager
+from httpx import AsyncClient, ASGITransport
+from unittest.mock import patch
+
+from api import app
+from database import ReadSessionLocal, SessionLocal
+from helpers import PageMetadata
+from models import BackfillCheckpointOrm, LinkOrm
+from services.backfill import MetadataBackfill, metadata_backfill
+
+
+async def add_links(urls: list[str], status: str = "pending", title: str = "") -> None:
+    async with SessionLocal() as db:
+        for url in urls:
+            db.add(
+                LinkOrm(
+                    url=url,
+                    summary=url,
+                    meta_title=title,
+                    meta_description="",
+                    enrichment_status=status,
+                    reminder=False,
+                    reading=False,
+                )
+            )
+        await db.commit()
+
+
+async def get_links() -> dict[str, LinkOrm]:
+    async with ReadSessionLocal() as db:
+        result = await db.execute(LinkOrm.__table__.select())
+        return {link.url: link for link in result.all()}
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_backfill_fills_missing_metadata() -> None:
+    # saved before metadata worked, failed, and ones that are already fine
+    await add_links([f"https://old.example/{i}" for i in range(5)])
+    await add_links(["https://broken.example/"], status="failed")
+    await add_links(["https://fine.example/"], status="done", title="Fine")
+    # a page without a title, like a pdf, isn't fetched again every run
+    await add_links(["https://fine.example/file.pdf"], status="done")
+
+    async def fetch(url, etag=None, last_modified=None):
+        if "broken" in url:
+            raise ValueError("no page")
+        return PageMetadata(f"Title of {url}", "Description")
+
+    with patch("services.metadata_cache.fetch_page_metadata", side_effect=fetch) as mock:
+        backfill = MetadataBackfill(batch_size=2, host_interval=0)
+        checkpoint = await backfill.run()
+
+    assert checkpoint["status"] == "done"
+    assert checkpoint["processed"] == 6
+    assert checkpoint["updated"] == 5
+    assert checkpoint["failed"] == 1
+    fetched = [call.args[0] for call in mock.call_args_list]
+    assert not [url for url in fetched if url.startswith("https://fine.example/")]
+
+    links = await get_links()
+    assert links["https://old.example/3"].meta_title == "Title of https://old.example/3"
+    assert links["https://old.example/3"].enrichment_status == "done"
+    assert links["https://broken.example/"].enrichment_status == "failed"
+    assert links["https://fine.example/"].meta_title == "Fine"
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_backfill_resumes_from_checkpoint() -> None:
+    await add_links([f"https://example.com/{i}" for i in range(1, 5)])
+    # a run that crashed after committing the batch up to link 2
+    async with SessionLocal() as db:
+        db.add(
+            BackfillCheckpointOrm(
+                job="metadata", status="running", last_id=2, processed=2, updated=2
+            )
+        )
+        await db.commit()
+
+    with patch(
+        "services.metadata_cache.fetch_page_metadata",
+        return_value=PageMetadata("Fetched", ""),
+    ):
+        checkpoint = await MetadataBackfill(host_interval=0).run()
+
+    assert checkpoint["status"] == "done"
+    assert checkpoint["processed"] == 4
+    links = await get_links()
+    assert [links[f"https://example.com/{i}"].meta_title for i in range(1, 5)] == [
+        "",
+        "",
+        "Fetched",
+        "Fetched",
+    ]
+
+    # a finished run starts over from the first link
+    with patch(
+        "services.metadata_cache.fetch_page_metadata",
+        return_value=PageMetadata("Fetched", ""),
+    ):
+        checkpoint = await MetadataBackfill(host_interval=0).run()
+    assert checkpoint["processed"] == 2
+    assert checkpoint["last_id"] == 2
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_backfill_limits_each_host() -> None:
+    urls = [f"https://{host}.example/{i}" for host in ("a", "b", "c") for i in range(4)]
+    await add_links(urls)
+
+    active: dict[str, int] = {}
+    most: dict[str, int] = {}
+    total = {"active": 0, "most": 0}
+
+    async def fetch(url, etag=None, last_modified=None):
+        host = url.split("/")[2]
+        active[host] = active.get(host, 0) + 1
+        total["active"] += 1
+        most[host] = max(most.get(host, 0), active[host])
+        total["most"] = max(total["most"], total["active"])
+        await asyncio.sleep(0.01)
+        active[host] -= 1
+        total["active"] -= 1
+        return PageMetadata("Title", "")
+
+    with patch("services.metadata_cache.fetch_page_metadata", side_effect=fetch):
+        backfill = MetadataBackfill(
+            batch_size=100, concurrency=3, host_concurrency=1, host_interval=0
+        )
+        checkpoint = await backfill.run()
+
+    assert checkpoint["updated"] == 12
+    assert max(most.values()) == 1
+    assert total["most"] == 3
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_backfill_api() -> None:
+    # failed rather than pending, the enrichment queue would pick those up at startup
+    await add_links(["https://example.com/1", "https://example.com/2"], status="failed")
+
+    with patch(
+        "services.metadata_cache.fetch_page_metadata",
+        return_value=PageMetadata("Fetched", ""),
+    ):
+        async with LifespanManager(app):
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://localhost"
+            ) as client:
+                r = await client.get("/link/backfill")
+                assert r.status_code == 200
+                assert r.json()["remaining"] == 2
+                assert r.json()["active"] is False
+
+                r = await client.post("/link/backfill")
+                assert r.status_code == 200
+                await metadata_backfill.task
+
+                r = await client.get("/link/backfill")
+                status = r.json()
+                assert status["status"] == "done"
+                assert status["updated"] == 2
+                assert status["remaining"] == 0
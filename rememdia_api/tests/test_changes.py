@@ -0,0 +1,139 @@
+import pytest
+
+from asgi_lifespan import LifespanManager
+from httpx import AsyncClient, ASGITransport
+
+from api import app
+from services.enrichment import enrichment_queue
+
+
+def link(url: str, tags: list[str]) -> dict:
+    return {
+        "url": url,
+        "summary": "Example",
+        "reminder": False,
+        "reading": False,
+        "tags": tags,
+    }
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_changes_since(mock_fetch_page_metadata) -> None:
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            r = await client.post("/link", json=link("https://one.example", ["a"]))
+            first_id = r.json()["link_id"]
+            r = await client.post("/link", json=link("https://two.example", ["b"]))
+            second_id = r.json()["link_id"]
+            r = await client.post(
+                "/note",
+                json={"note": "A note", "reminder": False, "reading": False, "tags": ["a"]},
+            )
+            await enrichment_queue.join()
+
+            # a fresh replica gets everything
+            r = await client.get("/changes", params={"since": 0})
+            assert r.status_code == 200
+            changes = r.json()
+            assert not changes["reset"]
+            link_ids = [item["link_id"] for item in changes["links"]]
+            assert link_ids == [first_id, second_id]
+            assert changes["links"][0]["meta_title"] == "Mocked Title"
+            assert [item["note"] for item in changes["notes"]] == ["A note"]
+            assert changes["tags"] == ["a", "b"]
+            version = changes["version"]
+
+            # nothing new, nothing sent
+            r = await client.get("/changes", params={"since": version})
+            changes = r.json()
+            assert changes["version"] == version
+            assert changes["links"] == changes["notes"] == changes["tags"] == []
+
+            # only the edited link, the new tag and the deleted one come back
+            r = await client.patch(f"/link/{first_id}", json={"tags": ["a", "c"]})
+            assert r.status_code == 200
+            r = await client.delete(f"/link/{second_id}")
+            assert r.status_code == 200
+
+            r = await client.get("/changes", params={"since": version})
+            changes = r.json()
+            assert changes["version"] > version
+            assert [item["link_id"] for item in changes["links"]] == [first_id]
+            assert changes["links"][0]["tags"] == ["a", "c"]
+            assert changes["notes"] == []
+            assert changes["tags"] == ["c"]
+            assert changes["deleted"] == {"links": [second_id], "notes": []}
+            version = changes["version"]
+
+            # bulk imports skip the unit of work but are versioned all the same
+            r = await client.post(
+                "/link/bulk", json=[link("https://three.example", ["d"])]
+            )
+            assert r.json()["created"] == 1
+            await enrichment_queue.join()
+
+            r = await client.get("/changes", params={"since": version})
+            changes = r.json()
+            assert [item["url"] for item in changes["links"]] == [
+                "https://three.example"
+            ]
+            assert changes["tags"] == ["d"]
+
+            # a replica from before the db was reset has to start over
+            r = await client.get("/changes", params={"since": changes["version"] + 10})
+            assert r.json()["reset"]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_changes_pages(mock_fetch_page_metadata) -> None:
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            # one bulk import, a single version shared by every link and tag
+            r = await client.post(
+                "/link/bulk",
+                json=[link(f"https://{i}.example", [f"t{i % 2}"]) for i in range(5)],
+            )
+            assert r.json()["created"] == 5
+            r = await client.post(
+                "/note",
+                json={"note": "A note", "reminder": False, "reading": False, "tags": []},
+            )
+            r = await client.get("/link", params={"limit": 1})
+            r = await client.delete(f"/link/{r.json()[0]['link_id']}")
+            await enrichment_queue.join()
+
+            r = await client.get("/changes", params={"since": 0})
+            everything = r.json()
+            assert not everything["has_more"]
+
+            # pages split inside a version and add up to the single response
+            pages = []
+            cursor = None
+            while True:
+                params = {"since": 0, "limit": 2}
+                if cursor:
+                    params["cursor"] = cursor
+                r = await client.get("/changes", params=params)
+                assert r.status_code == 200
+                page = r.json()
+                assert page["version"] == everything["version"]
+                pages.append(page)
+                cursor = page["cursor"]
+                if not page["has_more"]:
+                    break
+
+            assert len(pages) > 3
+            for key in ("links", "notes", "tags"):
+                assert sorted(
+                    str(item) for page in pages for item in page[key]
+                ) == sorted(str(item) for item in everything[key])
+            assert [
+                link_id for page in pages for link_id in page["deleted"]["links"]
+            ] == everything["deleted"]["links"]
+
+            r = await client.get("/changes", params={"cursor": "nonsense"})
+            assert r.status_code == 400
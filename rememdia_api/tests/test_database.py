@@ -0,0 +1,32 @@
+import pytest
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from database import create_sqlite_engines
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_sqlite_engines(tmp_path) -> None:
+    writer, reader = create_sqlite_engines(str(tmp_path / "rememdia.db"))
+    try:
+        async with writer.begin() as conn:
+            mode = await conn.scalar(text("PRAGMA journal_mode"))
+            assert mode == "wal"
+            await conn.execute(text("CREATE TABLE things (name TEXT)"))
+
+        # the reader connections are query_only
+        async with reader.connect() as conn:
+            with pytest.raises(OperationalError, match="readonly"):
+                await conn.execute(text("INSERT INTO things VALUES ('nope')"))
+
+        async with writer.begin() as conn:
+            await conn.execute(text("INSERT INTO things VALUES ('saved')"))
+
+        # a committed write shows up on the reader
+        async with reader.connect() as conn:
+            names = (await conn.scalars(text("SELECT name FROM things"))).all()
+            assert names == ["saved"]
+    finally:
+        await writer.dispose()
+        await reader.dispose()
@@ -0,0 +1,83 @@
+import pytest
+
+from sqlalchemy import Select
+from sqlalchemy.future import select
+
+from database import SessionLocal, engine
+from models import LinkOrm, LinkTagOrm, NoteOrm, NoteTagOrm, utc_now
+from services.items import LINK, NOTE, build_rows_query
+from services.notifications import build_due_query
+from services.pagination import apply_keyset
+from services.tags import tagged_ids
+
+pytestmark = pytest.mark.skipif(
+    engine.dialect.name != "sqlite", reason="EXPLAIN QUERY PLAN is sqlite only"
+)
+
+
+async def query_plan(query: Select) -> str:
+    compiled = query.compile(
+        dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+    )
+    async with engine.connect() as conn:
+        result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")
+        return " | ".join(row[-1] for row in result.all())
+
+
+@pytest.mark.asyncio(loop_scope="function")
+@pytest.mark.parametrize(
+    "query, index",
+    [
+        (apply_keyset(build_rows_query(LINK), LinkOrm, None, 50), "ix_links_created_at"),
+        (
+            apply_keyset(build_rows_query(LINK, reminder=True), LinkOrm, None, 50),
+            "ix_links_reminder",
+        ),
+        (
+            apply_keyset(build_rows_query(LINK, reading=True), LinkOrm, None, 50),
+            "ix_links_reading",
+        ),
+        (
+            apply_keyset(build_rows_query(NOTE, reminder=True), NoteOrm, None, 50),
+            "ix_notes_reminder",
+        ),
+        (
+            apply_keyset(build_rows_query(NOTE, reading=True), NoteOrm, None, 50),
+            "ix_notes_reading",
+        ),
+        (
+            build_due_query(LinkOrm, utc_now(), 100),
+            "ix_links_next_due_at",
+        ),
+        (
+            build_due_query(NoteOrm, utc_now(), 100),
+            "ix_notes_next_due_at",
+        ),
+        (
+            tagged_ids(LinkTagOrm, "link_id", ["a", "b"], "any"),
+            "COVERING INDEX ix_link_tags_tag_id",
+        ),
+        (
+            tagged_ids(NoteTagOrm, "note_id", ["a", "b"], "any"),
+            "COVERING INDEX ix_note_tags_tag_id",
+        ),
+    ],
+)
+async def test_query_uses_index(query: Select, index: str) -> None:
+    plan = await query_plan(query)
+    assert index in plan
+    assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_created_at_default_per_row() -> None:
+    async with SessionLocal() as db:
+        for i in range(2):
+            db.add(
+                NoteOrm(note=f"note {i}", reminder=False, reading=False, tags=[])
+            )
+            await db.commit()
+
+        result = await db.execute(select(NoteOrm.created_at).order_by(NoteOrm.id))
+        first, second = result.scalars().all()
+        assert first < second
@@ -0,0 +1,135 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from asgi_lifespan import LifespanManager
+from httpx import AsyncClient, ASGITransport
+
+from api import app
+from database import SessionLocal
+from models import LinkOrm, NoteOrm
+from services.items import get_items_page
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_items_timeline(mock_fetch_page_metadata) -> None:
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            # links and notes saved in turn, every other one tagged python
+            for i in range(6):
+                tags = ["python"] if i % 2 == 0 else []
+                if i % 3 == 0:
+                    r = await client.post(
+                        "/note",
+                        json={
+                            "note": f"note {i}",
+                            "reminder": False,
+                            "reading": False,
+                            "tags": tags,
+                        },
+                    )
+                else:
+                    r = await client.post(
+                        "/link",
+                        json={
+                            "url": f"https://example.com/{i}",
+                            "summary": f"link {i}",
+                            "reminder": False,
+                            "reading": i == 4,
+                            "tags": tags,
+                        },
+                    )
+                assert r.status_code == 200
+
+            def label(item: dict) -> str:
+                if item["item_type"] == "link":
+                    return item["link"]["summary"]
+                return item["note"]["note"]
+
+            r = await client.get("/items")
+            assert r.status_code == 200
+            items = r.json()
+            assert [label(item) for item in items] == [
+                "link 5", "link 4", "note 3", "link 2", "link 1", "note 0"
+            ]
+            assert items[2]["link"] is None
+            assert items[2]["note"]["tags"] == []
+            assert items[1]["link"]["tags"] == ["python"]
+
+            # walk the pages with the cursor until there is no next page
+            labels = []
+            cursor = None
+            while True:
+                params = {"limit": 4}
+                if cursor:
+                    params["cursor"] = cursor
+                r = await client.get("/items", params=params)
+                assert r.status_code == 200
+                assert len(r.json()) <= 4
+                labels.extend(label(item) for item in r.json())
+                cursor = r.headers.get("X-Next-Cursor")
+                if not cursor:
+                    break
+            assert labels == [label(item) for item in items]
+
+            r = await client.get("/items", params={"type": "note"})
+            assert [label(item) for item in r.json()] == ["note 3", "note 0"]
+
+            r = await client.get("/items", params={"tags": "python"})
+            assert [label(item) for item in r.json()] == ["link 4", "link 2", "note 0"]
+
+            r = await client.get("/items", params={"reading": True})
+            assert [label(item) for item in r.json()] == ["link 4"]
+
+            # a link cursor isn't an items cursor
+            r = await client.get("/link", params={"limit": 1})
+            r = await client.get("/items", params={"cursor": r.headers["X-Next-Cursor"]})
+            assert r.status_code == 400
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_items_same_instant() -> None:
+    # a link and a note share ids and created_at, the keyset still splits them
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    async with SessionLocal() as db:
+        for i in range(1, 4):
+            db.add(
+                LinkOrm(
+                    id=i,
+                    url=f"https://example.com/{i}",
+                    summary=f"link {i}",
+                    meta_title="",
+                    meta_description="",
+                    reminder=False,
+                    reading=False,
+                    created_at=created_at,
+                )
+            )
+            db.add(
+                NoteOrm(
+                    id=i,
+                    note=f"note {i}",
+                    reminder=False,
+                    reading=False,
+                    created_at=created_at,
+                )
+            )
+        await db.commit()
+
+    async with SessionLocal() as db:
+        seen = []
+        cursor = None
+        while True:
+            items, cursor = await get_items_page(db, limit=2, cursor=cursor)
+            seen.extend(
+                (item["item_type"], item[item["item_type"]][f"{item['item_type']}_id"])
+                for item in items
+            )
+            if not cursor:
+                break
+
+    assert seen == [
+        ("note", 3), ("note", 2), ("note", 1), ("link", 3), ("link", 2), ("link", 1)
+    ]
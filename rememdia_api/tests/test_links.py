@@ -1,33 +1,26 @@
+import asyncio
+import json
 import pytest
-import pytest_asyncio
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 from asgi_lifespan import LifespanManager
 from fastapi.testclient import TestClient
 from httpx import AsyncClient, ASGITransport
+from sqlalchemy import event, update
 from unittest.mock import AsyncMock, patch
 
-from api import app
-from database import reset_database
+from api import app, poll_change_version
+from database import SessionLocal, engine
+from models import ChangeVersionOrm, LinkOrm
+from services.enrichment import EnrichmentQueue, enrichment_queue
+from services.idempotency import prune_idempotency_keys
+from services.response_cache import response_cache
 
 client = TestClient(app)
 
 
-@pytest_asyncio.fixture(autouse=True, loop_scope="module")
-async def reset_db():
-    await reset_database()
-    yield
-
-
-@pytest_asyncio.fixture(loop_scope="module", scope="module")
-async def mock_get_link_metadata():
-    with patch("routers.links.get_link_metadata", new_callable=AsyncMock) as mock:
-        mock.return_value = ("Mocked Title", "Mocked Description")
-        yield mock
-
-
 @pytest.mark.asyncio(loop_scope="function")
-async def test_save_link(mock_get_link_metadata) -> None:
+async def test_save_link(mock_fetch_page_metadata) -> None:
     async with LifespanManager(app):
         async with AsyncClient(
             transport=ASGITransport(app=app), base_url="http://localhost"
@@ -46,12 +39,106 @@ async def test_save_link(mock_get_link_metadata) -> None:
             )
             assert r.status_code == 200
 
-            # validate the link was created
+            # validate the link was created before the metadata was fetched
             r = await client.get("/link")
             assert r.status_code == 200
             assert r.json()[0]["url"] == "https://www.google.com"
+
+            # validate the metadata was filled in by the enrichment queue
+            await enrichment_queue.join()
+            r = await client.get("/link")
             assert r.json()[0]["meta_title"] == "Mocked Title"
-            mock_get_link_metadata.assert_called_once_with("https://www.google.com")
+            assert r.json()[0]["enrichment_status"] == "done"
+            mock_fetch_page_metadata.assert_called_once_with(
+                "https://www.google.com", etag=None, last_modified=None
+            )
+
+            r = await client.get("/link/enrichment")
+            assert r.status_code == 200
+            assert r.json()["queue_depth"] == 0
+            assert r.json()["links"] == {"done": 1}
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_enrichment_failure() -> None:
+    with patch(
+        "services.metadata_cache.fetch_page_metadata", new_callable=AsyncMock
+    ) as mock_fetch, patch.object(enrichment_queue, "backoff", 0), patch.object(
+        enrichment_queue, "host_interval", 0
+    ):
+        mock_fetch.side_effect = TimeoutError()
+        async with LifespanManager(app):
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://localhost"
+            ) as client:
+                r = await client.post(
+                    "/link",
+                    json={
+                        "url": "https://unreachable.invalid",
+                        "summary": "Down",
+                        "reminder": False,
+                        "reading": False,
+                        "tags": [],
+                    },
+                )
+                assert r.status_code == 200
+
+                # the save doesn't wait for the failing fetch
+                await enrichment_queue.join()
+                assert mock_fetch.call_count == enrichment_queue.retries + 1
+
+                r = await client.get("/link")
+                assert r.json()[0]["enrichment_status"] == "failed"
+                assert r.json()[0]["meta_title"] == ""
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_enrichment_forgets_idle_hosts() -> None:
+    queue = EnrichmentQueue(host_interval=0.05)
+    await asyncio.gather(*(queue.wait_for_host(f"host{i}.com") for i in range(50)))
+    await asyncio.gather(queue.wait_for_host("a.com"), queue.wait_for_host("a.com"))
+    assert queue.host_locks == {}
+    assert queue.host_waiting == {}
+
+    # spacings run out and go with the next host let go of
+    await asyncio.sleep(0.1)
+    await queue.wait_for_host("b.com")
+    assert list(queue.host_next_request) == ["b.com"]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_idempotent_save_link(mock_fetch_page_metadata) -> None:
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            link = {
+                "url": "https://www.google.com",
+                "summary": "Google",
+                "reminder": False,
+                "reading": False,
+                "tags": ["test1"],
+            }
+            headers = {"Idempotency-Key": "3f0c9a4e-retry"}
+            first = await client.post("/link", json=link, headers=headers)
+            assert first.status_code == 200
+
+            # a replay after a lost response gets the same answer and no new link
+            retry = await client.post("/link", json=link, headers=headers)
+            assert retry.json() == first.json()
+
+            r = await client.post(
+                "/link", json=link, headers={"Idempotency-Key": "other"}
+            )
+            assert r.json()["link_id"] != first.json()["link_id"]
+
+            r = await client.get("/link")
+            assert len(r.json()) == 2
+
+            # expired keys are forgotten
+            async with SessionLocal() as db:
+                later = datetime.now(timezone.utc) + timedelta(days=30)
+                assert await prune_idempotency_keys(db, now=later) == 2
 
 
 @pytest.mark.asyncio(loop_scope="function")
@@ -127,3 +214,225 @@ async def test_update_link() -> None:
             assert r.json()[0]["reminder"]
             assert r.json()[0]["reading"]
             assert r.json()[0]["tags"] == ["test1", "test3", "test4"]
+
+            # a missing link is a 404, not a 500
+            r = await client.patch("/link/999", json={"reminder": False})
+            assert r.status_code == 404
+            assert r.json()["detail"] == "Link not found"
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_paginate_links(mock_fetch_page_metadata) -> None:
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            for i in range(5):
+                r = await client.post(
+                    "/link",
+                    json={
+                        "url": f"https://example.com/{i}",
+                        "summary": f"Example {i}",
+                        "reminder": False,
+                        "reading": False,
+                        "tags": ["test1"],
+                    },
+                )
+                assert r.status_code == 200
+
+            # walk the pages with the cursor until there is no next page
+            urls = []
+            cursor = None
+            while True:
+                params = {"limit": 2}
+                if cursor:
+                    params["cursor"] = cursor
+                r = await client.get("/link", params=params)
+                assert r.status_code == 200
+                assert len(r.json()) <= 2
+                urls.extend(link["url"] for link in r.json())
+                cursor = r.headers.get("X-Next-Cursor")
+                if not cursor:
+                    break
+
+            assert urls == [f"https://example.com/{i}" for i in range(5)]
+
+            # a garbage cursor is rejected
+            r = await client.get("/link", params={"limit": 2, "cursor": "garbage"})
+            assert r.status_code == 400
+
+            # the streaming mode returns every link as NDJSON
+            r = await client.get("/link", params={"stream": True})
+            assert r.status_code == 200
+            assert r.headers["content-type"].startswith("application/x-ndjson")
+            lines = [json.loads(line) for line in r.text.splitlines()]
+            assert [link["url"] for link in lines] == urls
+            assert lines[0]["tags"] == ["test1"]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_cached_link_pages(mock_fetch_page_metadata) -> None:
+    def link(i: int) -> dict:
+        return {
+            "url": f"https://example.com/{i}",
+            "summary": f"Example {i}",
+            "reminder": False,
+            "reading": False,
+            "tags": ["test1"],
+        }
+
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            for i in range(3):
+                await client.post("/link", json=link(i))
+            await enrichment_queue.join()
+
+            r = await client.get("/link", params={"limit": 2})
+            assert r.status_code == 200
+            etag = r.headers["ETag"]
+            cursor = r.headers["X-Next-Cursor"]
+
+            # the same page again comes from the cache, headers and all, without
+            # touching the db
+            statements = []
+
+            def count_statement(conn, cursor, statement, *args) -> None:
+                statements.append(statement)
+
+            hits = response_cache.hits
+            event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+            try:
+                r = await client.get("/link", params={"limit": 2})
+            finally:
+                event.remove(
+                    engine.sync_engine, "before_cursor_execute", count_statement
+                )
+            assert response_cache.hits == hits + 1
+            assert statements == []
+            assert r.headers["ETag"] == etag
+            assert r.headers["X-Next-Cursor"] == cursor
+            assert [item["url"] for item in r.json()] == [
+                "https://example.com/0",
+                "https://example.com/1",
+            ]
+
+            # a client holding the current ETag is told nothing changed
+            r = await client.get(
+                "/link", params={"limit": 2}, headers={"If-None-Match": etag}
+            )
+            assert r.status_code == 304
+
+            # the ETag belongs to the page, the next page is still read
+            r = await client.get(
+                "/link",
+                params={"limit": 2, "cursor": cursor},
+                headers={"If-None-Match": etag},
+            )
+            assert r.status_code == 200
+            assert r.headers["ETag"] != etag
+            assert [item["url"] for item in r.json()] == ["https://example.com/2"]
+
+            # any write moves the ETag on and the page is read again
+            r = await client.patch("/link/1", json={"summary": "Changed"})
+            assert r.status_code == 200
+            r = await client.get(
+                "/link", params={"limit": 2}, headers={"If-None-Match": etag}
+            )
+            assert r.status_code == 200
+            assert r.headers["ETag"] != etag
+            assert r.json()[0]["summary"] == "Changed"
+
+            # bulk imports skip the unit of work and invalidate all the same
+            r = await client.get("/link")
+            assert len(r.json()) == 3
+            r = await client.post("/link/bulk", json=[link(3)])
+            assert r.json()["created"] == 1
+            r = await client.get("/link")
+            assert len(r.json()) == 4
+
+            # a write from another process, a backfill run from the command line,
+            # is seen through the change version on the next poll
+            etag = r.headers["ETag"]
+            links, versions = LinkOrm.__table__, ChangeVersionOrm.__table__
+            async with engine.begin() as conn:
+                await conn.execute(
+                    update(links).where(links.c.id == 1).values(meta_title="Backfilled")
+                )
+                await conn.execute(update(versions).values(version=versions.c.version + 1))
+            await poll_change_version()
+            r = await client.get("/link", headers={"If-None-Match": etag})
+            assert r.status_code == 200
+            assert r.json()[0]["meta_title"] == "Backfilled"
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_bulk_import_links(mock_fetch_page_metadata) -> None:
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            # JSON array, the second item is missing its summary
+            r = await client.post(
+                "/link/bulk",
+                json=[
+                    {
+                        "url": "https://example.com/a",
+                        "summary": "A",
+                        "reminder": False,
+                        "reading": True,
+                        "tags": ["bulk", "a", "bulk"],
+                    },
+                    {"url": "https://example.com/b", "reminder": False},
+                ],
+            )
+            assert r.status_code == 200
+            assert r.json()["created"] == 1
+            assert r.json()["failed"] == 1
+            assert r.json()["items"][0] == {
+                "index": 0,
+                "status": "created",
+                "link_id": 1,
+            }
+            assert r.json()["items"][1]["status"] == "error"
+
+            # NDJSON stream with a broken line in the middle
+            lines = [
+                json.dumps(
+                    {
+                        "url": f"https://example.com/{i}",
+                        "summary": str(i),
+                        "reminder": False,
+                        "reading": False,
+                        "tags": ["bulk", f"tag{i}"],
+                    }
+                )
+                for i in range(3)
+            ]
+            lines.insert(1, "{not json")
+            r = await client.post(
+                "/link/bulk",
+                content="\n".join(lines) + "\n",
+                headers={"Content-Type": "application/x-ndjson"},
+            )
+            assert r.status_code == 200
+            assert r.json()["created"] == 3
+            assert [item["status"] for item in r.json()["items"]] == [
+                "created",
+                "error",
+                "created",
+                "created",
+            ]
+
+            r = await client.get("/link")
+            assert len(r.json()) == 4
+            assert r.json()[0]["tags"] == ["bulk", "a"]
+            assert r.json()[3]["tags"] == ["bulk", "tag2"]
+
+            r = await client.get("/tags")
+            assert sorted(r.json()) == ["a", "bulk", "tag0", "tag1", "tag2"]
+
+            # anything other than an array is rejected as a whole
+            r = await client.post("/link/bulk", json={"url": "https://example.com"})
+            assert r.status_code == 400
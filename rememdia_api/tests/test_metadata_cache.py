@@ -0,0 +1,117 @@
+import httpx
+import pytest
+
+from asgi_lifespan import LifespanManager
+from httpx import AsyncClient, ASGITransport
+from unittest.mock import patch
+
+from api import app
+from services.enrichment import enrichment_queue
+from services.metadata_cache import metadata_cache, normalize_url
+
+PAGE = """
+<html><head>
+<meta property="og:title" content="{title}">
+<meta property="og:description" content="A page">
+<link rel="canonical" href="/article">
+</head></html>
+"""
+
+
+@pytest.fixture
+def mock_site():
+    """
+    A page that answers conditional requests with 304 until its title changes
+    """
+    site = {"title": "First", "etag": '"v1"', "requests": []}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        site["requests"].append(request)
+        if request.headers.get("If-None-Match") == site["etag"]:
+            return httpx.Response(304)
+        return httpx.Response(
+            200,
+            headers={"ETag": site["etag"], "Content-Type": "text/html"},
+            text=PAGE.format(title=site["title"]),
+        )
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    with patch("helpers.client", client):
+        yield site
+
+
+@pytest.mark.parametrize(
+    "url, normalized",
+    [
+        ("example.com", "https://example.com/"),
+        ("http://WWW.Example.com:80/a/", "https://example.com/a"),
+        ("https://example.com/a?b=2&a=1#top", "https://example.com/a?a=1&b=2"),
+        ("https://example.com/a?utm_source=x&fbclid=y&id=3", "https://example.com/a?id=3"),
+        ("https://example.com:8443/a", "https://example.com:8443/a"),
+    ],
+)
+def test_normalize_url(url: str, normalized: str) -> None:
+    assert normalize_url(url) == normalized
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_revalidation(mock_site) -> None:
+    entry = await metadata_cache.get("https://example.com/post?utm_source=feed")
+    assert entry.title == "First"
+    assert entry.etag == '"v1"'
+    assert len(mock_site["requests"]) == 1
+
+    # variants of the url and the canonical page are answered from the cache
+    assert (await metadata_cache.get("http://www.example.com/post/")).title == "First"
+    assert (await metadata_cache.get("https://example.com/article")).title == "First"
+    assert len(mock_site["requests"]) == 1
+
+    # the cache table outlives the in-memory entries
+    metadata_cache.clear()
+    assert (await metadata_cache.get("https://example.com/post")).title == "First"
+    assert len(mock_site["requests"]) == 1
+
+    # a stale entry is revalidated with the etag, an unchanged page is a 304
+    with patch.object(metadata_cache, "ttl", 0):
+        assert (await metadata_cache.get("https://example.com/post")).title == "First"
+        assert mock_site["requests"][-1].headers["If-None-Match"] == '"v1"'
+        assert metadata_cache.revalidated == 1
+
+        mock_site.update(title="Second", etag='"v2"')
+        assert (await metadata_cache.get("https://example.com/post")).title == "Second"
+    assert len(mock_site["requests"]) == 3
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_refresh_endpoint(mock_site) -> None:
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            r = await client.post(
+                "/link",
+                json={
+                    "url": "https://example.com/post",
+                    "summary": "Example",
+                    "reminder": False,
+                    "reading": False,
+                    "tags": [],
+                },
+            )
+            assert r.status_code == 200
+            await enrichment_queue.join()
+
+            r = await client.get("/link")
+            assert r.json()[0]["meta_title"] == "First"
+
+            # a refresh goes to the site even though the entry is fresh
+            mock_site.update(title="Second", etag='"v2"')
+            r = await client.post("/link/1/metadata/refresh")
+            assert r.status_code == 200
+            assert r.json()["meta_title"] == "Second"
+
+            r = await client.get("/link")
+            assert r.json()[0]["meta_title"] == "Second"
+
+            r = await client.post("/link/2/metadata/refresh")
+            assert r.status_code == 404
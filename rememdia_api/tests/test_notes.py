@@ -74,3 +74,35 @@ async def test_update_note() -> None:
             assert r.json()[0]["reminder"]
             assert r.json()[0]["reading"]
             assert r.json()[0]["tags"] == ["test1", "test3", "test4"]
+
+            # a missing note is a 404, not a 500
+            r = await client.patch("/note/999", json={"reminder": False})
+            assert r.status_code == 404
+            assert r.json()["detail"] == "Note not found"
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_bulk_import_notes() -> None:
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            r = await client.post(
+                "/note/bulk",
+                json=[
+                    {
+                        "note": f"note {i}",
+                        "reminder": False,
+                        "reading": False,
+                        "tags": ["bulk"],
+                    }
+                    for i in range(3)
+                ],
+            )
+            assert r.status_code == 200
+            assert r.json()["created"] == 3
+            assert [item["note_id"] for item in r.json()["items"]] == [1, 2, 3]
+
+            r = await client.get("/note")
+            assert [note["note"] for note in r.json()] == ["note 0", "note 1", "note 2"]
+            assert r.json()[2]["tags"] == ["bulk"]
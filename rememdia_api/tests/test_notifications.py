@@ -0,0 +1,213 @@
+import pytest
+
+from asgi_lifespan import LifespanManager
+from datetime import datetime, timedelta, timezone
+from httpx import AsyncClient, ASGITransport
+from unittest.mock import Mock, patch
+
+from api import app
+from database import SessionLocal
+from models import LinkOrm, NoteOrm
+from services.notifications import item_embed, notify_due_items, sending
+from services.webhooks import webhook_dispatcher
+from settings import REMINDER_INTERVAL
+
+
+@pytest.fixture
+def mock_submit():
+    with (
+        patch.object(webhook_dispatcher, "url", "https://discord.test/webhook"),
+        patch.object(webhook_dispatcher, "submit") as mock,
+    ):
+        mock.return_value = True
+        yield mock
+    for item_ids in sending.values():
+        item_ids.clear()
+
+
+async def deliver(mock: Mock) -> None:
+    # what the dispatcher does once Discord has taken each message
+    for call in mock.call_args_list:
+        await call.kwargs["on_delivered"]()
+
+
+def sent_items(mock: Mock) -> list[list[str]]:
+    """
+    The link url or note text of every embed, per webhook message
+    """
+    return [
+        [embed.get("url", embed["description"]) for embed in call.args[0]["embeds"]]
+        for call in mock.call_args_list
+    ]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_notify_due_items(mock_fetch_page_metadata, mock_submit) -> None:
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            for url, reminder in [("https://a.example", True), ("https://b.example", False)]:
+                r = await client.post(
+                    "/link",
+                    json={
+                        "url": url,
+                        "summary": "Example",
+                        "reminder": reminder,
+                        "reading": False,
+                        "tags": [],
+                    },
+                )
+                assert r.status_code == 200
+            r = await client.post(
+                "/note",
+                json={
+                    "note": "Example note",
+                    "reminder": False,
+                    "reading": True,
+                    "tags": [],
+                },
+            )
+            assert r.status_code == 200
+
+            # the reminder link and the reading note go out together in one message
+            async with SessionLocal() as db:
+                assert await notify_due_items(db) == 2
+            assert len(sent_items(mock_submit)) == 1
+            assert sorted(sent_items(mock_submit)[0]) == [
+                "Example note",
+                "https://a.example",
+            ]
+
+            # not sent again while the message is on its way, nor rescheduled
+            async with SessionLocal() as db:
+                assert await notify_due_items(db) == 0
+                link = await db.get(LinkOrm, 1)
+                assert link.last_notified_at is None
+
+            # nothing is due again until the interval has passed
+            await deliver(mock_submit)
+            mock_submit.reset_mock()
+            async with SessionLocal() as db:
+                assert await notify_due_items(db) == 0
+                later = datetime.now(timezone.utc) + timedelta(seconds=REMINDER_INTERVAL + 1)
+                assert await notify_due_items(db, now=later) == 2
+            await deliver(mock_submit)
+
+            # a message the dispatcher gives up on leaves its items due
+            mock_submit.reset_mock()
+            async with SessionLocal() as db:
+                later = datetime.now(timezone.utc) + timedelta(days=3)
+                assert await notify_due_items(db, now=later) == 2
+                await mock_submit.call_args.kwargs["on_dropped"]()
+                assert await notify_due_items(db, now=later) == 2
+            await deliver(mock_submit)
+
+            # clearing the flags takes an item off the schedule
+            r = await client.patch("/link/1", json={"reminder": False})
+            assert r.status_code == 200
+            mock_submit.reset_mock()
+            async with SessionLocal() as db:
+                later = datetime.now(timezone.utc) + timedelta(days=365)
+                assert await notify_due_items(db, now=later) == 1
+            assert sent_items(mock_submit) == [["Example note"]]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_notify_due_items_batches(
+    mock_fetch_page_metadata, mock_submit
+) -> None:
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            r = await client.post(
+                "/note/bulk",
+                json=[
+                    {"note": f"note {i}", "reminder": True, "reading": False, "tags": []}
+                    for i in range(12)
+                ],
+            )
+            assert r.json()["created"] == 12
+
+            # items that don't fit in the webhook queue stay due for the next tick
+            mock_submit.return_value = False
+            async with SessionLocal() as db:
+                assert await notify_due_items(db) == 0
+
+            # at most 10 embeds per webhook message
+            mock_submit.reset_mock()
+            mock_submit.return_value = True
+            async with SessionLocal() as db:
+                assert await notify_due_items(db) == 12
+            assert [len(items) for items in sent_items(mock_submit)] == [
+                10,
+                2,
+            ]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_items_changed_while_sending(
+    mock_fetch_page_metadata, mock_submit
+) -> None:
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            for url in ["https://a.example", "https://b.example"]:
+                r = await client.post(
+                    "/link",
+                    json={
+                        "url": url,
+                        "summary": "Example",
+                        "reminder": True,
+                        "reading": False,
+                        "tags": [],
+                    },
+                )
+                assert r.status_code == 200
+            r = await client.post(
+                "/note",
+                json={"note": "Example", "reminder": True, "reading": False, "tags": []},
+            )
+            assert r.status_code == 200
+
+            async with SessionLocal() as db:
+                assert await notify_due_items(db) == 3
+
+            # unflagged and deleted while the message waits to be delivered
+            r = await client.patch("/link/1", json={"reminder": False})
+            assert r.status_code == 200
+            r = await client.delete("/link/2")
+            assert r.status_code == 200
+            await deliver(mock_submit)
+
+            async with SessionLocal() as db:
+                link = await db.get(LinkOrm, 1)
+                assert link.next_due_at is None
+                assert link.last_notified_at is not None
+                # the rest of the message is still rescheduled
+                note = await db.get(NoteOrm, 1)
+                assert note.next_due_at is not None
+
+                # a schedule left on an unflagged item isn't due
+                link.next_due_at = datetime.now(timezone.utc)
+                await db.commit()
+                later = datetime.now(timezone.utc) + timedelta(days=365)
+                mock_submit.reset_mock()
+                assert await notify_due_items(db, now=later) == 1
+            assert sent_items(mock_submit) == [["Example"]]
+
+
+def test_item_embed_url() -> None:
+    def link(url: str) -> LinkOrm:
+        return LinkOrm(
+            url=url, summary="Example", meta_title="", reminder=True, reading=False
+        )
+
+    assert item_embed(link("https://a.example/page"))["url"] == "https://a.example/page"
+    # saved without a scheme, like the rest of the app treats it
+    assert item_embed(link("a.example/page"))["url"] == "https://a.example/page"
+    # not something discord takes as an embed url, left out rather than failing the message
+    assert "url" not in item_embed(link("http://"))
+    assert "url" not in item_embed(link("httpx:nothing"))
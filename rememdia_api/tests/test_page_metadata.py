@@ -0,0 +1,111 @@
+import httpx
+import pytest
+
+from unittest.mock import patch
+
+from helpers import HeadParser, SharedClient, fetch_page_metadata
+
+HEAD = """<!doctype html>
+<html><head>
+<meta charset="utf-8">
+<title>
+  Page &amp; Title
+</title>
+<meta name="description" content="Plain description">
+<meta name="twitter:title" content="Twitter Title">
+<meta name="twitter:description" content="Twitter description">
+<link rel="canonical" href="/articles/1">
+<link rel="shortcut icon" href="/favicon.ico">
+</head>
+"""
+
+
+def mock_page(chunks: list[bytes], content_type: str = "text/html; charset=utf-8"):
+    """
+    Serve the chunks as a streamed body, returns the list of chunks read so far
+    """
+    served = []
+
+    async def body():
+        for chunk in chunks:
+            served.append(chunk)
+            yield chunk
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200, headers={"Content-Type": content_type}, content=body()
+        )
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return served, patch("helpers.client", client)
+
+
+def test_head_parser_fallbacks() -> None:
+    parser = HeadParser()
+    # fed in pieces that split tags, the way chunks arrive off the network
+    for i in range(0, len(HEAD), 7):
+        parser.feed(HEAD[i : i + 7])
+
+    assert parser.done
+    assert " ".join(parser.title.split()) == "Page & Title"
+    assert parser.first_meta("og:title", "twitter:title") == "Twitter Title"
+    assert parser.first_meta("og:description", "description") == "Plain description"
+    assert parser.canonical == "/articles/1"
+    assert parser.favicon == "/favicon.ico"
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_stops_at_end_of_head() -> None:
+    body = [b"<body>" + b"x" * 65536 for _ in range(50)]
+    served, client = mock_page([HEAD.encode()] + body)
+    with client:
+        metadata = await fetch_page_metadata("https://example.com/articles/1?page=2")
+
+    assert metadata.title == "Twitter Title"
+    assert metadata.description == "Twitter description"
+    assert metadata.canonical_url == "https://example.com/articles/1"
+    assert metadata.favicon_url == "https://example.com/favicon.ico"
+    assert len(served) < len(body)
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_byte_cap() -> None:
+    # a head that never closes is cut off at METADATA_MAX_BYTES
+    chunks = [b"<html><head><title>Endless</title>"] + [b"<meta>" * 10000] * 100
+    served, client = mock_page(chunks)
+    with client, patch("helpers.METADATA_MAX_BYTES", 200_000):
+        metadata = await fetch_page_metadata("https://example.com")
+
+    assert metadata.title == "Endless"
+    assert sum(len(chunk) for chunk in served) < 300_000
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_skips_non_html() -> None:
+    served, client = mock_page([b"%PDF-1.7"] * 10, content_type="application/pdf")
+    with client:
+        metadata = await fetch_page_metadata("https://example.com/paper.pdf")
+
+    assert (metadata.title, metadata.description) == ("", "")
+    assert len(served) <= 1
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_shared_client_lifecycle() -> None:
+    shared = SharedClient()
+    await shared.start()
+    pooled = shared.client
+    assert pooled is not None and not pooled.is_closed
+    assert pooled.follow_redirects
+    assert pooled.timeout.connect is not None
+
+    # started again while open, the same pool is kept
+    await shared.start()
+    assert shared.client is pooled
+
+    await shared.stop()
+    assert pooled.is_closed and shared.client is None
+
+    # used after a stop it opens a fresh client rather than a closed one
+    assert not shared.current.is_closed
+    await shared.stop()
@@ -0,0 +1,71 @@
+import pytest
+
+from asgi_lifespan import LifespanManager
+from httpx import AsyncClient, ASGITransport
+
+from api import app
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_search(mock_fetch_page_metadata) -> None:
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            r = await client.post(
+                "/link",
+                json={
+                    "url": "https://docs.python.org/3/library/asyncio.html",
+                    "summary": "asyncio reference",
+                    "reminder": False,
+                    "reading": False,
+                    "tags": ["python"],
+                },
+            )
+            assert r.status_code == 200
+            r = await client.post(
+                "/note",
+                json={
+                    "note": "remember to read up on asyncio task groups",
+                    "reminder": False,
+                    "reading": False,
+                    "tags": ["python"],
+                },
+            )
+            assert r.status_code == 200
+
+            # both the link and the note match
+            r = await client.get("/search", params={"q": "asyncio"})
+            assert r.status_code == 200
+            assert {result["item_type"] for result in r.json()} == {"link", "note"}
+
+            # filter by type and prefix match the last word
+            r = await client.get("/search", params={"q": "task gro", "type": "note"})
+            assert r.status_code == 200
+            assert len(r.json()) == 1
+            assert r.json()[0]["note"]["tags"] == ["python"]
+
+            # tags are searched too, and follow retagging
+            r = await client.get("/search", params={"q": "pyth"})
+            assert {result["item_type"] for result in r.json()} == {"link", "note"}
+            r = await client.patch("/note/1", json={"tags": ["concurrency"]})
+            assert r.status_code == 200
+            r = await client.get("/search", params={"q": "concurrency"})
+            assert [result["item_type"] for result in r.json()] == ["note"]
+            r = await client.get("/search", params={"q": "python", "type": "note"})
+            assert r.json() == []
+
+            # the index follows updates and deletes
+            r = await client.patch("/link/1", json={"summary": "event loop docs"})
+            assert r.status_code == 200
+            r = await client.get("/search", params={"q": "event loop"})
+            assert r.json()[0]["link"]["link_id"] == 1
+
+            r = await client.delete("/link/1")
+            assert r.status_code == 200
+            r = await client.get("/search", params={"q": "asyncio", "type": "link"})
+            assert r.json() == []
+
+            # query syntax characters are not passed through to FTS5
+            r = await client.get("/search", params={"q": '"unbalanced AND ('})
+            assert r.status_code == 200
@@ -0,0 +1,198 @@
+import pytest
+
+from asgi_lifespan import LifespanManager
+from httpx import AsyncClient, ASGITransport
+
+from sqlalchemy import event, insert
+from sqlalchemy.future import select
+
+from api import app
+from database import SessionLocal, engine
+from models import ChangeVersionOrm, TagOrm
+from services.tags import resolve_tags
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_tag_autocomplete(mock_fetch_page_metadata) -> None:
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            for tags in [["python", "pytest"], ["python"], ["rust", "pydantic"]]:
+                r = await client.post(
+                    "/link",
+                    json={
+                        "url": "https://example.com",
+                        "summary": "Example",
+                        "reminder": False,
+                        "reading": False,
+                        "tags": tags,
+                    },
+                )
+                assert r.status_code == 200
+
+            # most used tags come first, then alphabetical
+            r = await client.get("/tags", params={"prefix": "py"})
+            assert r.status_code == 200
+            assert r.json() == ["python", "pydantic", "pytest"]
+
+            r = await client.get("/tags", params={"prefix": "py", "limit": 2})
+            assert r.json() == ["python", "pydantic"]
+
+            r = await client.get("/tags")
+            assert sorted(r.json()) == ["pydantic", "pytest", "python", "rust"]
+
+            # the ETag holds until the tag set or usage changes
+            etag = r.headers["ETag"]
+            r = await client.get("/tags", headers={"If-None-Match": etag})
+            assert r.status_code == 304
+
+            r = await client.patch("/link/3", json={"tags": ["pytest", "rust"]})
+            assert r.status_code == 200
+            r = await client.get("/tags", headers={"If-None-Match": etag})
+            assert r.status_code == 200
+            assert r.headers["ETag"] != etag
+
+            r = await client.get("/tags", params={"prefix": "py"})
+            assert r.json() == ["pytest", "python", "pydantic"]
+
+            r = await client.delete("/link/2")
+            r = await client.get("/tags", params={"prefix": "py"})
+            assert r.json() == ["pytest", "python", "pydantic"]
+            r = await client.delete("/link/1")
+            r = await client.get("/tags", params={"prefix": "py"})
+            assert r.json() == ["pytest", "pydantic", "python"]
+
+    # the index is rebuilt from the database on startup
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            r = await client.get("/tags", params={"prefix": "py"})
+            assert r.json() == ["pytest", "pydantic", "python"]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_tag_filters(mock_fetch_page_metadata) -> None:
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            for tags in [["python", "async"], ["python"], ["rust", "async"]]:
+                r = await client.post(
+                    "/link",
+                    json={
+                        "url": "https://example.com",
+                        "summary": "Example",
+                        "reminder": False,
+                        "reading": False,
+                        "tags": tags,
+                    },
+                )
+                assert r.status_code == 200
+            r = await client.post(
+                "/note",
+                json={
+                    "note": "Example",
+                    "reminder": False,
+                    "reading": False,
+                    "tags": ["python"],
+                },
+            )
+            assert r.status_code == 200
+
+            r = await client.get("/link", params={"tags": "python,async"})
+            assert [link["link_id"] for link in r.json()] == [1]
+
+            r = await client.get("/link", params={"tags": "python,async", "match": "any"})
+            assert [link["link_id"] for link in r.json()] == [1, 2, 3]
+
+            r = await client.get("/link", params={"tags": "rust", "match": "any"})
+            assert [link["link_id"] for link in r.json()] == [3]
+
+            r = await client.get("/link", params={"tags": "python", "limit": 1})
+            assert [link["link_id"] for link in r.json()] == [1]
+            r = await client.get(
+                "/link",
+                params={"tags": "python", "limit": 1, "cursor": r.headers["X-Next-Cursor"]},
+            )
+            assert [link["link_id"] for link in r.json()] == [2]
+
+            r = await client.get("/note", params={"tags": "python,async"})
+            assert r.json() == []
+
+            r = await client.get("/link", params={"match": "some"})
+            assert r.status_code == 422
+
+            r = await client.get("/tags/python/items")
+            assert r.status_code == 200
+            assert [link["link_id"] for link in r.json()["links"]] == [1, 2]
+            assert [note["note_id"] for note in r.json()["notes"]] == [1]
+            assert r.json()["next_link_cursor"] is None
+
+            # links and notes page on their own cursors
+            r = await client.get("/tags/python/items", params={"limit": 1})
+            assert [link["link_id"] for link in r.json()["links"]] == [1]
+            assert r.json()["next_note_cursor"] is None
+            r = await client.get(
+                "/tags/python/items",
+                params={"limit": 1, "link_cursor": r.json()["next_link_cursor"]},
+            )
+            assert [link["link_id"] for link in r.json()["links"]] == [2]
+            assert r.json()["next_link_cursor"] is None
+
+            r = await client.get("/tags/python/items", params={"note_cursor": "nonsense"})
+            assert r.status_code == 400
+
+            r = await client.get("/tags/missing/items")
+            assert r.status_code == 404
+
+            # a tag another worker saved isn't in this process's tag index
+            async with engine.begin() as conn:
+                await conn.execute(insert(TagOrm).values(name="elsewhere", version=0))
+            r = await client.get("/tags/elsewhere/items")
+            assert r.status_code == 200
+            assert r.json()["links"] == [] and r.json()["notes"] == []
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_resolve_tags_statements() -> None:
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args) -> None:
+        statements.append(statement)
+
+    async def current_version() -> int | None:
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(ChangeVersionOrm.version).where(ChangeVersionOrm.id == 1)
+            )
+            return result.scalar_one_or_none()
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        # new tags: the lookup, the version and the insert returning them
+        async with SessionLocal() as db:
+            tags = await resolve_tags(db, ["python", "async", "python"])
+            assert sorted(tags) == ["async", "python"]
+            assert all(tag.id for tag in tags.values())
+            assert len(statements) == 3
+            await db.commit()
+        version = await current_version()
+
+        # tags that all exist cost the lookup alone and no version
+        statements.clear()
+        async with SessionLocal() as db:
+            tags = await resolve_tags(db, ["async", "python"])
+            assert sorted(tags) == ["async", "python"]
+            assert len(statements) == 1
+            await db.commit()
+        assert await current_version() == version
+
+        statements.clear()
+        async with SessionLocal() as db:
+            tags = await resolve_tags(db, ["python", "sqlite"])
+            assert tags["sqlite"].version == version + 1
+            assert len(statements) == 3
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
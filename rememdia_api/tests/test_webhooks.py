@@ -0,0 +1,168 @@
+import httpx
+import pytest
+
+from asgi_lifespan import LifespanManager
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.future import select
+from unittest.mock import patch
+
+from api import app
+from database import SessionLocal
+from models import WebhookOutboxOrm
+from services.webhooks import WebhookDispatcher
+
+
+def mock_discord(*responses: httpx.Response) -> tuple[list[bytes], object]:
+    """
+    Patch the http client to answer with the given responses in order, returns
+    the list the posted bodies are collected in and the patcher to stop
+    """
+    posted = []
+    remaining = list(responses)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        posted.append(request.read())
+        return remaining.pop(0) if remaining else httpx.Response(204)
+
+    mock_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    patcher = patch("services.webhooks.client", mock_client)
+    patcher.start()
+    return posted, patcher
+
+
+async def outbox_rows() -> list[WebhookOutboxOrm]:
+    async with SessionLocal() as db:
+        result = await db.execute(select(WebhookOutboxOrm).order_by(WebhookOutboxOrm.id))
+        return list(result.scalars().all())
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_rate_limited_send() -> None:
+    posted, patcher = mock_discord(
+        httpx.Response(429, json={"retry_after": 0.05, "global": False}),
+        httpx.Response(
+            204, headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "0.05"}
+        ),
+    )
+    dispatcher = WebhookDispatcher(url="https://discord.test/webhook", backoff=0)
+    await dispatcher.start()
+    try:
+        assert dispatcher.submit({"content": "one"})
+        assert dispatcher.submit({"content": "two"})
+        await dispatcher.join()
+    finally:
+        await dispatcher.stop()
+        patcher.stop()
+
+    # the 429 is retried in place and both messages go out
+    assert len(posted) == 3
+    stats = dispatcher.stats()
+    assert stats["sent"] == 2
+    assert stats["retried"] == 1
+    assert stats["dropped"] == 0
+    assert stats["queue_latency_max"] >= 0.05
+    assert await outbox_rows() == []
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_failed_send_goes_to_outbox() -> None:
+    _, patcher = mock_discord(httpx.Response(502), httpx.Response(400))
+    dispatcher = WebhookDispatcher(
+        url="https://discord.test/webhook", backoff=0, retry_interval=3600
+    )
+    await dispatcher.start()
+    try:
+        dispatcher.submit({"content": "server error"})
+        dispatcher.submit({"content": "bad request"})
+        await dispatcher.join()
+
+        # the server error is retried later, the rejected message is a dead letter
+        pending, dead = await outbox_rows()
+        assert (pending.status, pending.attempts, pending.last_error) == (
+            "pending",
+            1,
+            "HTTP 502",
+        )
+        assert (dead.status, dead.payload) == ("dead", {"content": "bad request"})
+        assert dispatcher.stats()["dropped"] == 1
+
+        await dispatcher.retry_outbox()
+        await dispatcher.join()
+    finally:
+        await dispatcher.stop()
+        patcher.stop()
+
+    assert dispatcher.stats()["sent"] == 1
+    assert [row.status for row in await outbox_rows()] == ["dead"]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_delivery_callbacks() -> None:
+    _, patcher = mock_discord(httpx.Response(502), httpx.Response(400))
+    dispatcher = WebhookDispatcher(
+        url="https://discord.test/webhook", backoff=0, retry_interval=3600
+    )
+    outcomes = []
+
+    def track(name: str) -> dict:
+        async def on_delivered() -> None:
+            outcomes.append((name, "delivered"))
+
+        async def on_dropped() -> None:
+            outcomes.append((name, "dropped"))
+
+        return {"on_delivered": on_delivered, "on_dropped": on_dropped}
+
+    await dispatcher.start()
+    try:
+        dispatcher.submit({"content": "server error"}, **track("retried"))
+        dispatcher.submit({"content": "bad request"}, **track("rejected"))
+        await dispatcher.join()
+        assert outcomes == [("rejected", "dropped")]
+
+        # the callbacks wait in the outbox with the message
+        await dispatcher.retry_outbox()
+        await dispatcher.join()
+        assert outcomes == [("rejected", "dropped"), ("retried", "delivered")]
+    finally:
+        await dispatcher.stop()
+        patcher.stop()
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_stop_cancels_told_messages() -> None:
+    _, patcher = mock_discord(httpx.Response(502), httpx.Response(502))
+    dispatcher = WebhookDispatcher(
+        url="https://discord.test/webhook", backoff=0, retry_interval=3600
+    )
+    dropped = []
+
+    async def on_dropped() -> None:
+        dropped.append(True)
+
+    await dispatcher.start()
+    try:
+        dispatcher.submit({"content": "told"}, on_dropped=on_dropped)
+        dispatcher.submit({"content": "untold"})
+        await dispatcher.join()
+    finally:
+        await dispatcher.stop()
+        patcher.stop()
+
+    # the sender queues its message again, the sweeper mustn't send it after a restart
+    assert dropped == [True]
+    told, untold = await outbox_rows()
+    assert (told.status, told.next_attempt_at) == ("cancelled", None)
+    assert untold.status == "pending"
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_webhook_status() -> None:
+    async with LifespanManager(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://localhost"
+        ) as client:
+            r = await client.get("/webhook")
+            assert r.status_code == 200
+            assert r.json()["outbox"] == {}
+            assert {"queue_depth", "sent", "retried", "dropped"} <= set(r.json())